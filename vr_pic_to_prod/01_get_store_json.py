@@ -1,80 +1,226 @@
-import requests
+"""
+批量获取 store_view_dict 中各店铺的全景点位 JSON，保存为 panorama_json/{店铺}/{店铺}.json
+所有请求共用一个 aiohttp 连接池，由 AsyncScheduler 控制并发数和 RPM（令牌桶），
+429 / 5xx / 连接失败按指数退避重试（遇到 429 自动降低 RPM）；内容未变化的 JSON 不重写
+python 01_get_store_json.py [--concurrency 8] [--rpm 120]
+"""
+
 import json
 import os
 import time
-from typing import Dict, List
+import asyncio
+import hashlib
+import argparse
+from typing import Callable, Dict, Optional
+
+import aiohttp
+
 from store_view_dict import store_view_dict
+from async_scheduler import AsyncScheduler
+from checkpoint import write_json_atomic
+
+# ==================== 配置项 ====================
+API_URL = "https://vr.aibee.cn/aibee-vr/list-panoramas?secret=U4LOTsSWEASOCXNl4lzyg0rOyGztm1so"
+HEADERS = {
+    "Content-Type": "application/json",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'panorama_json')
+
+CONCURRENCY = 8  # 同时进行的请求数
+# 每分钟请求数上限。原先串行请求，每次请求后再等 0.5 秒，每次用时为请求耗时 + 0.5 秒：
+# 请求耗时 0.5 秒时约 60 次/分钟，只有请求不耗时时才到 120 次/分钟。默认取 60，不高于原先对上游的压力
+RPM = 60
+TIMEOUT = 10  # 单次请求超时（秒）
+MAX_RETRIES = 3  # 429 / 5xx / 连接失败的重试次数
+
+
+class RetryableStatusError(Exception):
+    """429 / 5xx 响应（可重试），headers 用于读取 Retry-After"""
+
+    def __init__(self, status: int, headers, message: str = ''):
+        super().__init__(f'HTTP {status} {message}'.strip())
+        self.status = status
+        self.headers = headers
+
+
+RETRYABLE_ERRORS = (
+    RetryableStatusError,
+    aiohttp.ClientConnectionError,
+    asyncio.TimeoutError
+)
+
+
+def json_bytes(data: Dict) -> bytes:
+    """与 write_json_atomic 相同格式的序列化结果（用于比较内容是否变化）"""
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
 
-def fetch_store_data(store_id: str, store_name: str) -> bool:
+
+def file_digest(path: str) -> Optional[str]:
+    """文件内容的 sha256，文件不存在时返回 None"""
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def save_store_json(data: Dict, store_name: str, output_dir: str = DEFAULT_OUTPUT_DIR) -> str:
+    """
+    保存店铺 JSON，内容与已有文件一致时不重写
+
+    Returns:
+        'saved'（新增或有变化）/ 'unchanged'
+    """
+    store_dir = os.path.join(output_dir, store_name)
+    os.makedirs(store_dir, exist_ok=True)
+    filename = os.path.join(store_dir, f"{store_name}.json")
+
+    if file_digest(filename) == hashlib.sha256(json_bytes(data)).hexdigest():
+        return 'unchanged'
+    write_json_atomic(data, filename)
+    return 'saved'
+
+
+async def fetch_store_data(
+    session: aiohttp.ClientSession,
+    store_id: str,
+    store_name: str,
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+    api_url: str = API_URL
+) -> str:
     """
     获取店铺数据并保存为JSON文件
-    
+
     Args:
+        session: 共享的 aiohttp 会话
         store_id: 店铺ID
         store_name: 店铺名称
-        
+
     Returns:
-        bool: 是否成功
+        'saved' / 'unchanged'；429 / 5xx 抛出 RetryableStatusError，其他 HTTP 错误抛出 ClientResponseError
     """
-    url = "https://vr.aibee.cn/aibee-vr/list-panoramas?secret=U4LOTsSWEASOCXNl4lzyg0rOyGztm1so"
-    
-    payload = {"store_id": store_id}
-    
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-    }
-    
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+    async with session.post(api_url, json={"store_id": store_id}) as response:
+        if response.status == 429 or response.status >= 500:
+            raise RetryableStatusError(response.status, response.headers, response.reason or '')
         response.raise_for_status()
-        
-        data = response.json()
-        
-        # 获取当前脚本所在目录
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        json_root = os.path.join(script_dir, 'panorama_json')
-
-        # 构建目标目录路径
-        store_dir = os.path.join(json_root, store_name)
-        os.makedirs(store_dir, exist_ok=True)
-
-        # 保存文件
-        filename = os.path.join(store_dir, f"{store_name}.json")
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        print(f"✅ 成功保存: {filename}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ 失败 {store_name}: {e}")
-        return False
-
-def batch_fetch_stores(store_list: Dict[str, str], delay: float = 1.0):
+        data = await response.json(content_type=None)
+
+    return save_store_json(data, store_name, output_dir)
+
+
+async def batch_fetch_stores_async(
+    store_list: Dict[str, str],
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+    concurrency: int = CONCURRENCY,
+    rpm: float = RPM,
+    max_retries: int = MAX_RETRIES,
+    api_url: str = API_URL,
+    on_done: Optional[Callable[[str, str], None]] = None
+) -> Dict[str, Dict]:
+    """
+    并发获取所有店铺数据
+
+    Args:
+        on_done: 每个店铺完成后的回调 on_done(店铺名, 状态)，run_pipeline.py 用来把店铺交给下载阶段；
+            回调在线程中执行，可以阻塞（如放入有界队列），阻塞期间最多 concurrency 个店铺在获取或等待交接，不再开始新的请求
+
+    Returns:
+        {店铺名: {'status': 'saved' / 'unchanged' / 'failed', 'seconds': 耗时, 'error': 失败原因}}
+    """
+    scheduler = AsyncScheduler(
+        max_in_flight=concurrency,
+        rpm=rpm,
+        max_retries=max_retries,
+        retry_on=RETRYABLE_ERRORS,
+        adaptive_rpm=True
+    )
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+    report: Dict[str, Dict] = {}
+    # 获取中和已获取、等待 on_done 交接的店铺数上限（下游阻塞时暂停获取）
+    handoff = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS) as session:
+
+        async def fetch_one(store_name: str, store_id: str):
+            async with handoff:
+                await fetch_and_hand_off(store_name, store_id)
+
+        async def fetch_and_hand_off(store_name: str, store_id: str):
+            errors = []
+            start = time.perf_counter()
+
+            async def job():
+                try:
+                    return await fetch_store_data(session, store_id, store_name, output_dir, api_url)
+                except Exception as e:
+                    errors.append(e)
+                    raise
+
+            status = await scheduler.run(job, label=store_name)
+            elapsed = time.perf_counter() - start
+            if status is None:
+                # 失败原因已由调度器输出，汇总时再列出
+                report[store_name] = {'status': 'failed', 'seconds': elapsed, 'error': str(errors[-1]) if errors else ''}
+            else:
+                report[store_name] = {'status': status, 'seconds': elapsed, 'error': None}
+                if status == 'saved':
+                    print(f"✅ 成功保存: {store_name}（{elapsed:.1f}s）")
+                else:
+                    print(f"➖ 未变化: {store_name}")
+            if on_done is not None:
+                await asyncio.to_thread(on_done, store_name, report[store_name]['status'])
+
+        await asyncio.gather(*(fetch_one(name, sid) for name, sid in store_list.items()))
+
+    scheduler.print_summary()
+    return report
+
+
+def batch_fetch_stores(
+    store_list: Dict[str, str],
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+    concurrency: int = CONCURRENCY,
+    rpm: float = RPM,
+    max_retries: int = MAX_RETRIES,
+    api_url: str = API_URL
+) -> Dict[str, Dict]:
     """
     批量获取店铺数据
-    
+
     Args:
         store_list: 店铺字典 {店铺名: store_id}
-        delay: 请求间隔时间(秒)，避免请求过快
+        concurrency: 同时进行的请求数
+        rpm: 每分钟请求数上限（令牌桶，代替固定间隔）
     """
     print(f"开始爬取 {len(store_list)} 个店铺的数据...")
-    
-    success_count = 0
-    for store_name, store_id in store_list.items():
-        print(f"正在处理: {store_name}")
-        
-        if fetch_store_data(store_id, store_name):
-            success_count += 1
-        
-        # 添加延迟，避免请求过快
-        if delay > 0:
-            time.sleep(delay)
-    
-    print(f"\n爬取完成！成功: {success_count}/{len(store_list)}")
+    report = asyncio.run(batch_fetch_stores_async(store_list, output_dir, concurrency, rpm, max_retries, api_url))
+
+    saved = [name for name, r in report.items() if r['status'] == 'saved']
+    unchanged = [name for name, r in report.items() if r['status'] == 'unchanged']
+    failed = [name for name, r in report.items() if r['status'] == 'failed']
+    print(f"\n爬取完成！成功: {len(saved) + len(unchanged)}/{len(store_list)}"
+          f"（更新 {len(saved)}，未变化 {len(unchanged)}，失败 {len(failed)}）")
+    for name in failed:
+        print(f"  ❌ {name}: {report[name]['error']}")
+    return report
+
 
 # 使用方法
 if __name__ == "__main__":
-    # 你的店铺列表
-    batch_fetch_stores(store_view_dict, delay=0.5)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='批量获取店铺全景点位 JSON')
+    parser.add_argument('--output_dir', default=DEFAULT_OUTPUT_DIR, help='JSON 保存目录（默认 panorama_json）')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help=f'同时进行的请求数（默认 {CONCURRENCY}）')
+    parser.add_argument('--rpm', type=float, default=RPM, help=f'每分钟请求数上限（默认 {RPM}）')
+    parser.add_argument('--max_retries', type=int, default=MAX_RETRIES, help=f'429 / 5xx / 连接失败的重试次数（默认 {MAX_RETRIES}）')
+    parser.add_argument('--api_url', default=API_URL, help='点位列表接口地址')
+    args = parser.parse_args()
+
+    batch_fetch_stores(
+        store_view_dict,
+        output_dir=args.output_dir,
+        concurrency=args.concurrency,
+        rpm=args.rpm,
+        max_retries=args.max_retries,
+        api_url=args.api_url
+    )
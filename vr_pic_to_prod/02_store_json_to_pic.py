@@ -4,26 +4,65 @@
 下载 panorama_json 下所有子文件夹中的全景 JSON 里 panorama_images 字段的全部图片
 URL 里的空格保留，原样下载！
 图片保存到 JSON 文件所在目录的 images 子文件夹中，文件名格式为 {uuid}_{index}_{type}.jpg
-python download_panorama_keep_space.py  [json根目录，默认 panorama_json]
+所有线程共用一个带连接池的 Session（按主机限制连接数、自动重试），
+先写入 .part 临时文件，完整后再原子重命名；中断后重新运行会用 HTTP Range + If-Range 从 .part 断点续传
+（.part 旁保存 ETag / Last-Modified，服务器上的图片变化后从头下载）
+下载清单（SQLite）记录每个 URL 的大小、ETag / Last-Modified、sha256：
+--refresh 时对已有图片发送条件请求，只下载有变化的图片；--verify 批量校验本地图片完整性
+--plan 按 03 的点位选择规则（抽样点数、vr_loc_list、方向）只下载分析会用到的图片
+python 02_store_json_to_pic.py  [json根目录，默认 panorama_json] [--refresh] [--verify] [--plan]
 """
 
 import os
 import sys
 import json
+import time
+import random
+import argparse
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from urllib.parse import urlparse
+from email.utils import formatdate
 import re
 
+from download_manifest import DownloadManifest, file_sha256
+from point_selection import (
+    DEFAULT_MAX_PRODUCT_POINTS,
+    DEFAULT_MAX_STORE_POINTS,
+    SKIPPED_DIRECTIONS,
+    parse_image_name,
+    candidate_seq_ids,
+    plan_required_faces
+)
+
 DEFAULT_JSON_DIR = 'C:\\Users\\wyz\\Desktop\\dev-2025\\python-practice\\vr_pic_to_prod\\panorama_json'
 THREADS = 16
 TIMEOUT = 15
 CHUNK = 1024 * 64
+MAX_CONN_PER_HOST = 16   # 每个主机的最大连接数（连接池满时线程等待空闲连接，而不是新建连接）
+POOL_HOSTS = 8           # 连接池缓存的主机数
+RETRIES = 3              # 连接失败 / 429 / 5xx 的重试次数
+BACKOFF = 0.5            # 指数退避基数（秒）：0.5, 1, 2 ...
+PART_SUFFIX = '.part'    # 下载中的临时文件后缀
+VALIDATOR_SUFFIX = '.validator'  # .part 对应的 ETag / Last-Modified（续传时用于 If-Range）
+MANIFEST_NAME = 'download_manifest.sqlite'  # 下载清单默认保存在 json 根目录下
+
+_session = None
+_session_lock = threading.Lock()
+_manifest = None  # init_manifest 中初始化，None 表示不使用下载清单
 
 # ----------------- 工具函数 -----------------
 def extract_images_with_source(json_file: str):
-    """从单个 json 文件里提取所有 panorama_images 链接，并记录来源文件"""
+    """
+    从单个 json 文件里提取所有 panorama_images 链接，以及有坐标的点位编号（与 03 的 load_panorama_coordinates 一致）
+    
+    Returns:
+        (URL 列表, 点位 seq_id 列表)
+    """
     with open(json_file, encoding='utf-8') as f:
         data = json.load(f)
     panorama_list = data.get('data', {}).get('panorama_list', [])
@@ -35,7 +74,8 @@ def extract_images_with_source(json_file: str):
             urls.extend(imgs)               # 原样保留，包括末尾空格
         except Exception as e:
             print(f'[WARN] 解析失败 {json_file} -> {e}')
-    return urls, json_file
+    point_seq_ids = [pano['seq_id'] for pano in panorama_list if pano.get('seq_id') is not None and pano.get('coordinate')]
+    return urls, point_seq_ids
 
 
 def extract_filename_from_url(url: str):
@@ -93,72 +133,471 @@ def build_local_path(url: str, json_file_path: str):
     return local_path
 
 
-def download_one(url: str, json_file_path: str):
-    """单文件下载，返回 (url, saved_path|None, error|None)"""
-    local = build_local_path(url, json_file_path)
+def get_session(max_conn_per_host: int = MAX_CONN_PER_HOST):
+    """
+    进程内共享的 Session：连接池按主机复用 keep-alive 连接，
+    连接失败和 429/5xx 由 urllib3 按指数退避自动重试（遵守 Retry-After）
+    连接池大小由第一次调用的 max_conn_per_host 决定，多个品牌同时下载时应先按总线程数创建（见 run_pipeline.py）
+    """
+    global _session
+    if _session is not None:
+        return _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=RETRIES,
+                connect=RETRIES,
+                read=RETRIES,
+                status=RETRIES,
+                backoff_factor=BACKOFF,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET', 'HEAD']),
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(
+                pool_connections=POOL_HOSTS,
+                pool_maxsize=max_conn_per_host,
+                pool_block=True,
+                max_retries=retry
+            )
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+    return _session
+
+
+def if_range_value(validator: dict):
+    """
+    续传用的 If-Range 值：优先使用强 ETag（弱 ETag 不能用于 If-Range），其次 Last-Modified
+    都没有时返回 None（无法确认服务器上的文件未变化，不能续传）
+    """
+    etag = validator.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return validator.get('last_modified')
+
+
+def load_part_validator(part_path: str) -> dict:
+    try:
+        with open(part_path + VALIDATOR_SUFFIX, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_part_validator(part_path: str, etag: str = None, last_modified: str = None):
+    validator_path = part_path + VALIDATOR_SUFFIX
+    if if_range_value({'etag': etag, 'last_modified': last_modified}) is None:
+        if os.path.isfile(validator_path):
+            os.remove(validator_path)
+        return
+    with open(validator_path, 'w', encoding='utf-8') as f:
+        json.dump({'etag': etag, 'last_modified': last_modified}, f)
+
+
+def discard_part(part_path: str):
+    """删除 .part 及其 validator"""
+    for path in (part_path, part_path + VALIDATOR_SUFFIX):
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def content_range_start(value: str):
+    """Content-Range（bytes 100-199/200）的起始字节，无法解析时返回 None"""
+    match = re.match(r'bytes\s+(\d+)-', value or '')
+    return int(match.group(1)) if match else None
+
+
+def fetch_to_part(url: str, part_path: str, conditional: dict = None):
+    """
+    下载到 .part 文件：已有部分内容时发送 Range + If-Range 请求续传
+    .part 旁边保存首次响应的 ETag / Last-Modified，服务器上的文件变化后 If-Range 不匹配，服务器返回 200，从头写入；
+    没有可用的 validator 时不续传；返回的总长度与 Content-Length 不符时抛出异常并保留 .part
     
-    if os.path.isfile(local):
-        return url, local, None
+    Args:
+        conditional: 条件请求头（If-None-Match / If-Modified-Since），仅在没有 .part 时使用
+    
+    Returns:
+        (是否未变化（304）, ETag, Last-Modified)
+    """
+    session = get_session()
+    offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+    if_range = if_range_value(load_part_validator(part_path)) if offset else None
+    if offset and if_range is None:
+        # 无法确认 .part 与服务器上的文件是同一版本，从头下载
+        discard_part(part_path)
+        offset = 0
+    if offset:
+        headers = {'Range': f'bytes={offset}-', 'If-Range': if_range}
+    else:
+        headers = dict(conditional or {})
+    
+    with session.get(url, stream=True, timeout=TIMEOUT, headers=headers) as r:
+        if r.status_code == 304:
+            return True, r.headers.get('ETag'), r.headers.get('Last-Modified')
+        if r.status_code == 416:
+            # .part 已不小于服务器上的文件（文件可能已变化），从头下载
+            discard_part(part_path)
+            return fetch_to_part(url, part_path, conditional)
+        r.raise_for_status()
         
-    try:
-        # 确保 images 目录存在
-        os.makedirs(os.path.dirname(local), exist_ok=True)
+        if r.status_code == 206:
+            if content_range_start(r.headers.get('Content-Range')) != offset:
+                # 返回的片段与 .part 对不上，从头下载
+                discard_part(part_path)
+                if not offset:
+                    raise IOError(f'非 Range 请求返回了 206（Content-Range: {r.headers.get("Content-Range")}）')
+                return fetch_to_part(url, part_path, conditional)
+            mode = 'ab'
+        else:
+            # 200（不支持 Range，或 If-Range 不匹配即文件已变化）：从头写入，记录新的 validator
+            mode = 'wb'
+            offset = 0
+            save_part_validator(part_path, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+        expected = r.headers.get('Content-Length')
+        expected = offset + int(expected) if expected is not None else None
         
-        with requests.get(url, stream=True, timeout=TIMEOUT) as r:
-            r.raise_for_status()
-            with open(local, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=CHUNK):
-                    if chunk:
-                        f.write(chunk)
-        return url, local, None
-    except Exception as e:
-        return url, None, str(e)
+        with open(part_path, mode) as f:
+            for chunk in r.iter_content(chunk_size=CHUNK):
+                if chunk:
+                    f.write(chunk)
+    
+        etag = r.headers.get('ETag')
+        last_modified = r.headers.get('Last-Modified')
+    
+    size = os.path.getsize(part_path)
+    if expected is not None and size != expected:
+        raise IOError(f'下载不完整：{size}/{expected} 字节')
+    return False, etag, last_modified
+
+
+def conditional_headers(local: str, entry: dict = None) -> dict:
+    """
+    已有图片的条件请求头：优先使用清单中的 ETag / Last-Modified，
+    清单中没有记录（或大小不一致）时用本地文件的修改时间
+    """
+    if entry and entry['size'] == os.path.getsize(local):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        if headers:
+            return headers
+    return {'If-Modified-Since': formatdate(os.path.getmtime(local), usegmt=True)}
+
+
+def download_one(url: str, json_file_path: str, refresh: bool = False):
+    """
+    单文件下载
+    
+    Args:
+        refresh: 已有图片也发送条件请求，服务器上有变化时重新下载
+    
+    Returns:
+        (url, saved_path|None, error|None, status)
+        status: downloaded（已下载）/ not_modified（条件请求确认未变化）/ skipped（已存在）/ failed
+    """
+    local = build_local_path(url, json_file_path)
+    entry = _manifest.get(url) if _manifest is not None else None
+    
+    conditional = None
+    # 只有完整下载后才会出现最终文件名，存在即完整
+    if os.path.isfile(local):
+        if not refresh:
+            if _manifest is not None and entry is None:
+                # 旧版本下载的图片补记到清单，便于之后校验
+                _manifest.put(url, local, os.path.getsize(local), sha256=file_sha256(local))
+            return url, local, None, 'skipped'
+        conditional = conditional_headers(local, entry)
+    
+    part = local + PART_SUFFIX
+    last_error = None
+    # 传输中途断开（不在 urllib3 重试范围内）时从 .part 续传
+    for attempt in range(RETRIES + 1):
+        try:
+            # 确保 images 目录存在
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+            not_modified, etag, last_modified = fetch_to_part(url, part, conditional)
+            if not_modified:
+                if _manifest is not None:
+                    if entry is None:
+                        _manifest.put(url, local, os.path.getsize(local), etag, last_modified, file_sha256(local))
+                    else:
+                        _manifest.touch(url)
+                return url, local, None, 'not_modified'
+            os.replace(part, local)
+            discard_part(part)
+            if _manifest is not None:
+                _manifest.put(url, local, os.path.getsize(local), etag, last_modified, file_sha256(local))
+            return url, local, None, 'downloaded'
+        except requests.HTTPError as e:
+            # 4xx 等不可重试的错误
+            return url, None, str(e), 'failed'
+        except Exception as e:
+            last_error = e
+            if attempt < RETRIES:
+                time.sleep(BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.0))
+    return url, None, str(last_error), 'failed'
+
+
+def verify_one(entry: dict):
+    """校验单个清单记录，返回 (entry, 问题描述|None)"""
+    path = entry['path']
+    if not os.path.isfile(path):
+        return entry, '文件不存在'
+    size = os.path.getsize(path)
+    if size != entry['size']:
+        return entry, f'大小不一致 {size}/{entry["size"]}'
+    if entry.get('sha256') and file_sha256(path) != entry['sha256']:
+        return entry, 'sha256 不一致'
+    return entry, None
+
+
+def verify_downloads(json_dir: str, threads: int = THREADS):
+    """
+    批量校验清单中 json_dir 下的图片（存在、大小、sha256）
+    损坏的图片会被删除并移出清单，接下来的下载会重新获取
+    """
+    entries = _manifest.entries(json_dir)
+    if not entries:
+        print('[INFO] 下载清单为空，跳过校验')
+        return
+    
+    bad = 0
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(verify_one, entry) for entry in entries]
+        for fut in tqdm(as_completed(futures), total=len(futures), desc='Verifying'):
+            entry, problem = fut.result()
+            if problem is None:
+                continue
+            bad += 1
+            tqdm.write(f'[WARN] 校验失败 {entry["path"]}: {problem}')
+            if os.path.isfile(entry['path']):
+                os.remove(entry['path'])
+            _manifest.delete(entry['url'])
+    print(f'[INFO] 校验完成：{len(entries)} 张，异常 {bad} 张（已删除，将重新下载）')
+
+
+def load_source(json_file_path: str):
+    """
+    读取 JSON 中的图片 URL 和点位，JSON 未变化时直接使用清单中缓存的解析结果
+    
+    Returns:
+        (URL 列表, 点位 seq_id 列表)
+    """
+    if _manifest is not None:
+        source = _manifest.get_source(json_file_path)
+        if source is not None:
+            return source
+    urls, point_seq_ids = extract_images_with_source(json_file_path)
+    if _manifest is not None:
+        _manifest.put_source(json_file_path, urls, point_seq_ids)
+    return urls, point_seq_ids
 
 
 # ----------------- 主流程 -----------------
-def main(json_dir: str):
+def plan_urls(urls, json_file_path: str, plan_options: dict, point_seq_ids):
+    """
+    按 03 的点位选择规则筛选单个 JSON 的图片 URL
+    
+    Args:
+        plan_options: {'vr_loc_list', 'max_product_points', 'max_store_points'}
+        point_seq_ids: JSON 中有坐标的点位（见 extract_images_with_source）
+    
+    Returns:
+        需要下载的 URL 列表（文件名无法解析的 URL 原样保留）
+    """
+    parsed = {}
+    group_seq_ids = {}
+    for url in urls:
+        info = parse_image_name(os.path.basename(build_local_path(url, json_file_path)))
+        parsed[url] = info
+        if info is not None and info[2] not in SKIPPED_DIRECTIONS:
+            group_seq_ids[info[0]] = info[1]
+    
+    faces = plan_required_faces(
+        candidate_seq_ids(point_seq_ids, group_seq_ids.values()),
+        plan_options.get('vr_loc_list'),
+        plan_options.get('max_product_points', DEFAULT_MAX_PRODUCT_POINTS),
+        plan_options.get('max_store_points', DEFAULT_MAX_STORE_POINTS)
+    )
+    return [
+        url for url in urls
+        if parsed[url] is None or parsed[url][2] in faces.get(parsed[url][1], ())
+    ]
+
+
+def init_manifest(manifest_path: str = None):
+    """打开下载清单（None 表示不使用），main 和 run_pipeline.py 共用"""
+    global _manifest
+    _manifest = DownloadManifest(manifest_path) if manifest_path else None
+    if _manifest is not None:
+        print(f'[INFO] 下载清单: {manifest_path}')
+
+
+def close_manifest():
+    global _manifest
+    if _manifest is not None:
+        _manifest.close()
+        _manifest = None
+
+
+def collect_urls(json_file_path: str, plan_options: dict = None):
+    """
+    单个 JSON 需要下载的图片 URL
+    
+    Returns:
+        (需要下载的 URL 列表, JSON 中的图片总数)
+    """
+    urls, point_seq_ids = load_source(json_file_path)
+    total_urls = len(urls)
+    if plan_options is not None:
+        urls = plan_urls(urls, json_file_path, plan_options, point_seq_ids)
+    return urls, total_urls
+
+
+def download_json_images(
+    json_file_path: str,
+    threads: int = THREADS,
+    refresh: bool = False,
+    plan_options: dict = None
+) -> dict:
+    """
+    下载单个 JSON（单个品牌）的图片，供 run_pipeline.py 按品牌流式调用
+    
+    Returns:
+        {'downloaded': n, 'not_modified': n, 'skipped': n, 'failed': n}
+    """
+    urls, _ = collect_urls(json_file_path, plan_options)
+    get_session(max_conn_per_host=min(threads, MAX_CONN_PER_HOST))
+    status_count = {'downloaded': 0, 'not_modified': 0, 'skipped': 0, 'failed': 0}
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(download_one, url, json_file_path, refresh) for url in urls]
+        for fut in as_completed(futures):
+            url, _, err, status = fut.result()
+            status_count[status] += 1
+            if err:
+                print(f'[ERROR] 下载失败 {url} -> {err}')
+    return status_count
+
+
+def main(
+    json_dir: str,
+    threads: int = THREADS,
+    manifest_path: str = None,
+    refresh: bool = False,
+    verify: bool = False,
+    plan_options: dict = None
+):
+    """
+    Args:
+        plan_options: 按分析计划下载时的选择参数（见 plan_urls），None 表示下载全部图片
+    """
     if not os.path.isdir(json_dir):
         print(f'[ERROR] 目录不存在: {json_dir}')
         sys.exit(1)
-
-    # 1. 递归扫描所有子文件夹里的 .json，并记录来源文件
-    all_download_tasks = []  # 每个元素是 (url, json_file_path)
     
-    for root, _, files in os.walk(json_dir):
-        for fn in files:
-            if fn.lower().endswith('.json'):
-                json_file_path = os.path.join(root, fn)
-                urls, source_file = extract_images_with_source(json_file_path)
-                for url in urls:
-                    all_download_tasks.append((url, source_file))
+    init_manifest(manifest_path)
+    try:
+        if verify:
+            if _manifest is None:
+                print('[ERROR] --verify 需要下载清单')
+                sys.exit(1)
+            verify_downloads(json_dir, threads)
 
-    total = len(all_download_tasks)
-    print(f'共提取到 {total} 张图片（已保留 URL 空格）')
+        # 1. 递归扫描所有子文件夹里的 .json，并记录来源文件
+        all_download_tasks = []  # 每个元素是 (url, json_file_path)
+        total_urls = 0
+        
+        for root, _, files in os.walk(json_dir):
+            for fn in files:
+                if fn.lower().endswith('.json'):
+                    json_file_path = os.path.join(root, fn)
+                    urls, json_total = collect_urls(json_file_path, plan_options)
+                    total_urls += json_total
+                    for url in urls:
+                        all_download_tasks.append((url, json_file_path))
 
-    if total == 0:
-        print('未找到任何图片链接，程序结束。')
-        return
+        total = len(all_download_tasks)
+        print(f'共提取到 {total_urls} 张图片（已保留 URL 空格）')
+        if plan_options is not None:
+            print(f'[INFO] 按分析计划需要 {total} 张，跳过 {total_urls - total} 张')
 
-    # 2. 并行下载
-    fails = []
-    with ThreadPoolExecutor(max_workers=THREADS) as pool:
-        future_map = {pool.submit(download_one, url, source_file): (url, source_file) 
-                     for url, source_file in all_download_tasks}
+        if total == 0:
+            print('未找到任何图片链接，程序结束。')
+            return
+
+        # 2. 并行下载（所有线程共用一个连接池，连接数不超过线程数）
+        get_session(max_conn_per_host=min(threads, MAX_CONN_PER_HOST))
+        fails = []
+        status_count = {'downloaded': 0, 'not_modified': 0, 'skipped': 0, 'failed': 0}
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            future_map = {pool.submit(download_one, url, source_file, refresh): (url, source_file) 
+                         for url, source_file in all_download_tasks}
         
-        for fut in tqdm(as_completed(future_map), total=total, desc='Downloading'):
-            url, path, err = fut.result()
-            if err:
-                fails.append((url, err))
+            for fut in tqdm(as_completed(future_map), total=total, desc='Downloading'):
+                url, path, err, status = fut.result()
+                status_count[status] += 1
+                if err:
+                    fails.append((url, err))
+                    # 失败立即输出，不打断进度条
+                    tqdm.write(f'[ERROR] 下载失败 {url} -> {err}')
 
-    # 3. 结果汇总
-    if fails:
-        print(f'\n===== 失败 {len(fails)} 张 =====')
-        for u, e in fails:
-            print(u, '->', e)
-    else:
-        print('\n全部下载完成！')
+        # 3. 结果汇总
+        print(
+            f'\n[INFO] 下载 {status_count["downloaded"]} 张，未变化 {status_count["not_modified"]} 张，'
+            f'已存在跳过 {status_count["skipped"]} 张，失败 {status_count["failed"]} 张'
+        )
+        if fails:
+            print(f'\n===== 失败 {len(fails)} 张 =====')
+            for u, e in fails:
+                print(u, '->', e)
+        else:
+            print('\n全部下载完成！')
+    finally:
+        close_manifest()
 
 
 if __name__ == '__main__':
-    json_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_JSON_DIR
-    main(json_dir)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='下载全景 JSON 中的所有全景图片')
+    parser.add_argument('json_dir', nargs='?', default=DEFAULT_JSON_DIR, help='json 根目录，默认 panorama_json')
+    parser.add_argument('--threads', type=int, default=THREADS, help=f'下载线程数（默认 {THREADS}）')
+    parser.add_argument('--manifest', default=None, help=f'下载清单路径（默认 json 根目录下的 {MANIFEST_NAME}）')
+    parser.add_argument('--no_manifest', action='store_true', help='不使用下载清单')
+    parser.add_argument('--refresh', action='store_true', help='对已有图片发送条件请求（ETag / Last-Modified），只重新下载有变化的图片')
+    parser.add_argument('--verify', action='store_true', help='下载前批量校验本地图片（大小、sha256），损坏的图片删除后重新下载')
+    parser.add_argument('--plan', action='store_true', help='按 03 的点位选择规则只下载分析会用到的图片（不下载 d/t 方向和未选中的点位）')
+    parser.add_argument('--max_product_points', type=int, default=DEFAULT_MAX_PRODUCT_POINTS, help='--plan：商品分析最大点位数，与 03 保持一致')
+    parser.add_argument('--max_store_points', type=int, default=DEFAULT_MAX_STORE_POINTS, help='--plan：店铺分析最大点位数，与 03 保持一致')
+    parser.add_argument('--vr_loc_list', action='store_true', help='--plan：只下载 brand_list.py 中 vr_loc_list 指定的点位')
+    args = parser.parse_args()
+    
+    plan_options = None
+    if args.plan:
+        plan_options = {
+            'vr_loc_list': None,
+            'max_product_points': args.max_product_points,
+            'max_store_points': args.max_store_points
+        }
+        if args.vr_loc_list:
+            try:
+                from brand_list import vr_loc_list
+                plan_options['vr_loc_list'] = vr_loc_list
+            except ImportError:
+                print('[ERROR] 无法从 brand_list.py 导入 vr_loc_list')
+                sys.exit(1)
+    
+    manifest_path = None
+    if not args.no_manifest:
+        manifest_path = args.manifest or os.path.join(args.json_dir, MANIFEST_NAME)
+    main(
+        args.json_dir,
+        threads=args.threads,
+        manifest_path=manifest_path,
+        refresh=args.refresh,
+        verify=args.verify,
+        plan_options=plan_options
+    )
\ No newline at end of file
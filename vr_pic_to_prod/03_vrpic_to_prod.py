@@ -3,6 +3,7 @@
 """
 使用豆包 Doubao-Seed-1.6-vision 模型分析 panorama_json 文件夹中的全景图片
 支持通过 --brand_list 参数筛选需要处理的品牌
+支持 --engine async：所有品牌的点位共用一个全局异步调度器（并发、RPM、TPM 限制 + 退避重试）
 """
 
 import os
@@ -10,15 +11,32 @@ import sys
 import json
 import base64
 import argparse
-import math
-import threading
+import asyncio
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Optional
 # from tqdm import tqdm
-from openai import OpenAI
+import openai
 
 # 导入提示词
 from prompt import vr_product_prompt, vr_store_prompt
+from doubao_client import (
+    get_shared_client,
+    get_shared_async_client,
+    close_shared_clients,
+    aclose_shared_async_clients,
+    last_call_info,
+    request_count,
+    format_call_info,
+    CONNECTION_STATS
+)
+from async_scheduler import AsyncScheduler
+from pipeline_metrics import PipelineMetrics, FORMATS as METRICS_FORMATS, STATUS_CACHE_HIT, STATUS_PARSE_ERROR, STATUS_FAILED
+from vision_cache import VisionResultCache, sha256_text
+from image_prep import ImagePrepConfig, ImagePreparer, EncodedImageStore
+from checkpoint import BrandCheckpoint, write_json_atomic
+from vr_geometry import load_panorama_coordinates, project_products
+from point_selection import SKIPPED_DIRECTIONS, parse_image_name, candidate_seq_ids, select_analysis_points
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -44,196 +62,92 @@ DOUBAO_MODEL = os.getenv('DOUBAO_MODEL', 'doubao-seed-1-6-vision-250815')
 
 # 并发配置
 MAX_WORKERS = 5  # 并发分析点位：每次请求 5 个点
+# 共享客户端的连接池大小，默认等于点位并发数；多个品牌同时分析时（run_pipeline.py）由 init_runtime 按总并发设置
+CLIENT_MAX_CONNECTIONS = MAX_WORKERS
 TIMEOUT = 10000  # API 超时时间（秒），传入多张图片需要更长时间
 
+# 采样参数
+SAMPLING_PARAMS = {
+    'temperature': 0.7,
+    'max_tokens': 4096
+}
 
-# ==================== 工具函数 ====================
-def load_panorama_coordinates(brand_folder: str) -> Dict[int, Dict]:
-    """
-    从品牌文件夹的 JSON 文件中加载所有点位的坐标信息
-    
-    Args:
-        brand_folder: 品牌文件夹路径
-    
-    Returns:
-        {seq_id: {id, position_x, position_y, position_z, direction_x, ...}, ...}
-    """
-    brand_name = os.path.basename(brand_folder)
-    json_file = os.path.join(brand_folder, f'{brand_name}.json')
-    
-    if not os.path.exists(json_file):
-        print(f'[WARN] JSON 文件不存在: {json_file}')
-        return {}
-    
-    try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        coordinates = {}
-        panorama_list = data.get('data', {}).get('panorama_list', [])
-        
-        for pano in panorama_list:
-            seq_id = pano.get('seq_id')
-            panorama_id = pano.get('id')  # 获取 panorama 的 id
-            coord = pano.get('coordinate', {})
-            
-            if seq_id is not None and coord:
-                coordinates[seq_id] = {
-                    'id': panorama_id,  # 添加 panorama id
-                    'position_x': coord.get('position_x', 0),
-                    'position_y': coord.get('position_y', 0),
-                    'position_z': coord.get('position_z', 0),
-                    'direction_x': coord.get('direction_x', 0),
-                    'direction_y': coord.get('direction_y', 0),
-                    'direction_z': coord.get('direction_z', 0),
-                    'direction_w': coord.get('direction_w', 0)
-                }
-        
-        return coordinates
-    except Exception as e:
-        print(f'[ERROR] 读取坐标信息失败 {json_file}: {e}')
-        return {}
+# 异步引擎配置（--engine async）
+MAX_IN_FLIGHT = 8  # 全局最大并发请求数（跨品牌）
+MAX_RETRIES = 3  # 可重试错误的最大重试次数
+# 可重试的错误：连接失败、超时、限流（429）、服务端错误（5xx）
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError
+)
 
+# 结果缓存配置
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(__file__),
+    'vision_cache'
+)
+CACHE_MAX_SIZE_MB = 1024  # 缓存总大小上限（MB）
+CACHE_MAX_AGE_DAYS = 90  # 缓存有效期（天）
 
-def get_direction_angle(direction: str) -> float:
-    """
-    根据图片方向获取对应的角度（弧度）
-    
-    Args:
-        direction: f(前)/b(后)/l(左)/r(右)
-    
-    Returns:
-        角度（弧度）
-    """
-    direction_map = {
-        'f': 0,           # 前: 0度
-        'r': math.pi / 2, # 右: 90度
-        'b': math.pi,     # 后: 180度
-        'l': 3 * math.pi / 2  # 左: 270度
-    }
-    return direction_map.get(direction, 0)
+# 结果缓存实例（main 中根据 --cache_dir / --no_cache 初始化，None 表示不使用缓存）
+RESULT_CACHE: Optional[VisionResultCache] = None
+# 是否读取结果缓存（--force 时只写不读，重新调用模型并刷新缓存）
+RESULT_CACHE_READ = True
 
+# 图片预处理配置（上传前缩放 + 重新压缩，减小请求体积和 token 消耗）
+DEFAULT_IMAGE_CACHE_DIR = os.path.join(
+    os.path.dirname(__file__),
+    'image_cache'
+)
+MAX_IMAGE_EDGE = 1600  # 最长边上限（像素），0 表示不缩放
+JPEG_QUALITY = 85  # JPEG 压缩质量，0 表示不重新压缩
+STORE_TILE_COLS = 0  # 店铺分析时将各点位图片拼成 N 列的一张图，0 表示不拼图
 
-def select_sample_points(all_seq_ids: List[int], max_points: Optional[int] = None) -> List[int]:
-    """
-    从所有点位中选择样本点，排除首尾各 总数/5 个点，从中间均匀分布选择
-    
-    Args:
-        all_seq_ids: 所有点位的 seq_id 列表（已排序）
-        max_points: 最大选择数量，None 表示不限制（选择所有中间点）
-    
-    Returns:
-        选中的 seq_id 列表
-    """
-    total_count = len(all_seq_ids)
-    
-    # 如果没有限制，或者点位数很少，进行首尾去除后全部选择
-    if max_points is None or total_count <= (max_points if max_points else 0):
-        # 即使不限制数量，也要去除首尾
-        if total_count <= 5:
-            # 点位数太少，全部返回
-            return all_seq_ids
-    
-    # 计算首尾各去除多少个点（总数 / 5，向下取整）
-    trim_count = total_count // 5
-    
-    # 确保去除后至少还有一些点可选
-    if trim_count * 2 >= total_count:
-        # 如果去除的太多，只去除首尾各1个
-        trim_count = 1
-    
-    # 去掉首尾，从中间选择
-    start_index = trim_count
-    end_index = total_count - trim_count
-    middle_points = all_seq_ids[start_index:end_index]
-    
-    print(f'[DEBUG] 总点位 {total_count} 个，去除首部 {trim_count} 个、尾部 {trim_count} 个，剩余 {len(middle_points)} 个')
-    
-    # 如果没有限制，返回所有中间点位
-    if max_points is None:
-        print(f'[DEBUG] 不限制点位数量，使用所有 {len(middle_points)} 个中间点位')
-        return middle_points
-    
-    if len(middle_points) <= max_points:
-        # 中间点位数不超过最大值，全部选择
-        return middle_points
-    
-    # 均匀分布选择
-    step = (len(middle_points) - 1) / (max_points - 1)
-    selected_indices = [int(round(i * step)) for i in range(max_points)]
-    selected_seq_ids = [middle_points[i] for i in selected_indices]
-    
-    return selected_seq_ids
+# 图片预处理器实例（main 中初始化，None 表示直接上传原图）
+IMAGE_PREPARER: Optional[ImagePreparer] = None
 
+# 单个品牌内已编码图片的内存上限（MB），商品分析和店铺分析共用，0 表示不复用
+ENCODED_IMAGE_MAX_MB = 256
 
-def calculate_product_3d_position(
-    bbox: Dict[str, float],
-    direction: str,
-    point_coord: Dict[str, float],
-    estimated_distance: float = 2.0
-) -> Dict[str, float]:
-    """
-    根据商品在图像中的边界框、拍摄方向和点位坐标，计算商品的3D坐标
-    
-    Args:
-        bbox: 边界框 {x_min, y_min, x_max, y_max}（归一化坐标）
-        direction: 图片方向 (f/b/l/r)
-        point_coord: 点位坐标 {position_x, position_y, position_z}
-        estimated_distance: 估算的商品距离（米），默认2米
-    
-    Returns:
-        {x, y, z}: 商品的3D坐标
-    """
-    # 计算商品在图像中的中心点
-    center_x = (bbox.get('x_min', 0) + bbox.get('x_max', 1)) / 2
-    center_y = (bbox.get('y_min', 0) + bbox.get('y_max', 1)) / 2
-    
-    # 将图像坐标转换为角度偏移
-    # center_x: 0.5 表示正中心，0 表示最左，1 表示最右
-    # 假设图像视野角度为90度（FOV）
-    fov_horizontal = math.pi / 2  # 90度视野
-    fov_vertical = math.pi / 2
-    
-    # 计算水平和垂直角度偏移
-    horizontal_offset = (center_x - 0.5) * fov_horizontal
-    vertical_offset = (center_y - 0.5) * fov_vertical
-    
-    # 获取基础方向角度
-    base_angle = get_direction_angle(direction)
-    
-    # 最终的水平角度
-    final_angle = base_angle + horizontal_offset
-    
-    # 按 prompt 坐标系计算3D坐标（X:左右, Y:上下, Z:前后）
-    # 水平面分量（X-Z 平面）
-    dx = estimated_distance * math.sin(final_angle)  # 水平角在 X 轴的投影
-    dz = estimated_distance * math.cos(final_angle)  # 水平角在 Z 轴的投影（f 对应 +Z）
-    
-    # 垂直分量影响 Y 轴（上正下负），图像 y 越大越靠下，因此取负号
-    dy = -estimated_distance * math.tan(vertical_offset)
-    
-    # 计算最终的绝对坐标
-    product_x = point_coord.get('position_x', 0) + dx
-    product_y = point_coord.get('position_y', 0) + dy
-    product_z = point_coord.get('position_z', 0) + dz
-    
-    return {
-        'x': round(product_x, 3),
-        'y': round(product_y, 3),
-        'z': round(product_z, 3)
-    }
+# 计算 py_position_3d 时是否按点位朝向四元数（direction_x/y/z/w）旋转
+USE_POINT_ORIENTATION = False
+
+# token 预估（用于 TPM 限流，请求完成后按实际用量修正）
+EST_PROMPT_TOKENS = 1500  # 提示词
+EST_TOKENS_PER_IMAGE = 1300  # 每张图片
+EST_COMPLETION_TOKENS = 1500  # 模型输出
+
+# 模型单价（元 / 百万 tokens，用于续跑计划的费用预估，按实际计费调整）
+PRICE_INPUT_PER_M = float(os.getenv('DOUBAO_PRICE_INPUT', '0.8'))
+PRICE_OUTPUT_PER_M = float(os.getenv('DOUBAO_PRICE_OUTPUT', '8'))
 
+# 请求指标（各阶段耗时、请求体大小、token 用量、重试次数），main 中根据 --metrics_file 设置输出文件
+METRICS = PipelineMetrics(price_input_per_m=PRICE_INPUT_PER_M, price_output_per_m=PRICE_OUTPUT_PER_M)
 
+
+# ==================== 工具函数 ====================
 def encode_image_to_base64(image_path: str) -> Optional[str]:
-    """将图片文件编码为 base64 字符串"""
+    """将图片文件编码为 base64 字符串（启用预处理时先缩放、重新压缩）"""
     try:
-        with open(image_path, 'rb') as f:
-            return base64.b64encode(f.read()).decode('utf-8')
+        if IMAGE_PREPARER is not None:
+            data = IMAGE_PREPARER.prepare(image_path)
+        else:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+        return base64.b64encode(data).decode('utf-8')
     except Exception as e:
         print(f'[ERROR] 编码图片失败 {image_path}: {e}')
         return None
 
 
+def encode_image_shared(image_path: str, image_store: Optional[EncodedImageStore] = None) -> Optional[str]:
+    """编码图片，传入品牌的 image_store 时优先复用已编码结果"""
+    if image_store is None:
+        return encode_image_to_base64(image_path)
+    return image_store.get(image_path, encode_image_to_base64)
+
+
 def get_brand_folders(panorama_dir: str, brand_filter: Optional[List[str]] = None) -> List[str]:
     """
     获取需要处理的品牌文件夹列表
@@ -290,27 +204,21 @@ def group_panorama_images(images_dir: str) -> Dict[str, Dict]:
     
     groups = {}
     for filename in os.listdir(images_dir):
-        if not filename.lower().endswith('.jpg'):
-            continue
-        
         # 解析文件名格式: {uuid}_{index}_{direction}.jpg
-        parts = filename.rsplit('_', 2)
-        if len(parts) != 3:
+        parsed = parse_image_name(filename)
+        if parsed is None:
             continue
         
-        uuid_part, index_part, direction_part = parts
-        direction = direction_part.replace('.jpg', '')
+        # 分组键: uuid_index
+        group_key, seq_id, direction = parsed
         
         # 跳过 d（向下）和 t（向上）方向的图片
-        if direction in ['d', 't']:
+        if direction in SKIPPED_DIRECTIONS:
             continue
         
-        # 分组键: uuid_index
-        group_key = f"{uuid_part}_{index_part}"
-        
         if group_key not in groups:
             groups[group_key] = {
-                'seq_id': int(index_part),  # 点位编号
+                'seq_id': seq_id,  # 点位编号
                 'images': []
             }
         
@@ -319,32 +227,20 @@ def group_panorama_images(images_dir: str) -> Dict[str, Dict]:
     return groups
 
 
-def call_doubao_vision_api(
-    image_paths: List[str], 
-    prompt: str,
-    api_key: str,
-    base_url: str,
-    seq_id: int,
-    panorama_id: int
-) -> Optional[Dict]:
+# ==================== 请求构建与结果解析 ====================
+DIRECTION_NAMES = {'f': '前', 'b': '后', 'l': '左', 'r': '右'}
+
+
+def encode_direction_images(
+    image_paths: List[str],
+    image_store: Optional[EncodedImageStore] = None
+) -> List[Dict]:
     """
-    调用豆包视觉模型 API（使用 OpenAI SDK）
-    
-    Args:
-        image_paths: 图片路径列表（一个全景位置的多个方向）
-        prompt: 提示词
-        api_key: API 密钥
-        base_url: API 基础 URL
-        seq_id: VR 点位序列号（用于内部标识）
-        panorama_id: VR 点位 ID（JSON 中的 id 字段，传给模型）
-    
+    按 f/b/l/r 顺序编码一个点位的各方向图片（传入 image_store 时复用品牌内已编码的图片）
+
     Returns:
-        模型返回的 JSON 结果，失败返回 None
+        [{'direction': 'f', 'base64': '...'}, ...]
     """
-    if not api_key:
-        print('[ERROR] 未设置 DOUBAO_API_KEY 环境变量')
-        return None
-    
     # 准备四个方向的图片（f/b/l/r）
     direction_images = {'f': None, 'b': None, 'l': None, 'r': None}
     
@@ -358,41 +254,27 @@ def call_doubao_vision_api(
     encoded_images = []
     for direction in ['f', 'b', 'l', 'r']:
         if direction_images[direction]:
-            img_base64 = encode_image_to_base64(direction_images[direction])
+            img_base64 = encode_image_shared(direction_images[direction], image_store)
             if img_base64:
                 encoded_images.append({
                     'direction': direction,
                     'base64': img_base64
                 })
-    
-    if not encoded_images:
-        print('[WARN] 未找到有效图片')
-        return None
-    
-    print(f'[DEBUG] 点位 seq_id={seq_id}, panorama_id={panorama_id}: 找到 {len(encoded_images)} 个方向的图片：{[img["direction"] for img in encoded_images]}')
-    
-    # 计算总的图片大小（用于调试）
-    total_size = sum(len(img['base64']) for img in encoded_images)
-    print(f'[DEBUG] 点位 {panorama_id}: Base64 总大小约 {total_size / 1024 / 1024:.2f} MB')
-    
-    # 初始化 OpenAI 客户端（兼容豆包 API）
-    client = OpenAI(
-        api_key=api_key,
-        base_url=base_url
-    )
-    
+    return encoded_images
+
+
+def build_vision_content(encoded_images: List[Dict], prompt: str, panorama_id: int) -> List[Dict]:
+    """构建单点位商品分析的消息内容（所有方向图片 + 提示词）"""
     # 在提示词中加入点位 ID 和方向信息（使用 panorama_id 而不是 seq_id）
     full_prompt = f"【当前 VR 点位 ID：{panorama_id}】\n"
     full_prompt += f"【图片方向：共 {len(encoded_images)} 个视角，按顺序为 "
-    full_prompt += "、".join([f"图{i+1}({img['direction']}-{'前' if img['direction']=='f' else '后' if img['direction']=='b' else '左' if img['direction']=='l' else '右'})" 
+    full_prompt += "、".join([f"图{i+1}({img['direction']}-{DIRECTION_NAMES[img['direction']]})" 
                               for i, img in enumerate(encoded_images)])
     full_prompt += "】\n\n"
     full_prompt += prompt
     
-    # 构建内容数组，包含所有图片和提示词
+    # 构建内容数组，先添加所有图片
     content = []
-    
-    # 先添加所有图片
     for img in encoded_images:
         content.append({
             'type': 'image_url',
@@ -406,13 +288,303 @@ def call_doubao_vision_api(
         'type': 'text',
         'text': full_prompt
     })
+    return content
+
+
+def encode_store_images(
+    all_point_images: List[Dict],
+    image_store: Optional[EncodedImageStore] = None
+) -> List[Dict]:
+    """
+    编码店铺分析所需的图片（每个点位选择 f 方向，传入 image_store 时复用商品分析已编码的图片）
+    设置了 STORE_TILE_COLS 时，所有点位的图片拼成一张，返回的唯一一项中 seq_id 为点位列表
+
+    Returns:
+        [{'seq_id': 0, 'base64': '...'}, ...]
+        或拼图模式 [{'seq_id': [0, 1, ...], 'base64': '...', 'tiled': True}]
+    """
+    if STORE_TILE_COLS and IMAGE_PREPARER is not None:
+        seq_ids = []
+        paths = []
+        for point_data in all_point_images:
+            for path in point_data['images']:
+                if path.endswith('_f.jpg'):
+                    seq_ids.append(point_data['seq_id'])
+                    paths.append(path)
+                    break
+        if not paths:
+            return []
+        try:
+            mosaic = IMAGE_PREPARER.tile(paths, cols=STORE_TILE_COLS)
+        except Exception as e:
+            print(f'[ERROR] 拼图失败 {paths}: {e}')
+            return []
+        return [{
+            'seq_id': seq_ids,
+            'base64': base64.b64encode(mosaic).decode('utf-8'),
+            'tiled': True
+        }]
+    
+    encoded_images = []
+    for point_data in all_point_images:
+        image_paths = point_data['images']
+        # 找到f方向的图片
+        for path in image_paths:
+            if path.endswith('_f.jpg'):
+                img_base64 = encode_image_shared(path, image_store)
+                if img_base64:
+                    encoded_images.append({
+                        'seq_id': point_data['seq_id'],
+                        'base64': img_base64
+                    })
+                break
+    return encoded_images
+
+
+def store_point_seq_ids(encoded_images: List[Dict]) -> List[int]:
+    """店铺分析图片对应的点位列表（兼容拼图模式）"""
+    seq_ids = []
+    for img in encoded_images:
+        if img.get('tiled'):
+            seq_ids.extend(img['seq_id'])
+        else:
+            seq_ids.append(img['seq_id'])
+    return seq_ids
+
+
+def build_store_content(encoded_images: List[Dict], prompt: str, brand_name: str) -> List[Dict]:
+    """构建店铺环境分析的消息内容"""
+    full_prompt = f"【品牌名称：{brand_name}】\n"
+    if encoded_images and encoded_images[0].get('tiled'):
+        num_points = len(store_point_seq_ids(encoded_images))
+        full_prompt += f"【包含点位：{num_points} 个VR点位，已拼成一张 {STORE_TILE_COLS} 列的拼图，按从左到右、从上到下排列】\n\n"
+    else:
+        full_prompt += f"【包含点位：{len(encoded_images)} 个VR点位】\n\n"
+    full_prompt += prompt
+    
+    content = []
+    for img in encoded_images:
+        content.append({
+            'type': 'image_url',
+            'image_url': {
+                'url': f'data:image/jpeg;base64,{img["base64"]}'
+            }
+        })
+    
+    content.append({
+        'type': 'text',
+        'text': full_prompt
+    })
+    return content
+
+
+def parse_model_json(response_content: str, debug_file: str, error_label: str = 'JSON 解析失败') -> Dict:
+    """
+    解析模型返回的 JSON 文本（兼容 markdown 代码块和尾部多余内容）
+
+    Args:
+        response_content: 模型返回的原始文本
+        debug_file: 解析失败时保存完整响应的文件名
+        error_label: 解析失败时的日志前缀
+
+    Returns:
+        解析后的 JSON；解析失败时返回 {'raw_content': ..., 'parse_error': ...}
+    """
+    try:
+        # 清理可能的 markdown 代码块标记
+        response_content = response_content.strip()
+        if response_content.startswith('```json'):
+            response_content = response_content[7:]
+        if response_content.startswith('```'):
+            response_content = response_content[3:]
+        if response_content.endswith('```'):
+            response_content = response_content[:-3]
+        response_content = response_content.strip()
+        
+        # 使用 JSONDecoder 的 raw_decode，它会忽略尾部额外数据
+        decoder = json.JSONDecoder()
+        try:
+            result, index = decoder.raw_decode(response_content)
+            
+            # 检查是否有额外数据
+            remaining = response_content[index:].strip()
+            if remaining:
+                print(f'[WARN] JSON 解析成功，但发现额外数据（已忽略）: {remaining[:100]}...')
+            
+            return result
+        except json.JSONDecodeError:
+            # 如果 raw_decode 也失败，尝试标准 json.loads
+            return json.loads(response_content)
+            
+    except json.JSONDecodeError as e:
+        print(f'[ERROR] {error_label}: {e}')
+        
+        # 显示错误位置附近的内容
+        error_pos = e.pos if hasattr(e, 'pos') else 0
+        start = max(0, error_pos - 200)
+        end = min(len(response_content), error_pos + 200)
+        
+        print('错误位置附近的内容（前后各200字符）:')
+        print(f'...[{start}:{error_pos}]...')
+        print(response_content[start:error_pos])
+        print('>>> 错误位置 <<<')
+        print(response_content[error_pos:end])
+        print(f'...[{error_pos}:{end}]...')
+        
+        # 保存完整内容到文件以便调试
+        try:
+            with open(debug_file, 'w', encoding='utf-8') as f:
+                f.write(response_content)
+            print(f'[DEBUG] 完整响应已保存到: {debug_file}')
+        except Exception:
+            pass
+        
+        return {'raw_content': response_content, 'parse_error': str(e)}
+
+
+def extract_response_result(response, debug_file: str, error_label: str = 'JSON 解析失败') -> Optional[Dict]:
+    """从 chat.completions 响应中取出第一条回复并解析为 JSON"""
+    if response.choices and len(response.choices) > 0:
+        return parse_model_json(response.choices[0].message.content, debug_file, error_label)
+    return None
+
+
+def estimate_request_tokens(num_images: int) -> int:
+    """预估一次请求消耗的 token 数（用于 TPM 限流）"""
+    return EST_PROMPT_TOKENS + num_images * EST_TOKENS_PER_IMAGE + EST_COMPLETION_TOKENS
+
+
+def estimate_request_cost(num_images: int) -> float:
+    """预估一次请求的费用（元）"""
+    input_tokens = EST_PROMPT_TOKENS + num_images * EST_TOKENS_PER_IMAGE
+    return (input_tokens * PRICE_INPUT_PER_M + EST_COMPLETION_TOKENS * PRICE_OUTPUT_PER_M) / 1_000_000
+
+
+def content_cache_key(content: List[Dict]) -> Optional[str]:
+    """
+    根据消息内容计算结果缓存键：各图片内容哈希 + 完整提示词 + 模型名称 + 采样参数
+    未启用缓存时返回 None
+    """
+    if RESULT_CACHE is None:
+        return None
+    image_hashes = [sha256_text(item['image_url']['url']) for item in content if item['type'] == 'image_url']
+    prompt = ''.join(item['text'] for item in content if item['type'] == 'text')
+    return RESULT_CACHE.make_key(image_hashes, prompt, DOUBAO_MODEL, SAMPLING_PARAMS)
+
+
+def get_cached_result(cache_key: Optional[str]) -> Optional[Dict]:
+    """读取结果缓存，未启用、只写不读或未命中返回 None"""
+    if RESULT_CACHE is None or cache_key is None or not RESULT_CACHE_READ:
+        return None
+    return RESULT_CACHE.get(cache_key)
+
+
+def put_cached_result(cache_key: Optional[str], result: Optional[Dict]):
+    """写入结果缓存（失败或 JSON 解析失败的结果不缓存）"""
+    if RESULT_CACHE is None or cache_key is None:
+        return
+    if not result or 'parse_error' in result:
+        return
+    RESULT_CACHE.put(cache_key, result)
+
+
+# ==================== 请求指标 ====================
+def elapsed_ms(start: float) -> float:
+    """从 start（time.perf_counter()）到现在的毫秒数"""
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def record_response_metrics(metric: Dict, response, start: float):
+    """记录模型调用耗时、连接信息（建连、首字节、请求体大小）和实际 token 用量"""
+    metric['latency_ms'] = elapsed_ms(start)
+    call_info = last_call_info() or {}
+    metric['setup_ms'] = call_info.get('setup_ms')
+    metric['ttfb_ms'] = call_info.get('ttfb_ms')
+    metric['request_bytes'] = call_info.get('request_bytes')
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        metric['prompt_tokens'] = usage.prompt_tokens
+        metric['completion_tokens'] = usage.completion_tokens
+
+
+def parse_response_timed(metric: Dict, response, debug_file: str, error_label: str = 'JSON 解析失败') -> Optional[Dict]:
+    """extract_response_result 并记录 JSON 解析耗时"""
+    start = time.perf_counter()
+    result = extract_response_result(response, debug_file, error_label)
+    metric['parse_ms'] = elapsed_ms(start)
+    if result is not None and 'parse_error' in result:
+        metric['status'] = STATUS_PARSE_ERROR
+    return result
+
+
+# ==================== 模型调用 ====================
+def call_doubao_vision_api(
+    image_paths: List[str], 
+    prompt: str,
+    api_key: str,
+    base_url: str,
+    seq_id: int,
+    panorama_id: int,
+    image_store: Optional[EncodedImageStore] = None,
+    brand_name: str = ''
+) -> Optional[Dict]:
+    """
+    调用豆包视觉模型 API（使用 OpenAI SDK）
+    
+    Args:
+        image_paths: 图片路径列表（一个全景位置的多个方向）
+        prompt: 提示词
+        api_key: API 密钥
+        base_url: API 基础 URL
+        seq_id: VR 点位序列号（用于内部标识）
+        panorama_id: VR 点位 ID（JSON 中的 id 字段，传给模型）
+        image_store: 品牌内共用的已编码图片存储，None 表示每次重新编码
+        brand_name: 品牌名称（用于请求指标）
+    
+    Returns:
+        模型返回的 JSON 结果，失败返回 None
+    """
+    if not api_key:
+        print('[ERROR] 未设置 DOUBAO_API_KEY 环境变量')
+        return None
     
+    metric = METRICS.start(brand_name, 'point', seq_id, panorama_id)
+    start = time.perf_counter()
+    encoded_images = encode_direction_images(image_paths, image_store)
+    metric['encode_ms'] = elapsed_ms(start)
+    
+    if not encoded_images:
+        print('[WARN] 未找到有效图片')
+        return None
+    metric['images'] = len(encoded_images)
+    
+    print(f'[DEBUG] 点位 seq_id={seq_id}, panorama_id={panorama_id}: 找到 {len(encoded_images)} 个方向的图片：{[img["direction"] for img in encoded_images]}')
+    
+    # 计算总的图片大小（用于调试）
+    total_size = sum(len(img['base64']) for img in encoded_images)
+    print(f'[DEBUG] 点位 {panorama_id}: Base64 总大小约 {total_size / 1024 / 1024:.2f} MB')
+    
+    # 获取共享的 OpenAI 客户端（兼容豆包 API，复用连接池）
+    client = get_shared_client(api_key, base_url, max_connections=CLIENT_MAX_CONNECTIONS, timeout=TIMEOUT)
+    
+    content = build_vision_content(encoded_images, prompt, panorama_id)
+    
+    cache_key = content_cache_key(content)
+    cached = get_cached_result(cache_key)
+    if cached is not None:
+        print(f'[INFO] 点位 {panorama_id}: 命中结果缓存，跳过模型调用')
+        metric['status'] = STATUS_CACHE_HIT
+        METRICS.record(metric)
+        return cached
+    
+    requests_before = request_count()
     try:
         print(f'[DEBUG] 正在发送请求到: {base_url}')
         print(f'[DEBUG] 使用模型: {DOUBAO_MODEL}')
         print(f'[DEBUG] 请求包含 {len(encoded_images)} 张图片')
         
         # 使用 OpenAI SDK 调用（兼容豆包 API）
+        start = time.perf_counter()
         response = client.chat.completions.create(
             model=DOUBAO_MODEL,
             messages=[
@@ -421,73 +593,25 @@ def call_doubao_vision_api(
                     'content': content
                 }
             ],
-            temperature=0.7,
-            max_tokens=4096,
-            timeout=TIMEOUT
+            timeout=TIMEOUT,
+            **SAMPLING_PARAMS
         )
         
-        print(f'[DEBUG] 收到响应，消耗 tokens: {response.usage.total_tokens if hasattr(response, "usage") else "未知"}')
+        record_response_metrics(metric, response, start)
+        metric['retries'] = max(0, request_count() - requests_before - 1)
         
-        # 解析返回内容
-        if response.choices and len(response.choices) > 0:
-            response_content = response.choices[0].message.content
-            
-            # 尝试解析为 JSON
-            try:
-                # 清理可能的 markdown 代码块标记
-                response_content = response_content.strip()
-                if response_content.startswith('```json'):
-                    response_content = response_content[7:]
-                if response_content.startswith('```'):
-                    response_content = response_content[3:]
-                if response_content.endswith('```'):
-                    response_content = response_content[:-3]
-                response_content = response_content.strip()
-                
-                # 使用 JSONDecoder 的 raw_decode，它会忽略尾部额外数据
-                decoder = json.JSONDecoder()
-                try:
-                    result, index = decoder.raw_decode(response_content)
-                    
-                    # 检查是否有额外数据
-                    remaining = response_content[index:].strip()
-                    if remaining:
-                        print(f'[WARN] JSON 解析成功，但发现额外数据（已忽略）: {remaining[:100]}...')
-                    
-                    return result
-                except json.JSONDecodeError:
-                    # 如果 raw_decode 也失败，尝试标准 json.loads
-                    return json.loads(response_content)
-                    
-            except json.JSONDecodeError as e:
-                print(f'[ERROR] JSON 解析失败: {e}')
-                
-                # 显示错误位置附近的内容
-                error_pos = e.pos if hasattr(e, 'pos') else 0
-                start = max(0, error_pos - 200)
-                end = min(len(response_content), error_pos + 200)
-                
-                print('错误位置附近的内容（前后各200字符）:')
-                print(f'...[{start}:{error_pos}]...')
-                print(response_content[start:error_pos])
-                print('>>> 错误位置 <<<')
-                print(response_content[error_pos:end])
-                print(f'...[{error_pos}:{end}]...')
-                
-                # 保存完整内容到文件以便调试
-                debug_file = f'debug_json_error_{seq_id}_{panorama_id}.txt'
-                try:
-                    with open(debug_file, 'w', encoding='utf-8') as f:
-                        f.write(response_content)
-                    print(f'[DEBUG] 完整响应已保存到: {debug_file}')
-                except Exception:
-                    pass
-                
-                return {'raw_content': response_content, 'parse_error': str(e)}
+        print(f'[DEBUG] 收到响应，消耗 tokens: {response.usage.total_tokens if hasattr(response, "usage") else "未知"}')
+        print(f'[DEBUG] 点位 {panorama_id}: {format_call_info(last_call_info())}')
         
-        return None
+        result = parse_response_timed(metric, response, f'debug_json_error_{seq_id}_{panorama_id}.txt')
+        put_cached_result(cache_key, result)
+        METRICS.record(metric)
+        return result
         
     except Exception as e:
+        metric['status'] = STATUS_FAILED
+        metric['retries'] = max(0, request_count() - requests_before - 1)
+        METRICS.record(metric)
         error_msg = str(e)
         print(f'[ERROR] API 调用失败: {error_msg}')
         print(f'[调试信息] Base URL: {base_url}')
@@ -514,7 +638,8 @@ def call_doubao_store_analysis_api(
     prompt: str,
     api_key: str,
     base_url: str,
-    brand_name: str
+    brand_name: str,
+    image_store: Optional[EncodedImageStore] = None
 ) -> Optional[Dict]:
     """
     调用豆包 API 分析整个店铺环境（综合所有点位）
@@ -525,6 +650,7 @@ def call_doubao_store_analysis_api(
         api_key: API 密钥
         base_url: API 基础 URL
         brand_name: 品牌名称
+        image_store: 品牌内共用的已编码图片存储（与商品分析共用），None 表示重新编码
     
     Returns:
         模型返回的 JSON 结果，失败返回 None
@@ -535,56 +661,37 @@ def call_doubao_store_analysis_api(
     
     # 收集所有点位的图片（每个点位选择f方向）
     # 这里的 all_point_images 已经是选择好的点位了（最多5个）
-    encoded_images = []
-    for point_data in all_point_images:
-        image_paths = point_data['images']
-        # 找到f方向的图片
-        for path in image_paths:
-            if path.endswith('_f.jpg'):
-                img_base64 = encode_image_to_base64(path)
-                if img_base64:
-                    encoded_images.append({
-                        'seq_id': point_data['seq_id'],
-                        'base64': img_base64
-                    })
-                break
+    metric = METRICS.start(brand_name, 'store')
+    start = time.perf_counter()
+    encoded_images = encode_store_images(all_point_images, image_store)
+    metric['encode_ms'] = elapsed_ms(start)
     
     if not encoded_images:
         print('[WARN] 未找到有效的店铺图片')
         return None
+    metric['images'] = len(encoded_images)
     
-    point_seq_ids = [img['seq_id'] for img in encoded_images]
-    print(f'[INFO] 店铺环境分析：收集了 {len(encoded_images)} 个点位的图片 {point_seq_ids}')
+    point_seq_ids = store_point_seq_ids(encoded_images)
+    print(f'[INFO] 店铺环境分析：收集了 {len(point_seq_ids)} 个点位的图片 {point_seq_ids}')
     
-    # 初始化客户端
-    client = OpenAI(
-        api_key=api_key,
-        base_url=base_url
-    )
+    # 获取共享客户端
+    client = get_shared_client(api_key, base_url, max_connections=CLIENT_MAX_CONNECTIONS, timeout=TIMEOUT)
     
-    # 构建提示词
-    full_prompt = f"【品牌名称：{brand_name}】\n"
-    full_prompt += f"【包含点位：{len(encoded_images)} 个VR点位】\n\n"
-    full_prompt += prompt
+    content = build_store_content(encoded_images, prompt, brand_name)
     
-    # 构建内容数组
-    content = []
-    for img in encoded_images:
-        content.append({
-            'type': 'image_url',
-            'image_url': {
-                'url': f'data:image/jpeg;base64,{img["base64"]}'
-            }
-        })
-    
-    content.append({
-        'type': 'text',
-        'text': full_prompt
-    })
+    cache_key = content_cache_key(content)
+    cached = get_cached_result(cache_key)
+    if cached is not None:
+        print(f'[INFO] {brand_name}: 店铺分析命中结果缓存，跳过模型调用')
+        metric['status'] = STATUS_CACHE_HIT
+        METRICS.record(metric)
+        return cached
     
+    requests_before = request_count()
     try:
         print('[DEBUG] 正在分析店铺环境...')
         
+        start = time.perf_counter()
         response = client.chat.completions.create(
             model=DOUBAO_MODEL,
             messages=[
@@ -593,76 +700,397 @@ def call_doubao_store_analysis_api(
                     'content': content
                 }
             ],
-            temperature=0.7,
-            max_tokens=4096,
-            timeout=TIMEOUT
+            timeout=TIMEOUT,
+            **SAMPLING_PARAMS
         )
         
-        print('[DEBUG] 店铺分析完成')
-        
-        if response.choices and len(response.choices) > 0:
-            response_content = response.choices[0].message.content
-            
-            try:
-                response_content = response_content.strip()
-                
-                # 清理 markdown 代码块
-                if response_content.startswith('```json'):
-                    response_content = response_content[7:]
-                if response_content.startswith('```'):
-                    response_content = response_content[3:]
-                if response_content.endswith('```'):
-                    response_content = response_content[:-3]
-                response_content = response_content.strip()
-                
-                # 使用 JSONDecoder 的 raw_decode，它会忽略尾部额外数据
-                decoder = json.JSONDecoder()
-                try:
-                    result, index = decoder.raw_decode(response_content)
-                    
-                    # 检查是否有额外数据
-                    remaining = response_content[index:].strip()
-                    if remaining:
-                        print(f'[WARN] JSON 解析成功，但发现额外数据（已忽略）: {remaining[:100]}...')
-                    
-                    return result
-                except json.JSONDecodeError:
-                    # 如果 raw_decode 也失败，尝试标准 json.loads
-                    return json.loads(response_content)
-                    
-            except json.JSONDecodeError as e:
-                print(f'[ERROR] 店铺分析 JSON 解析失败: {e}')
-                
-                # 显示错误位置附近的内容
-                error_pos = e.pos if hasattr(e, 'pos') else 0
-                start = max(0, error_pos - 200)
-                end = min(len(response_content), error_pos + 200)
-                
-                print('错误位置附近的内容（前后各200字符）:')
-                print(f'...[{start}:{error_pos}]...')
-                print(response_content[start:error_pos])
-                print('>>> 错误位置 <<<')
-                print(response_content[error_pos:end])
-                print(f'...[{error_pos}:{end}]...')
-                
-                # 保存完整内容到文件以便调试
-                debug_file = f'debug_store_json_error_{brand_name}.txt'
-                try:
-                    with open(debug_file, 'w', encoding='utf-8') as f:
-                        f.write(response_content)
-                    print(f'[DEBUG] 完整响应已保存到: {debug_file}')
-                except Exception:
-                    pass
-                
-                return {'raw_content': response_content, 'parse_error': str(e)}
+        record_response_metrics(metric, response, start)
+        metric['retries'] = max(0, request_count() - requests_before - 1)
+        print(f'[DEBUG] 店铺分析完成（{format_call_info(last_call_info())}）')
         
-        return None
+        result = parse_response_timed(
+            metric,
+            response,
+            f'debug_store_json_error_{brand_name}.txt',
+            '店铺分析 JSON 解析失败'
+        )
+        put_cached_result(cache_key, result)
+        METRICS.record(metric)
+        return result
         
     except Exception as e:
+        metric['status'] = STATUS_FAILED
+        metric['retries'] = max(0, request_count() - requests_before - 1)
+        METRICS.record(metric)
         print(f'[ERROR] 店铺环境分析失败: {e}')
         return None
 
 
+async def request_model_async(
+    content: List[Dict],
+    api_key: str,
+    base_url: str,
+    scheduler: AsyncScheduler,
+    label: str,
+    debug_file: str,
+    error_label: str = 'JSON 解析失败',
+    metric: Optional[Dict] = None
+) -> Optional[Dict]:
+    """
+    通过全局调度器发送一次模型请求（受并发/RPM/TPM 限制，可重试错误自动退避重试）
+    传入 metric 时记录模型调用、JSON 解析耗时和重试次数，完成后写入 METRICS
+    
+    Returns:
+        解析后的 JSON 结果，重试耗尽或不可重试错误时返回 None
+    """
+    if metric is None:
+        metric = METRICS.start('', 'point')
+    num_images = sum(1 for item in content if item['type'] == 'image_url')
+    est_tokens = estimate_request_tokens(num_images)
+    
+    async def send() -> Optional[Dict]:
+        client = get_shared_async_client(
+            api_key,
+            base_url,
+            max_connections=scheduler.max_in_flight,
+            timeout=TIMEOUT
+        )
+        start = time.perf_counter()
+        response = await client.chat.completions.create(
+            model=DOUBAO_MODEL,
+            messages=[
+                {
+                    'role': 'user',
+                    'content': content
+                }
+            ],
+            timeout=TIMEOUT,
+            **SAMPLING_PARAMS
+        )
+        record_response_metrics(metric, response, start)
+        used_tokens = response.usage.total_tokens if getattr(response, 'usage', None) else None
+        scheduler.settle_tokens(est_tokens, used_tokens)
+        print(f'[DEBUG] {label}: 消耗 tokens {used_tokens if used_tokens is not None else "未知"}，{format_call_info(last_call_info())}')
+        return parse_response_timed(metric, response, debug_file, error_label)
+    
+    requests_before = request_count()
+    result = await scheduler.run(send, tokens=est_tokens, label=label)
+    metric['retries'] = max(0, request_count() - requests_before - 1)
+    if result is None:
+        metric['status'] = STATUS_FAILED
+    METRICS.record(metric)
+    return result
+
+
+async def call_doubao_vision_api_async(
+    image_paths: List[str],
+    prompt: str,
+    api_key: str,
+    base_url: str,
+    seq_id: int,
+    panorama_id: int,
+    scheduler: AsyncScheduler,
+    brand_name: str = '',
+    image_store: Optional[EncodedImageStore] = None
+) -> Optional[Dict]:
+    """
+    call_doubao_vision_api 的异步版本（--engine async），请求交给全局调度器执行
+    
+    Returns:
+        模型返回的 JSON 结果，失败返回 None
+    """
+    metric = METRICS.start(brand_name, 'point', seq_id, panorama_id)
+    start = time.perf_counter()
+    encoded_images = await asyncio.to_thread(encode_direction_images, image_paths, image_store)
+    metric['encode_ms'] = elapsed_ms(start)
+    
+    if not encoded_images:
+        print(f'[WARN] {brand_name} 点位 {seq_id}: 未找到有效图片')
+        return None
+    metric['images'] = len(encoded_images)
+    
+    total_size = sum(len(img['base64']) for img in encoded_images)
+    print(f'[DEBUG] {brand_name} 点位 seq_id={seq_id}, panorama_id={panorama_id}: {len(encoded_images)} 张图片，Base64 总大小约 {total_size / 1024 / 1024:.2f} MB')
+    
+    content = build_vision_content(encoded_images, prompt, panorama_id)
+    
+    # 命中缓存时直接返回，不占用调度器的并发和限流配额
+    cache_key = content_cache_key(content)
+    cached = get_cached_result(cache_key)
+    if cached is not None:
+        print(f'[INFO] {brand_name} 点位 {panorama_id}: 命中结果缓存，跳过模型调用')
+        metric['status'] = STATUS_CACHE_HIT
+        METRICS.record(metric)
+        return cached
+    
+    result = await request_model_async(
+        content,
+        api_key,
+        base_url,
+        scheduler,
+        label=f'{brand_name} 点位 {seq_id}',
+        debug_file=f'debug_json_error_{seq_id}_{panorama_id}.txt',
+        metric=metric
+    )
+    put_cached_result(cache_key, result)
+    return result
+
+
+async def call_doubao_store_analysis_api_async(
+    all_point_images: List[Dict],
+    prompt: str,
+    api_key: str,
+    base_url: str,
+    brand_name: str,
+    scheduler: AsyncScheduler,
+    image_store: Optional[EncodedImageStore] = None
+) -> Optional[Dict]:
+    """call_doubao_store_analysis_api 的异步版本（--engine async），请求交给全局调度器执行"""
+    metric = METRICS.start(brand_name, 'store')
+    start = time.perf_counter()
+    encoded_images = await asyncio.to_thread(encode_store_images, all_point_images, image_store)
+    metric['encode_ms'] = elapsed_ms(start)
+    
+    if not encoded_images:
+        print(f'[WARN] {brand_name}: 未找到有效的店铺图片')
+        return None
+    metric['images'] = len(encoded_images)
+    
+    point_seq_ids = store_point_seq_ids(encoded_images)
+    print(f'[INFO] {brand_name} 店铺环境分析：收集了 {len(point_seq_ids)} 个点位的图片 {point_seq_ids}')
+    
+    content = build_store_content(encoded_images, prompt, brand_name)
+    
+    cache_key = content_cache_key(content)
+    cached = get_cached_result(cache_key)
+    if cached is not None:
+        print(f'[INFO] {brand_name}: 店铺分析命中结果缓存，跳过模型调用')
+        metric['status'] = STATUS_CACHE_HIT
+        METRICS.record(metric)
+        return cached
+    
+    result = await request_model_async(
+        content,
+        api_key,
+        base_url,
+        scheduler,
+        label=f'{brand_name} 店铺分析',
+        debug_file=f'debug_store_json_error_{brand_name}.txt',
+        error_label='店铺分析 JSON 解析失败',
+        metric=metric
+    )
+    put_cached_result(cache_key, result)
+    return result
+
+
+# ==================== 品牌处理 ====================
+def plan_brand(
+    brand_folder: str,
+    vr_loc_list: Optional[List[int]] = None,
+    max_product_points: int = 10,
+    max_store_points: int = 10,
+    verbose: bool = True
+) -> Optional[Dict]:
+    """
+    规划单个品牌的分析任务：加载坐标、分组图片、选择商品/店铺分析点位
+    verbose 为 False 时不打印规划详情（用于生成续跑计划）
+    
+    Returns:
+        {
+            'brand': '品牌名',
+            'coordinates': {seq_id: {...}},
+            'seq_to_data': {seq_id: {'images': [...], 'panorama_id': 点位ID}},
+            'product_seq_ids': [...],
+            'store_point_images': [{'seq_id': 0, 'images': [...]}, ...],
+            'image_store': EncodedImageStore  # 品牌内商品/店铺分析共用的已编码图片
+        }
+        没有有效图片时返回 None
+    """
+    brand_name = os.path.basename(brand_folder)
+    images_dir = os.path.join(brand_folder, 'images')
+    
+    # 加载点位坐标信息
+    coordinates = load_panorama_coordinates(brand_folder)
+    
+    # 分组全景图片
+    panorama_groups = group_panorama_images(images_dir)
+    
+    if not panorama_groups:
+        print(f'[WARN] {brand_name}: 未找到有效的全景图片')
+        return None
+    
+    # 获取所有点位的 seq_id 并排序（以 JSON 中的点位为准，02 按计划只下载了部分点位时选择结果不变）
+    all_seq_ids = candidate_seq_ids(coordinates, [pg['seq_id'] for pg in panorama_groups.values()])
+    
+    # 应用 vr_loc_list 筛选（如果有），选择商品分析和店铺分析的样本点位
+    all_seq_ids, product_seq_ids, store_seq_ids = select_analysis_points(
+        all_seq_ids, vr_loc_list, max_product_points, max_store_points, verbose=verbose
+    )
+    if vr_loc_list is not None and verbose:
+        print(f'\n[INFO] 应用 vr_loc_list 筛选后: {len(all_seq_ids)} 个点位')
+    
+    if verbose:
+        print(f'\n[INFO] 开始处理品牌: {brand_name}')
+        print(f'  - 总点位数: {len(panorama_groups)}')
+        if vr_loc_list is not None:
+            print(f'  - 筛选后: {len(all_seq_ids)} 个点位')
+        print(f'  - 商品分析点位: {len(product_seq_ids)} 个 {product_seq_ids}')
+        print(f'  - 店铺分析点位: {len(store_seq_ids)} 个 {store_seq_ids}')
+    
+    image_seq_ids = {pg['seq_id'] for pg in panorama_groups.values()}
+    missing = sorted(set(product_seq_ids + store_seq_ids) - image_seq_ids)
+    if missing:
+        print(f'[WARN] {brand_name}: 选中的点位缺少图片 {missing}，请先运行 02 下载')
+    
+    # 预先建立 seq_id -> (images, panorama_id) 映射，便于任务函数使用
+    seq_to_data: Dict[int, Dict] = {}
+    store_point_images: List[Dict] = []  # 收集店铺分析的点位图片
+    for panorama_key, panorama_data in panorama_groups.items():
+        seq_id = panorama_data['seq_id']
+        image_paths = panorama_data['images']
+        panorama_id_value = coordinates.get(seq_id, {}).get('id', seq_id)
+        seq_to_data[seq_id] = {
+            'images': image_paths,
+            'panorama_id': panorama_id_value
+        }
+        # 只收集店铺分析选中的点位
+        if seq_id in store_seq_ids:
+            store_point_images.append({
+                'seq_id': seq_id,
+                'images': image_paths
+            })
+    
+    return {
+        'brand': brand_name,
+        'coordinates': coordinates,
+        'seq_to_data': seq_to_data,
+        'product_seq_ids': [sid for sid in product_seq_ids if sid in seq_to_data],
+        'store_point_images': store_point_images,
+        'image_store': EncodedImageStore(ENCODED_IMAGE_MAX_MB)
+    }
+
+
+def release_brand_images(plan: Dict):
+    """品牌分析完成后打印图片复用情况并释放已编码图片"""
+    image_store = plan['image_store']
+    if image_store.hits:
+        print(f'[DEBUG] {plan["brand"]}: 图片编码 {image_store.misses} 次，复用已编码图片 {image_store.hits} 次')
+    image_store.clear()
+
+
+def new_brand_result(brand_name: str) -> Dict:
+    """创建空的品牌结果（各点位商品数据 + 整体店铺分析 + 成功/失败计数）"""
+    return {
+        'brand': brand_name,
+        'product_results': [],  # 各点位的商品数据
+        'store_analysis': None,  # 整体店铺环境分析
+        'success_count': 0,
+        'fail_count': 0
+    }
+
+
+def record_point_analysis(brand_result: Dict, plan: Dict, seq_id: int, analysis: Optional[Dict]) -> bool:
+    """
+    将单个点位的分析结果合并到品牌结果中（计算 py_position_3d、更新计数）
+    
+    Returns:
+        是否新增了一条点位结果
+    """
+    data = plan['seq_to_data'][seq_id]
+    panorama_id_value = data['panorama_id']
+    coordinates = plan['coordinates']
+    
+    if not analysis:
+        print(f'[WARN] 点位 {seq_id} (ID:{panorama_id_value}) 分析失败，跳过')
+        brand_result['fail_count'] += 1
+        return False
+    if 'parse_error' in analysis:
+        print(f'[WARN] 点位 {seq_id} (ID:{panorama_id_value}) 模型返回无法解析为 JSON，跳过')
+        brand_result['fail_count'] += 1
+        return False
+    
+    products = analysis.get('products', [])
+    if not products:
+        print(f'[INFO] 点位 {seq_id} (ID:{panorama_id_value}) 未检测到商品，跳过')
+        return False
+    
+    # 为所有商品计算 py_position_3d（基于 bbox 和 view_direction）
+    project_products(
+        [{'seq_id': seq_id, 'products': products}],
+        coordinates,
+        use_orientation=USE_POINT_ORIENTATION
+    )
+    
+    brand_result['product_results'].append({
+        'panorama_id': panorama_id_value,
+        'seq_id': seq_id,
+        'images': data['images'],
+        'products': products
+    })
+    brand_result['success_count'] += 1
+    return True
+
+
+def checkpoint_point(checkpoint: Optional[BrandCheckpoint], plan: Dict, seq_id: int, analysis: Optional[Dict]):
+    """将已分析的点位追加到断点日志（需在 record_point_analysis 之后调用；失败和 JSON 解析失败的点位不记录，重启时重试）"""
+    if checkpoint is None or not analysis or 'parse_error' in analysis:
+        return
+    data = plan['seq_to_data'][seq_id]
+    checkpoint.append_point(seq_id, data['panorama_id'], data['images'], analysis.get('products', []))
+
+
+def restore_brand_progress(brand_result: Dict, plan: Dict, checkpoint: Optional[BrandCheckpoint]) -> List[int]:
+    """
+    从断点日志恢复已完成的点位和店铺分析
+    
+    Returns:
+        仍需分析的商品点位 seq_id 列表
+    """
+    if checkpoint is None:
+        return list(plan['product_seq_ids'])
+    
+    state = checkpoint.load()
+    done_points = state['points']
+    remaining = []
+    for seq_id in plan['product_seq_ids']:
+        record = done_points.get(seq_id)
+        if record is None:
+            remaining.append(seq_id)
+            continue
+        if record['products']:
+            brand_result['product_results'].append({
+                'panorama_id': record['panorama_id'],
+                'seq_id': seq_id,
+                'images': record['images'],
+                'products': record['products']
+            })
+            brand_result['success_count'] += 1
+    brand_result['store_analysis'] = state['store_analysis']
+    
+    restored = len(plan['product_seq_ids']) - len(remaining)
+    if restored or state['store_analysis'] is not None:
+        store_status = '已完成' if state['store_analysis'] is not None else '未完成'
+        print(f'[INFO] {plan["brand"]}: 从断点日志恢复 {restored} 个点位，剩余 {len(remaining)} 个，店铺分析{store_status}')
+    return remaining
+
+
+def needs_store_analysis(brand_result: Dict, plan: Dict) -> bool:
+    """是否还需要进行店铺环境分析"""
+    return bool(plan['store_point_images']) and brand_result['store_analysis'] is None
+
+
+def checkpoint_store(checkpoint: Optional[BrandCheckpoint], store_analysis: Optional[Dict]):
+    """将店铺分析结果追加到断点日志（失败或 JSON 解析失败时不记录，重启时重试）"""
+    if checkpoint is not None and store_analysis is not None and 'parse_error' not in store_analysis:
+        checkpoint.append_store(store_analysis)
+
+
+def finalize_brand(brand_result: Dict, output_dir: Optional[str]):
+    """将品牌结果压缩为最终的 {brand}_analysis.json"""
+    if output_dir:
+        save_results(brand_result, output_dir)
+
+
 def process_brand(
     brand_folder: str,
     api_key: str,
@@ -673,7 +1101,7 @@ def process_brand(
     max_store_points: int = 10
 ) -> Dict:
     """
-    处理单个品牌的所有全景图片
+    处理单个品牌的所有全景图片（线程池引擎）
     
     Args:
         brand_folder: 品牌文件夹路径
@@ -701,16 +1129,9 @@ def process_brand(
         }
     """
     brand_name = os.path.basename(brand_folder)
-    images_dir = os.path.join(brand_folder, 'images')
-    
-    # 加载点位坐标信息
-    coordinates = load_panorama_coordinates(brand_folder)
-    
-    # 分组全景图片
-    panorama_groups = group_panorama_images(images_dir)
+    plan = plan_brand(brand_folder, vr_loc_list, max_product_points, max_store_points)
     
-    if not panorama_groups:
-        print(f'[WARN] {brand_name}: 未找到有效的全景图片')
+    if plan is None:
         return {
             'brand': brand_name,
             'results': [],
@@ -718,165 +1139,329 @@ def process_brand(
             'fail_count': 0
         }
     
-    # 获取所有点位的 seq_id 并排序
-    all_seq_ids = sorted([pg['seq_id'] for pg in panorama_groups.values()])
-    
-    # 应用 vr_loc_list 筛选（如果有）
-    if vr_loc_list is not None:
-        all_seq_ids = [sid for sid in all_seq_ids if sid in vr_loc_list]
-        print(f'\n[INFO] 应用 vr_loc_list 筛选后: {len(all_seq_ids)} 个点位')
-    
-    # 选择商品分析的样本点位（默认不限制）
-    product_seq_ids = select_sample_points(all_seq_ids, max_points=max_product_points)
-    
-    # 选择店铺分析的样本点位（默认10个）
-    store_seq_ids = select_sample_points(all_seq_ids, max_points=max_store_points)
-    
-    print(f'\n[INFO] 开始处理品牌: {brand_name}')
-    print(f'  - 总点位数: {len(panorama_groups)}')
-    if vr_loc_list is not None:
-        print(f'  - 筛选后: {len(all_seq_ids)} 个点位')
-    print(f'  - 商品分析点位: {len(product_seq_ids)} 个 {product_seq_ids}')
-    print(f'  - 店铺分析点位: {len(store_seq_ids)} 个 {store_seq_ids}')
-    
-    # ========== 第一阶段：按点位分析商品（并发 + 增量写入） ==========
+    # ========== 第一阶段：按点位分析商品（并发 + 断点日志） ==========
     print('[INFO] 第一阶段：分析各点位商品（并发 5）...')
     
-    product_results: List[Dict] = []
-    store_point_images: List[Dict] = []  # 收集店铺分析的点位图片
-    success_count = 0
-    fail_count = 0
-    write_lock = threading.Lock()
-    
-    # 预先建立 seq_id -> (images, panorama_id) 映射，便于任务函数使用
-    seq_to_data: Dict[int, Dict] = {}
-    for panorama_key, panorama_data in panorama_groups.items():
-        seq_id = panorama_data['seq_id']
-        image_paths = panorama_data['images']
-        panorama_id_value = coordinates.get(seq_id, {}).get('id', seq_id)
-        seq_to_data[seq_id] = {
-            'images': image_paths,
-            'panorama_id': panorama_id_value
-        }
+    brand_result = new_brand_result(brand_name)
+    checkpoint = BrandCheckpoint(output_dir, brand_name) if output_dir else None
+    remaining_seq_ids = restore_brand_progress(brand_result, plan, checkpoint)
     
     def analyze_point(seq_id: int) -> Dict:
-        data = seq_to_data[seq_id]
-        image_paths = data['images']
-        panorama_id_value = data['panorama_id']
-        analysis = call_doubao_vision_api(
-            image_paths,
+        data = plan['seq_to_data'][seq_id]
+        return call_doubao_vision_api(
+            data['images'],
             vr_product_prompt,
             api_key,
             base_url,
             seq_id,
-            panorama_id_value
+            data['panorama_id'],
+            plan['image_store'],
+            brand_name
         )
-        return {
-            'seq_id': seq_id,
-            'panorama_id': panorama_id_value,
-            'images': image_paths,
-            'analysis': analysis
-        }
     
-    # 仅提交选中的商品点位
+    # 仅提交选中且尚未完成的商品点位
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         futures = {}
-        for seq_id in product_seq_ids:
-            if seq_id in seq_to_data:
-                futures[executor.submit(analyze_point, seq_id)] = seq_id
+        for seq_id in remaining_seq_ids:
+            futures[executor.submit(analyze_point, seq_id)] = seq_id
         
+        # 结果在主线程中逐个合并，每个点位只向断点日志追加一行
         for future in as_completed(futures):
             seq_id = futures[future]
             try:
-                result = future.result()
+                analysis = future.result()
             except Exception as e:
                 print(f'[WARN] 点位 {seq_id} 任务执行异常: {e}')
-                with write_lock:
-                    fail_count += 1
+                brand_result['fail_count'] += 1
                 continue
-            analysis = result['analysis']
-            panorama_id_value = result['panorama_id']
-            image_paths = result['images']
             
-            if analysis:
-                products = analysis.get('products', [])
-                if products:
-                    # 为所有商品计算 py_position_3d（基于 bbox 和 view_direction）
-                    if seq_id in coordinates:
-                        point_coord = coordinates[seq_id]
-                        for product in products:
-                            bbox = product.get('bbox')
-                            vdir = product.get('view_direction')
-                            if bbox and vdir:
-                                try:
-                                    py_pos = calculate_product_3d_position(bbox, vdir, point_coord)
-                                    product['py_position_3d'] = py_pos
-                                except Exception as e:
-                                    product['py_position_3d'] = None
-                                    print(f'[WARN] 点位 {seq_id} 商品计算 py_position_3d 失败: {e}')
-
-                    with write_lock:
-                        product_results.append({
-                            'panorama_id': panorama_id_value,
-                            'seq_id': seq_id,
-                            'images': image_paths,
-                            'products': products
-                        })
-                        success_count += 1
-                        # 增量写入品牌结果（不包含店铺分析，稍后补充最终版）
-                        if output_dir:
-                            incremental_brand_result = {
-                                'brand': brand_name,
-                                'product_results': product_results,
-                                'store_analysis': None,
-                                'success_count': success_count,
-                                'fail_count': fail_count
-                            }
-                            save_results(incremental_brand_result, output_dir)
-                else:
-                    print(f'[INFO] 点位 {seq_id} (ID:{panorama_id_value}) 未检测到商品，跳过')
-            else:
-                print(f'[WARN] 点位 {seq_id} (ID:{panorama_id_value}) 分析失败，跳过')
-                with write_lock:
-                    fail_count += 1
+            record_point_analysis(brand_result, plan, seq_id, analysis)
+            checkpoint_point(checkpoint, plan, seq_id, analysis)
     
     # ========== 第二阶段：分析整体店铺环境 ==========
     print('\n[INFO] 第二阶段：分析店铺整体环境...')
     
-    # 收集店铺分析需要的点位图片
-    for panorama_key, panorama_data in panorama_groups.items():
-        seq_id = panorama_data['seq_id']
-        image_paths = panorama_data['images']
-        
-        # 只收集店铺分析选中的点位
-        if seq_id in store_seq_ids:
-            store_point_images.append({
-                'seq_id': seq_id,
-                'images': image_paths
-            })
-    
-    store_analysis = None
-    if store_point_images:
-        store_analysis = call_doubao_store_analysis_api(
-            store_point_images,
+    if needs_store_analysis(brand_result, plan):
+        brand_result['store_analysis'] = call_doubao_store_analysis_api(
+            plan['store_point_images'],
             vr_store_prompt,  # 使用店铺分析提示词
             api_key,
             base_url,
-            brand_name
+            brand_name,
+            plan['image_store']
         )
+        checkpoint_store(checkpoint, brand_result['store_analysis'])
+    release_brand_images(plan)
     
-    # ========== 合并结果 ==========
-    final_result = {
-        'brand': brand_name,
-        'product_results': product_results,  # 各点位的商品数据
-        'store_analysis': store_analysis,    # 整体店铺环境分析
-        'success_count': success_count,
-        'fail_count': fail_count
+    # 压缩为最终结果（包含店铺分析）
+    finalize_brand(brand_result, output_dir)
+    return brand_result
+
+
+async def process_brands_async(
+    brand_folders: List[str],
+    api_key: str,
+    base_url: str,
+    output_dir: Optional[str] = None,
+    vr_loc_list: Optional[List[int]] = None,
+    max_product_points: int = 10,
+    max_store_points: int = 10,
+    max_in_flight: int = MAX_IN_FLIGHT,
+    rpm: Optional[float] = None,
+    tpm: Optional[float] = None,
+    max_retries: int = MAX_RETRIES
+) -> List[Dict]:
+    """
+    异步引擎：所有品牌的 (brand, seq_id) 商品任务和店铺任务交给同一个全局调度器，
+    并发跨越品牌边界，品牌之间不再互相等待
+    
+    Args:
+        brand_folders: 需要处理的品牌文件夹列表
+        max_in_flight: 全局最大并发请求数
+        rpm: 每分钟请求数上限，None 表示不限制
+        tpm: 每分钟 token 数上限，None 表示不限制
+        max_retries: 可重试错误的最大重试次数
+    
+    Returns:
+        各品牌结果列表（格式同 process_brand）
+    """
+    scheduler = AsyncScheduler(
+        max_in_flight=max_in_flight,
+        rpm=rpm,
+        tpm=tpm,
+        max_retries=max_retries,
+        retry_on=RETRYABLE_ERRORS
+    )
+    
+    plans = []
+    results: Dict[str, Dict] = {}
+    checkpoints: Dict[str, Optional[BrandCheckpoint]] = {}
+    remaining: Dict[str, List[int]] = {}
+    for brand_folder in brand_folders:
+        brand_name = os.path.basename(brand_folder)
+        plan = plan_brand(brand_folder, vr_loc_list, max_product_points, max_store_points)
+        if plan is None:
+            results[brand_name] = {
+                'brand': brand_name,
+                'results': [],
+                'success_count': 0,
+                'fail_count': 0
+            }
+            continue
+        plans.append(plan)
+        results[brand_name] = new_brand_result(brand_name)
+        checkpoints[brand_name] = BrandCheckpoint(output_dir, brand_name) if output_dir else None
+        remaining[brand_name] = restore_brand_progress(results[brand_name], plan, checkpoints[brand_name])
+    
+    # 每个品牌剩余的任务数，归零时压缩为最终结果
+    pending = {
+        plan['brand']: len(remaining[plan['brand']]) + (1 if needs_store_analysis(results[plan['brand']], plan) else 0)
+        for plan in plans
     }
-    # 写入最终结果（包含店铺分析）
-    if output_dir:
-        save_results(final_result, output_dir)
-    return final_result
+    total_jobs = sum(pending.values())
+    print(f'\n[INFO] 异步引擎：{len(plans)} 个品牌，共 {total_jobs} 个任务（最大并发 {max_in_flight}，RPM {rpm or "不限"}，TPM {tpm or "不限"}）')
+    
+    plans_by_brand = {plan['brand']: plan for plan in plans}
+    
+    def finish_job(brand_name: str):
+        pending[brand_name] -= 1
+        if pending[brand_name] == 0:
+            release_brand_images(plans_by_brand[brand_name])
+            brand_result = results[brand_name]
+            finalize_brand(brand_result, output_dir)
+            print(f'[INFO] {brand_name}: 成功 {brand_result["success_count"]}, 失败 {brand_result["fail_count"]}')
+    
+    async def run_point(plan: Dict, seq_id: int):
+        brand_name = plan['brand']
+        data = plan['seq_to_data'][seq_id]
+        analysis = await call_doubao_vision_api_async(
+            data['images'],
+            vr_product_prompt,
+            api_key,
+            base_url,
+            seq_id,
+            data['panorama_id'],
+            scheduler,
+            brand_name=brand_name,
+            image_store=plan['image_store']
+        )
+        record_point_analysis(results[brand_name], plan, seq_id, analysis)
+        checkpoint_point(checkpoints[brand_name], plan, seq_id, analysis)
+        finish_job(brand_name)
+    
+    async def run_store(plan: Dict):
+        brand_name = plan['brand']
+        results[brand_name]['store_analysis'] = await call_doubao_store_analysis_api_async(
+            plan['store_point_images'],
+            vr_store_prompt,
+            api_key,
+            base_url,
+            brand_name,
+            scheduler,
+            image_store=plan['image_store']
+        )
+        checkpoint_store(checkpoints[brand_name], results[brand_name]['store_analysis'])
+        finish_job(brand_name)
+    
+    jobs = []
+    for plan in plans:
+        brand_name = plan['brand']
+        for seq_id in remaining[brand_name]:
+            jobs.append(run_point(plan, seq_id))
+        if needs_store_analysis(results[brand_name], plan):
+            jobs.append(run_store(plan))
+        if pending[brand_name] == 0:
+            # 断点日志中已全部完成，直接压缩
+            pending[brand_name] = 1
+            finish_job(brand_name)
+    
+    try:
+        await asyncio.gather(*jobs)
+    finally:
+        await aclose_shared_async_clients()
+    
+    scheduler.print_summary()
+    return [results[os.path.basename(folder)] for folder in brand_folders]
+
+
+# ==================== 坐标重算 ====================
+def reproject_results(brand_folders: List[str], output_dir: str, use_orientation: bool = False):
+    """
+    不调用模型，按当前几何参数为已有 {brand}_analysis.json 中的所有商品批量重新计算 py_position_3d
+    
+    Args:
+        brand_folders: 品牌文件夹列表（用于读取点位坐标）
+        output_dir: 分析结果目录
+        use_orientation: 是否按点位朝向四元数旋转
+    """
+    total = 0
+    for brand_folder in brand_folders:
+        brand_name = os.path.basename(brand_folder)
+        output_file = os.path.join(output_dir, f'{brand_name}_analysis.json')
+        if not os.path.exists(output_file):
+            print(f'[SKIP] {brand_name}: 没有分析结果')
+            continue
+        
+        with open(output_file, 'r', encoding='utf-8') as f:
+            brand_result = json.load(f)
+        coordinates = load_panorama_coordinates(brand_folder)
+        
+        start = time.perf_counter()
+        count = project_products(brand_result.get('product_results', []), coordinates, use_orientation)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        write_json_atomic(brand_result, output_file)
+        total += count
+        print(f'[INFO] {brand_name}: 重新计算 {count} 个商品坐标（{elapsed_ms:.1f} ms）')
+    
+    print(f'[INFO] 坐标重算完成，共 {total} 个商品（按点位朝向旋转: {"是" if use_orientation else "否"}）')
+
+
+# ==================== 续跑计划 ====================
+def count_direction_images(image_paths: List[str]) -> int:
+    """一个点位会发送给模型的方向图片数（f/b/l/r）"""
+    return sum(1 for path in image_paths if path[-6:] in ('_f.jpg', '_b.jpg', '_l.jpg', '_r.jpg'))
+
+
+def load_brand_progress(output_dir: str, brand_name: str) -> Dict:
+    """
+    读取品牌已有的分析进度：优先使用断点日志，没有日志时使用已有的 {brand}_analysis.json
+    
+    Returns:
+        {'points': {seq_id: 记录}, 'store_analysis': {...} 或 None, 'from_result': 是否来自最终结果文件}
+    """
+    checkpoint = BrandCheckpoint(output_dir, brand_name)
+    if checkpoint.exists():
+        state = checkpoint.load()
+        state['from_result'] = False
+        return state
+    
+    state = {'points': {}, 'store_analysis': None}
+    output_file = os.path.join(output_dir, f'{brand_name}_analysis.json')
+    if os.path.exists(output_file):
+        try:
+            with open(output_file, 'r', encoding='utf-8') as f:
+                state = BrandCheckpoint.state_from_result(json.load(f))
+        except Exception as e:
+            print(f'[WARN] 无法读取已有结果 {output_file}: {e}')
+    state['from_result'] = True
+    return state
+
+
+def build_resume_plan(
+    brand_folders: List[str],
+    output_dir: str,
+    vr_loc_list: Optional[List[int]] = None,
+    max_product_points: int = 10,
+    max_store_points: int = 10
+) -> List[Dict]:
+    """
+    根据已有的分析结果和断点日志，列出每个品牌缺失的商品点位和店铺分析
+    
+    Returns:
+        [{
+            'brand_folder': 品牌文件夹,
+            'brand': 品牌名,
+            'missing_seq_ids': [...],  # 缺失的商品点位
+            'missing_store': True/False,  # 是否缺失店铺分析
+            'num_images': 需要发送的图片总数,
+            'state': 已有进度（load_brand_progress 的返回值）
+        }, ...]
+    """
+    entries = []
+    for brand_folder in brand_folders:
+        brand_name = os.path.basename(brand_folder)
+        plan = plan_brand(brand_folder, vr_loc_list, max_product_points, max_store_points, verbose=False)
+        if plan is None:
+            continue
+        
+        state = load_brand_progress(output_dir, brand_name)
+        missing_seq_ids = [sid for sid in plan['product_seq_ids'] if sid not in state['points']]
+        missing_store = bool(plan['store_point_images']) and state['store_analysis'] is None
+        
+        num_images = sum(count_direction_images(plan['seq_to_data'][sid]['images']) for sid in missing_seq_ids)
+        if missing_store:
+            num_images += 1 if STORE_TILE_COLS else len(plan['store_point_images'])
+        
+        entries.append({
+            'brand_folder': brand_folder,
+            'brand': brand_name,
+            'missing_seq_ids': missing_seq_ids,
+            'missing_store': missing_store,
+            'num_images': num_images,
+            'state': state
+        })
+    return entries
+
+
+def print_resume_plan(entries: List[Dict]):
+    """打印续跑计划：每个品牌缺失的任务、总请求数、预估 token 和费用"""
+    total_requests = 0
+    total_tokens = 0
+    total_cost = 0.0
+    
+    print('\n[INFO] 续跑计划:')
+    for entry in entries:
+        requests = len(entry['missing_seq_ids']) + (1 if entry['missing_store'] else 0)
+        if not requests:
+            continue
+        # 每个请求的固定部分（提示词 + 输出）加上所有图片
+        tokens = estimate_request_tokens(0) * requests + entry['num_images'] * EST_TOKENS_PER_IMAGE
+        cost = (
+            estimate_request_cost(0) * requests
+            + entry['num_images'] * EST_TOKENS_PER_IMAGE * PRICE_INPUT_PER_M / 1_000_000
+        )
+        total_requests += requests
+        total_tokens += tokens
+        total_cost += cost
+        store_status = '缺失' if entry['missing_store'] else '已完成'
+        print(f'  - {entry["brand"]}: 缺失点位 {len(entry["missing_seq_ids"])} 个 {entry["missing_seq_ids"]}，店铺分析{store_status}')
+    
+    done_brands = sum(1 for e in entries if not e['missing_seq_ids'] and not e['missing_store'])
+    print(f'  - 已完成品牌: {done_brands}/{len(entries)}')
+    print(f'  - 待发送请求: {total_requests}')
+    print(f'  - 预估 tokens: {total_tokens:,}')
+    print(f'  - 预估费用: {total_cost:.2f} 元（输入 {PRICE_INPUT_PER_M} 元/百万 tokens，输出 {PRICE_OUTPUT_PER_M} 元/百万 tokens）\n')
 
 
 def save_results(brand_result: Dict, output_dir: str):
@@ -886,12 +1471,114 @@ def save_results(brand_result: Dict, output_dir: str):
     
     os.makedirs(output_dir, exist_ok=True)
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(brand_result, f, ensure_ascii=False, indent=2)
+    write_json_atomic(brand_result, output_file)
     
     print(f'[INFO] 结果已保存: {output_file}')
 
 
+def write_summary(all_results: List[Dict], output_dir: str) -> Dict:
+    """生成汇总报告 summary.json 并打印"""
+    summary = {
+        'total_brands': len(all_results),
+        'total_success': sum(r['success_count'] for r in all_results),
+        'total_fail': sum(r['fail_count'] for r in all_results),
+        'brands': [
+            {
+                'name': r['brand'],
+                'success': r['success_count'],
+                'fail': r['fail_count']
+            }
+            for r in all_results
+        ]
+    }
+    
+    summary_file = os.path.join(output_dir, 'summary.json')
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    
+    print('\n' + '='*60)
+    print('处理完成！')
+    print(f'总品牌数: {summary["total_brands"]}')
+    print(f'总成功数: {summary["total_success"]}')
+    print(f'总失败数: {summary["total_fail"]}')
+    print(f'汇总报告: {summary_file}')
+    print('='*60)
+    return summary
+
+
+def init_runtime(
+    cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+    cache_max_mb: int = CACHE_MAX_SIZE_MB,
+    cache_max_age_days: int = CACHE_MAX_AGE_DAYS,
+    max_image_edge: int = MAX_IMAGE_EDGE,
+    jpeg_quality: int = JPEG_QUALITY,
+    image_cache_dir: Optional[str] = DEFAULT_IMAGE_CACHE_DIR,
+    store_tile_cols: int = STORE_TILE_COLS,
+    encoded_image_max_mb: int = ENCODED_IMAGE_MAX_MB,
+    use_orientation: bool = USE_POINT_ORIENTATION,
+    metrics_file: Optional[str] = None,
+    metrics_format: str = 'jsonl',
+    refresh_cache: bool = False,
+    client_connections: Optional[int] = None
+):
+    """
+    初始化结果缓存、图片预处理、请求指标等模块级配置（main 和 run_pipeline.py 共用）
+    
+    Args:
+        cache_dir: 结果缓存目录，None 表示不使用缓存
+        refresh_cache: 不读取结果缓存，重新调用模型并用新结果覆盖缓存（--force）
+        client_connections: 共享客户端连接池大小，None 表示等于 MAX_WORKERS；
+            多个品牌同时分析时应为 同时分析的品牌数 × MAX_WORKERS，否则线程会等待空闲连接
+        metrics_file: 请求指标输出文件，None 表示只在结束时打印汇总
+        metrics_format: 请求指标格式，jsonl 或 prometheus
+    """
+    global RESULT_CACHE, RESULT_CACHE_READ, CLIENT_MAX_CONNECTIONS, IMAGE_PREPARER, STORE_TILE_COLS, ENCODED_IMAGE_MAX_MB, USE_POINT_ORIENTATION, METRICS
+    
+    # 初始化结果缓存
+    if cache_dir:
+        RESULT_CACHE = VisionResultCache(
+            os.path.join(cache_dir, 'results.sqlite'),
+            max_size_mb=cache_max_mb,
+            max_age_days=cache_max_age_days
+        )
+        print(f'[INFO] 结果缓存目录: {cache_dir}{"（--force：只写不读）" if refresh_cache else ""}')
+    RESULT_CACHE_READ = not refresh_cache
+    CLIENT_MAX_CONNECTIONS = client_connections or MAX_WORKERS
+    
+    # 初始化图片预处理
+    prep_config = ImagePrepConfig(max_edge=max_image_edge, quality=jpeg_quality)
+    if prep_config.enabled:
+        IMAGE_PREPARER = ImagePreparer(prep_config, cache_dir=image_cache_dir)
+        print(f'[INFO] 图片预处理: 最长边 {max_image_edge or "不限"}，JPEG 质量 {jpeg_quality or "原图"}')
+    STORE_TILE_COLS = store_tile_cols
+    ENCODED_IMAGE_MAX_MB = encoded_image_max_mb
+    USE_POINT_ORIENTATION = use_orientation
+    
+    # 初始化请求指标
+    METRICS = PipelineMetrics(
+        metrics_file,
+        metrics_format,
+        price_input_per_m=PRICE_INPUT_PER_M,
+        price_output_per_m=PRICE_OUTPUT_PER_M
+    )
+    if metrics_file:
+        print(f'[INFO] 请求指标输出: {metrics_file}（{metrics_format}）')
+
+
+def shutdown_runtime():
+    """打印连接、预处理、缓存、请求指标统计并释放资源"""
+    CONNECTION_STATS.print_summary()
+    close_shared_clients()
+    if IMAGE_PREPARER is not None:
+        IMAGE_PREPARER.print_summary()
+    if RESULT_CACHE is not None:
+        RESULT_CACHE.evict()
+        RESULT_CACHE.print_summary()
+        RESULT_CACHE.close()
+    METRICS.print_summary()
+    METRICS.close()
+
+
 # ==================== 主函数 ====================
 def main():
     parser = argparse.ArgumentParser(
@@ -946,124 +1633,294 @@ def main():
     parser.add_argument(
         '--force',
         action='store_true',
-        help='强制重新分析已有结果的品牌'
+        help='强制重新分析已有结果的品牌（不读取模型结果缓存，新结果写入缓存）'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='续跑模式：根据已有的 *_analysis.json 和断点日志，只分析缺失的点位和店铺分析'
+    )
+    parser.add_argument(
+        '--plan_only',
+        action='store_true',
+        help='只打印续跑计划（缺失任务数、预估 token 和费用），不发送请求（隐含 --resume）'
+    )
+    parser.add_argument(
+        '--use_orientation',
+        action='store_true',
+        help='计算 py_position_3d 时按点位朝向四元数（direction_x/y/z/w）旋转'
+    )
+    parser.add_argument(
+        '--reproject',
+        action='store_true',
+        help='不调用模型，只为已有分析结果中的商品批量重新计算 py_position_3d'
+    )
+    parser.add_argument(
+        '--cache_dir',
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help='模型结果缓存目录（按图片内容 + 提示词 + 模型 + 采样参数寻址）'
+    )
+    parser.add_argument(
+        '--no_cache',
+        action='store_true',
+        help='不使用模型结果缓存'
+    )
+    parser.add_argument(
+        '--cache_max_mb',
+        type=float,
+        default=CACHE_MAX_SIZE_MB,
+        help=f'结果缓存总大小上限（MB，默认 {CACHE_MAX_SIZE_MB}，0 表示不限制）'
+    )
+    parser.add_argument(
+        '--cache_max_age_days',
+        type=float,
+        default=CACHE_MAX_AGE_DAYS,
+        help=f'结果缓存有效期（天，默认 {CACHE_MAX_AGE_DAYS}，0 表示不限制）'
+    )
+    parser.add_argument(
+        '--max_image_edge',
+        type=int,
+        default=MAX_IMAGE_EDGE,
+        help=f'上传前将图片最长边缩放到该像素值（默认 {MAX_IMAGE_EDGE}，0 表示不缩放）'
+    )
+    parser.add_argument(
+        '--jpeg_quality',
+        type=int,
+        default=JPEG_QUALITY,
+        help=f'上传前重新压缩 JPEG 的质量（默认 {JPEG_QUALITY}，0 表示不重新压缩；与 --max_image_edge 同为 0 时直接上传原图）'
+    )
+    parser.add_argument(
+        '--store_tile_cols',
+        type=int,
+        default=STORE_TILE_COLS,
+        help='店铺分析时将各点位图片拼成 N 列的一张图（默认 0 不拼图）'
+    )
+    parser.add_argument(
+        '--image_cache_dir',
+        type=str,
+        default=DEFAULT_IMAGE_CACHE_DIR,
+        help='预处理后图片的磁盘缓存目录'
+    )
+    parser.add_argument(
+        '--encoded_image_max_mb',
+        type=float,
+        default=ENCODED_IMAGE_MAX_MB,
+        help=f'单个品牌内已编码图片的内存上限（MB，默认 {ENCODED_IMAGE_MAX_MB}），商品分析和店铺分析共用，0 表示不复用'
+    )
+    parser.add_argument(
+        '--engine',
+        type=str,
+        choices=['thread', 'async'],
+        default='thread',
+        help='执行引擎：thread（逐品牌线程池，默认）或 async（全局异步调度，跨品牌并发）'
+    )
+    parser.add_argument(
+        '--max_in_flight',
+        type=int,
+        default=MAX_IN_FLIGHT,
+        help=f'异步引擎全局最大并发请求数（默认 {MAX_IN_FLIGHT}）'
+    )
+    parser.add_argument(
+        '--rpm',
+        type=int,
+        default=0,
+        help='异步引擎每分钟请求数上限（0 表示不限制）'
+    )
+    parser.add_argument(
+        '--tpm',
+        type=int,
+        default=0,
+        help='异步引擎每分钟 token 数上限（0 表示不限制）'
+    )
+    parser.add_argument(
+        '--max_retries',
+        type=int,
+        default=MAX_RETRIES,
+        help=f'异步引擎可重试错误（连接/超时/429/5xx）的最大重试次数（默认 {MAX_RETRIES}）'
+    )
+    parser.add_argument(
+        '--metrics_file',
+        type=str,
+        default=None,
+        help='请求指标输出文件（每次请求的编码、建连、首字节、模型调用、解析耗时，请求体大小，token 用量，重试次数）'
+    )
+    parser.add_argument(
+        '--metrics_format',
+        type=str,
+        choices=list(METRICS_FORMATS),
+        default='jsonl',
+        help='请求指标格式：jsonl（每次请求一行，末尾为汇总，默认）或 prometheus（结束时写出文本格式）'
     )
     
     args = parser.parse_args()
+    if args.plan_only:
+        args.resume = True
+    if args.resume and args.force:
+        print('[ERROR] --resume 与 --force 不能同时使用')
+        sys.exit(1)
     
-    # 检查 API 密钥
-    if not args.api_key:
+    # 检查 API 密钥（坐标重算不需要）
+    if not args.api_key and not args.reproject:
         print('[ERROR] 未设置 API 密钥！')
         print('请通过以下方式之一设置：')
         print('  1. 设置环境变量: export DOUBAO_API_KEY=your_key')
         print('  2. 使用命令行参数: --api_key your_key')
         sys.exit(1)
     
-    # 确定需要处理的品牌
-    brand_filter = None
-    if args.brand_list:
-        try:
-            from brand_list import brand_list
-            brand_filter = brand_list
-            print(f'[INFO] 已加载品牌筛选列表（共 {len(brand_filter)} 个品牌）')
-        except ImportError:
-            print('[ERROR] 无法导入 brand_list.py')
-            sys.exit(1)
-    
-    # 确定需要处理的 VR 点位
-    vr_filter = None
-    if args.vr_loc_list:
-        try:
-            from brand_list import vr_loc_list
-            vr_filter = vr_loc_list
-            print(f'[INFO] 已加载 VR 点位筛选列表：{vr_filter}')
-        except ImportError:
-            print('[ERROR] 无法从 brand_list.py 导入 vr_loc_list')
-            sys.exit(1)
-    
-    # 获取品牌文件夹列表
-    brand_folders = get_brand_folders(args.panorama_dir, brand_filter)
-    
-    if not brand_folders:
-        print('[ERROR] 未找到需要处理的品牌文件夹')
-        sys.exit(1)
-    
-    print(f'[INFO] 共找到 {len(brand_folders)} 个品牌待处理')
-    print(f'[INFO] 使用模型: {DOUBAO_MODEL}')
-    print(f'[INFO] API 基础 URL: {args.base_url}')
-    print(f'[INFO] 结果输出目录: {args.output_dir}\n')
-    
-    # 创建输出目录
-    os.makedirs(args.output_dir, exist_ok=True)
+    init_runtime(
+        cache_dir=None if args.no_cache else args.cache_dir,
+        cache_max_mb=args.cache_max_mb,
+        cache_max_age_days=args.cache_max_age_days,
+        max_image_edge=args.max_image_edge,
+        jpeg_quality=args.jpeg_quality,
+        image_cache_dir=args.image_cache_dir,
+        store_tile_cols=args.store_tile_cols,
+        encoded_image_max_mb=args.encoded_image_max_mb,
+        use_orientation=args.use_orientation,
+        metrics_file=args.metrics_file,
+        metrics_format=args.metrics_format,
+        refresh_cache=args.force
+    )
     
-    # 处理每个品牌
-    all_results = []
-    for brand_folder in brand_folders:
-        brand_name = os.path.basename(brand_folder)
-        output_file = os.path.join(args.output_dir, f'{brand_name}_analysis.json')
+    try:
+        # 确定需要处理的品牌
+        brand_filter = None
+        if args.brand_list:
+            try:
+                from brand_list import brand_list
+                brand_filter = brand_list
+                print(f'[INFO] 已加载品牌筛选列表（共 {len(brand_filter)} 个品牌）')
+            except ImportError:
+                print('[ERROR] 无法导入 brand_list.py')
+                sys.exit(1)
         
-        # 检查是否已经有分析结果
-        if not args.force and os.path.exists(output_file):
-            print(f'[SKIP] {brand_name}: 已有分析结果，跳过（使用 --force 强制重新分析）')
-            
-            # 加载已有结果用于生成汇总报告
+        # 确定需要处理的 VR 点位
+        vr_filter = None
+        if args.vr_loc_list:
             try:
-                with open(output_file, 'r', encoding='utf-8') as f:
-                    result = json.load(f)
-                    all_results.append(result)
-            except Exception as e:
-                print(f'[WARN] 无法读取已有结果 {output_file}: {e}')
-            
-            continue
+                from brand_list import vr_loc_list
+                vr_filter = vr_loc_list
+                print(f'[INFO] 已加载 VR 点位筛选列表：{vr_filter}')
+            except ImportError:
+                print('[ERROR] 无法从 brand_list.py 导入 vr_loc_list')
+                sys.exit(1)
         
-        try:
-            result = process_brand(
-                brand_folder,
-                args.api_key,
-                args.base_url,
+        # 获取品牌文件夹列表
+        brand_folders = get_brand_folders(args.panorama_dir, brand_filter)
+        
+        if not brand_folders:
+            print('[ERROR] 未找到需要处理的品牌文件夹')
+            sys.exit(1)
+        
+        print(f'[INFO] 共找到 {len(brand_folders)} 个品牌待处理')
+        print(f'[INFO] 使用模型: {DOUBAO_MODEL}')
+        print(f'[INFO] 执行引擎: {args.engine}')
+        print(f'[INFO] API 基础 URL: {args.base_url}')
+        print(f'[INFO] 结果输出目录: {args.output_dir}\n')
+        
+        # 创建输出目录
+        os.makedirs(args.output_dir, exist_ok=True)
+        
+        # 坐标重算模式：不调用模型
+        if args.reproject:
+            reproject_results(brand_folders, args.output_dir, use_orientation=args.use_orientation)
+            return
+        
+        # 续跑模式：先列出缺失的任务和预估费用
+        resume_entries = {}
+        if args.resume:
+            entries = build_resume_plan(
+                brand_folders,
                 args.output_dir,
                 vr_filter,
                 max_product_points=args.max_product_points,
                 max_store_points=args.max_store_points
             )
+            print_resume_plan(entries)
+            if args.plan_only:
+                return
+            resume_entries = {entry['brand_folder']: entry for entry in entries}
+        
+        # 处理每个品牌
+        all_results = []
+        pending_folders = []
+        for brand_folder in brand_folders:
+            brand_name = os.path.basename(brand_folder)
+            output_file = os.path.join(args.output_dir, f'{brand_name}_analysis.json')
+        
+            entry = resume_entries.get(brand_folder)
+            if entry is not None:
+                complete = not entry['missing_seq_ids'] and not entry['missing_store']
+                if not (complete and os.path.exists(output_file)):
+                    # 旧输出没有断点日志时，先把已有结果写入日志，续跑时从日志恢复已完成的点位
+                    if entry['state']['from_result'] and (entry['state']['points'] or entry['state']['store_analysis']):
+                        BrandCheckpoint(args.output_dir, brand_name).seed(entry['state'])
+                    pending_folders.append(brand_folder)
+                    continue
+        
+            # 检查是否已经有分析结果
+            if not args.force and os.path.exists(output_file):
+                print(f'[SKIP] {brand_name}: 已有分析结果，跳过（使用 --force 强制重新分析）')
             
-            # 保存结果
-            save_results(result, args.output_dir)
-            all_results.append(result)
-            
-            print(f'[INFO] {result["brand"]}: 成功 {result["success_count"]}, 失败 {result["fail_count"]}')
+                # 加载已有结果用于生成汇总报告
+                try:
+                    with open(output_file, 'r', encoding='utf-8') as f:
+                        result = json.load(f)
+                        all_results.append(result)
+                except Exception as e:
+                    print(f'[WARN] 无法读取已有结果 {output_file}: {e}')
             
-        except Exception as e:
-            print(f'[ERROR] 处理品牌失败 {brand_name}: {e}')
-            import traceback
-            traceback.print_exc()
-    
-    # 生成汇总报告
-    summary = {
-        'total_brands': len(all_results),
-        'total_success': sum(r['success_count'] for r in all_results),
-        'total_fail': sum(r['fail_count'] for r in all_results),
-        'brands': [
-            {
-                'name': r['brand'],
-                'success': r['success_count'],
-                'fail': r['fail_count']
-            }
-            for r in all_results
-        ]
-    }
-    
-    summary_file = os.path.join(args.output_dir, 'summary.json')
-    with open(summary_file, 'w', encoding='utf-8') as f:
-        json.dump(summary, f, ensure_ascii=False, indent=2)
-    
-    print('\n' + '='*60)
-    print('处理完成！')
-    print(f'总品牌数: {summary["total_brands"]}')
-    print(f'总成功数: {summary["total_success"]}')
-    print(f'总失败数: {summary["total_fail"]}')
-    print(f'汇总报告: {summary_file}')
-    print('='*60)
+                continue
+        
+            if args.force:
+                BrandCheckpoint(args.output_dir, brand_name).reset()
+            pending_folders.append(brand_folder)
+        
+        if args.engine == 'async':
+            # 异步引擎：所有品牌的任务一起调度
+            results = asyncio.run(process_brands_async(
+                pending_folders,
+                args.api_key,
+                args.base_url,
+                args.output_dir,
+                vr_filter,
+                max_product_points=args.max_product_points,
+                max_store_points=args.max_store_points,
+                max_in_flight=args.max_in_flight,
+                rpm=args.rpm or None,
+                tpm=args.tpm or None,
+                max_retries=args.max_retries
+            ))
+            all_results.extend(results)
+        else:
+            for brand_folder in pending_folders:
+                brand_name = os.path.basename(brand_folder)
+                try:
+                    result = process_brand(
+                        brand_folder,
+                        args.api_key,
+                        args.base_url,
+                        args.output_dir,
+                        vr_filter,
+                        max_product_points=args.max_product_points,
+                        max_store_points=args.max_store_points
+                    )
+                
+                    # 结果已在 process_brand 中保存
+                    all_results.append(result)
+                
+                    print(f'[INFO] {result["brand"]}: 成功 {result["success_count"]}, 失败 {result["fail_count"]}')
+                
+                except Exception as e:
+                    print(f'[ERROR] 处理品牌失败 {brand_name}: {e}')
+                    import traceback
+                    traceback.print_exc()
+        
+        # 生成汇总报告
+        write_summary(all_results, args.output_dir)
+    finally:
+        shutdown_runtime()
 
 
 if __name__ == '__main__':
@@ -2,15 +2,24 @@
 # -*- coding: utf-8 -*-
 """
 从分析结果 JSON 文件中提取推荐商品信息并生成 VR 链接
+指定 --panorama_dir 时按商品 3D 坐标（py_position_3d）为每个商品选择最近的点位作为 VR 链接的观看点位
+也可以用 --product_table 直接读取 product_table.py 导出的列式表（不解析分析结果 JSON，输出值的类型会有差异）
 """
 
 import os
+import csv
 import json
+import math
 import argparse
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional, Tuple
 
 # 导入店铺视图字典
 from store_view_dict import store_view_dict
+from spatial_index import PanoramaIndex
+from vr_geometry import load_panorama_coordinates
+from product_dedup import dedup_transform, DEDUP_RADIUS, DEDUP_MIN_SIMILARITY
+from result_loader import AnalysisResultSet
+from product_table import read_product_table
 
 # ==================== 配置项 ====================
 DEFAULT_ANALYSIS_DIR = os.path.join(
@@ -23,46 +32,169 @@ DEFAULT_OUTPUT_FILE = os.path.join(
     'recommended_views/recommended_products.json'
 )
 
+MIN_VIEW_DISTANCE = 0.5  # 最佳观看点位与商品的最小距离（米），太近时商品在画面中过大、变形
 
-def load_analysis_results(analysis_dir: str) -> List[Dict]:
+# --product_table 时从列式表读取的列（见 product_table.COLUMNS）
+PRODUCT_TABLE_COLUMNS = [
+    'brand', 'panorama_id', 'point_index', 'product_index', 'name', 'location', 'view_direction', 'is_recommended',
+    'has_position_3d', 'position_x', 'position_y', 'position_z', 'py_position_x', 'py_position_y', 'py_position_z'
+]
+
+
+def build_vr_link(store_view_id: str, panorama_id, direction: Dict) -> str:
+    """生成 VR 链接：在指定点位打开，朝向 direction {x, y, z}"""
+    return (
+        f'https://vr.aibee.cn/store/{store_view_id}?'
+        f'pid={panorama_id}&'
+        f'dirx={direction.get("x", 0)}&'
+        f'diry={direction.get("y", 0)}&'
+        f'dirz={direction.get("z", 0)}'
+    )
+
+
+def load_panorama_indexes(panorama_dir: str, brand_names: List[str]) -> Dict[str, PanoramaIndex]:
     """
-    加载所有分析结果 JSON 文件
+    为每个品牌构建点位空间索引
     
     Args:
-        analysis_dir: 分析结果目录
+        panorama_dir: 全景图 JSON 根目录（每个品牌一个子目录，内含 {品牌}.json）
+        brand_names: 品牌名称列表
     
     Returns:
-        所有品牌的分析结果列表
+        {品牌名: PanoramaIndex}，没有点位坐标的品牌不包含在内
+    """
+    indexes = {}
+    for brand_name in brand_names:
+        brand_folder = os.path.join(panorama_dir, brand_name)
+        if not os.path.isdir(brand_folder):
+            continue
+        coordinates = load_panorama_coordinates(brand_folder)
+        if coordinates:
+            indexes[brand_name] = PanoramaIndex.from_coordinates(coordinates)
+    print(f'[INFO] 已为 {len(indexes)} 个品牌构建点位空间索引')
+    return indexes
+
+
+def choose_best_view(
+    position: Dict,
+    source_panorama_id,
+    index: PanoramaIndex,
+    min_distance: float = MIN_VIEW_DISTANCE
+) -> Optional[Tuple[object, Dict, float]]:
     """
-    results = []
+    为商品选择比来源点位更近的观看点位
     
-    if not os.path.isdir(analysis_dir):
-        print(f'[ERROR] 目录不存在: {analysis_dir}')
-        return results
+    Args:
+        position: 商品 3D 坐标 py_position_3d {x, y, z}
+        source_panorama_id: 识别出该商品的点位 ID
+        index: 品牌的点位空间索引
+        min_distance: 观看点位与商品的最小距离（米）
     
-    for filename in os.listdir(analysis_dir):
-        if not filename.endswith('_analysis.json'):
-            continue
-        
-        file_path = os.path.join(analysis_dir, filename)
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                results.append(data)
-                print(f'[INFO] 已加载: {filename} (品牌: {data.get("brand", "未知")})')
-        except Exception as e:
-            print(f'[ERROR] 读取文件失败 {filename}: {e}')
-    
-    return results
+    Returns:
+        (点位 ID, 朝向单位向量 {x, y, z}, 距离)；来源点位已是最佳时返回 None
+    """
+    point = (position.get('x', 0), position.get('y', 0), position.get('z', 0))
+    best = index.best_view(point, min_distance=min_distance)
+    if best is None or best[0] == source_panorama_id:
+        return None
+    
+    best_id, distance = best
+    source_position = index.position_of(source_panorama_id)
+    if source_position is not None and math.dist(point, source_position) <= distance:
+        return None
+    
+    best_position = index.position_of(best_id)
+    direction = {
+        axis: round((point[i] - best_position[i]) / distance, 3) if distance else 0
+        for i, axis in enumerate(('x', 'y', 'z'))
+    }
+    return best_id, direction, distance
 
 
-def extract_recommended_products(results: List[Dict]) -> List[Dict]:
+def load_analysis_results(
+    analysis_dir: str,
+    workers: int = 0,
+    use_cache: bool = True,
+    dedup: Optional[Tuple[float, float]] = None
+) -> AnalysisResultSet:
+    """
+    按需加载分析结果（遍历时逐个品牌解析，未变化的品牌直接读取解析缓存）
+    
+    Args:
+        analysis_dir: 分析结果目录
+        workers: 解析进程数，0 表示不使用进程池
+        use_cache: 是否使用解析缓存（analysis_dir/.parse_cache）
+        dedup: (去重半径, 相似度阈值)，指定时加载每个品牌后做跨点位去重
+    
+    Returns:
+        可多次遍历的品牌结果集
+    """
+    transform, transform_key = dedup_transform(*dedup) if dedup else (None, '')
+    return AnalysisResultSet(
+        analysis_dir,
+        workers=workers,
+        cache_dir='' if use_cache else None,
+        transform=transform,
+        transform_key=transform_key,
+        verbose=True
+    )
+
+
+def _table_number(value) -> Optional[float]:
+    """列式表中的数值（pandas 读取时空值为 NaN / None）转为 JSON 数值，空值为 None"""
+    if value is None or value != value:
+        return None
+    return float(value)
+
+
+def product_table_results(table) -> List[Dict]:
+    """
+    把 product_table.read_product_table 读取的列式表（列为 PRODUCT_TABLE_COLUMNS，已按品牌、点位、商品排序）
+    还原为品牌结果，与分析结果 JSON 使用同一个提取流程
+    
+    列式表按固定类型存储，还原的值与原始 JSON 不完全相同：坐标为 float（3 -> 3.0），
+    panorama_id 为整数（'1002' -> 1002），为 null 的名称 / 位置 / 视图方向可能为空字符串，VR 链接随之不同
+    """
+    results: Dict[str, Dict] = {}
+    points: Dict[Tuple[str, int], Dict] = {}
+    for row in table.itertuples(index=False):
+        brand_result = results.setdefault(row.brand, {'brand': row.brand, 'product_results': []})
+        point = points.get((row.brand, row.point_index))
+        if point is None:
+            panorama_id = _table_number(row.panorama_id)
+            point = {'panorama_id': None if panorama_id is None else int(panorama_id), 'products': []}
+            points[(row.brand, row.point_index)] = point
+            brand_result['product_results'].append(point)
+        product = {
+            'name': row.name,
+            'location': row.location,
+            'view_direction': row.view_direction,
+            'is_recommended': bool(row.is_recommended)
+        }
+        if row.has_position_3d:
+            product['position_3d'] = {
+                axis: _table_number(getattr(row, f'position_{axis}')) for axis in ('x', 'y', 'z')
+            }
+        py_position = {axis: _table_number(getattr(row, f'py_position_{axis}')) for axis in ('x', 'y', 'z')}
+        py_position = {axis: value for axis, value in py_position.items() if value is not None}
+        if py_position:
+            product['py_position_3d'] = py_position
+        point['products'].append(product)
+    return list(results.values())
+
+
+def extract_recommended_products(
+    results: Iterable[Dict],
+    panorama_indexes: Optional[Dict[str, PanoramaIndex]] = None,
+    min_view_distance: float = MIN_VIEW_DISTANCE
+) -> List[Dict]:
     """
     提取所有推荐商品信息
     
     Args:
-        results: 所有品牌的分析结果
+        results: 所有品牌的分析结果（可为逐个加载的 AnalysisResultSet）
+        panorama_indexes: 各品牌的点位空间索引，传入时为有 py_position_3d 的商品选择最近的观看点位
+        min_view_distance: 观看点位与商品的最小距离（米）
     
     Returns:
         推荐商品列表，每个商品包含：
@@ -73,8 +205,12 @@ def extract_recommended_products(results: List[Dict]) -> List[Dict]:
         - panorama_id: VR 点位 ID
         - position_3d: 3D 坐标 {x, y, z}
         - vr_link: 生成的 VR 链接
+        - best_panorama_id / view_distance: 选择了其他观看点位时才有
     """
     recommended_products = []
+    retargeted = 0
+    no_position: Dict[str, int] = {}  # 品牌 -> 没有 position_3d 的推荐商品数
+    panorama_indexes = panorama_indexes or {}
     
     for brand_result in results:
         brand_name = brand_result.get('brand', '')
@@ -95,10 +231,10 @@ def extract_recommended_products(results: List[Dict]) -> List[Dict]:
                 if not product.get('is_recommended', False):
                     continue
                 
-                # 检查是否有 position_3d
+                # 检查是否有 position_3d（没有的商品最后按品牌汇总打印）
                 position_3d = product.get('position_3d')
-                if not position_3d:
-                    print(f'[WARN] 商品 {product.get("name")} (品牌: {brand_name}, 点位: {panorama_id}) 没有 position_3d，跳过')
+                if not position_3d or not isinstance(position_3d, dict):
+                    no_position[brand_name] = no_position.get(brand_name, 0) + 1
                     continue
                 
                 # 提取商品信息
@@ -112,46 +248,69 @@ def extract_recommended_products(results: List[Dict]) -> List[Dict]:
                     'vr_link': None
                 }
                 
-                # 生成 VR 链接
-                x = position_3d.get('x', 0)
-                y = position_3d.get('y', 0)
-                z = position_3d.get('z', 0)
+                # 生成 VR 链接（默认在来源点位，按模型给出的 position_3d 朝向）
+                vr_link = build_vr_link(store_view_id, panorama_id, position_3d)
                 
-                vr_link = (
-                    f'https://vr.aibee.cn/store/{store_view_id}?'
-                    f'pid={panorama_id}&'
-                    f'dirx={x}&'
-                    f'diry={y}&'
-                    f'dirz={z}'
-                )
+                # 有点位索引和商品绝对坐标时，改用更近的观看点位
+                index = panorama_indexes.get(brand_name)
+                py_position = product.get('py_position_3d')
+                if index is not None and py_position:
+                    best = choose_best_view(py_position, panorama_id, index, min_view_distance)
+                    if best is not None:
+                        best_id, direction, distance = best
+                        vr_link = build_vr_link(store_view_id, best_id, direction)
+                        product_info['best_panorama_id'] = best_id
+                        product_info['view_distance'] = round(distance, 3)
+                        retargeted += 1
                 
                 product_info['vr_link'] = vr_link
                 recommended_products.append(product_info)
     
+    if no_position:
+        # 汇总打印，不逐个商品打印
+        counts = sorted(no_position.items(), key=lambda x: x[1], reverse=True)
+        detail = '，'.join(f'{brand}: {count}' for brand, count in counts[:10])
+        more = ' 等' if len(counts) > 10 else ''
+        print(f'[WARN] {sum(no_position.values())} 个推荐商品没有 position_3d，已跳过（{detail}{more}）')
+    
+    if panorama_indexes:
+        print(f'[INFO] {retargeted} 个商品改用更近的观看点位')
+    
     return recommended_products
 
 
-def save_results(products: List[Dict], output_file: str, format: str = 'json'):
+def write_json_stream(items: Iterable[Dict], output_file: str):
+    """
+    逐条编码并写出 JSON 数组（与 json.dump(list(items), f, ensure_ascii=False, indent=2) 的输出相同，
+    items 可以是生成器，不需要先拼出完整列表）
+    """
+    with open(output_file, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+        first = True
+        for item in items:
+            f.write('[\n  ' if first else ',\n  ')
+            f.write(json.dumps(item, ensure_ascii=False, indent=2).replace('\n', '\n  '))
+            first = False
+        f.write('[]' if first else '\n]')
+
+
+def save_results(products: Iterable[Dict], output_file: str, format: str = 'json'):
     """
     保存结果到文件
     
     Args:
-        products: 推荐商品列表
+        products: 推荐商品（extract_recommended_products 的结果）
         output_file: 输出文件路径
         format: 输出格式 ('json' 或 'csv')
     """
     os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else '.', exist_ok=True)
     
     if format == 'json':
-        # 保存为 JSON
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(products, f, ensure_ascii=False, indent=2)
+        # 保存为 JSON（逐条写出）
+        write_json_stream(products, output_file)
         print(f'\n[INFO] 结果已保存为 JSON: {output_file}')
     
     elif format == 'csv':
         # 保存为 CSV
-        import csv
-        
         csv_file = output_file.replace('.json', '.csv')
         with open(csv_file, 'w', encoding='utf-8-sig', newline='') as f:
             writer = csv.DictWriter(f, fieldnames=[
@@ -168,9 +327,9 @@ def save_results(products: List[Dict], output_file: str, format: str = 'json'):
                     'location': product['location'],
                     'view_direction': product['view_direction'],
                     'panorama_id': product['panorama_id'],
-                    'x': pos['x'],
-                    'y': pos['y'],
-                    'z': pos['z'],
+                    'x': pos.get('x'),
+                    'y': pos.get('y'),
+                    'z': pos.get('z'),
                     'vr_link': product['vr_link']
                 })
         
@@ -223,25 +382,105 @@ def main():
         default='both',
         help='输出格式：json、csv 或 both（默认 both）'
     )
+    parser.add_argument(
+        '--panorama_dir',
+        type=str,
+        default=None,
+        help='全景图 JSON 根目录；指定时按商品 3D 坐标为每个商品选择最近的观看点位'
+    )
+    parser.add_argument(
+        '--min_view_distance',
+        type=float,
+        default=MIN_VIEW_DISTANCE,
+        help=f'观看点位与商品的最小距离（米，默认 {MIN_VIEW_DISTANCE}）'
+    )
+    parser.add_argument(
+        '--dedup',
+        action='store_true',
+        help='合并在多个点位重复识别的同一商品（按 py_position_3d 距离 + 名称/类型/颜色相似度），保留视角最好的一条'
+    )
+    parser.add_argument(
+        '--dedup_radius',
+        type=float,
+        default=DEDUP_RADIUS,
+        help=f'去重空间距离阈值（米，默认 {DEDUP_RADIUS}）'
+    )
+    parser.add_argument(
+        '--dedup_similarity',
+        type=float,
+        default=DEDUP_MIN_SIMILARITY,
+        help=f'去重名称/类型/颜色相似度阈值（0-1，默认 {DEDUP_MIN_SIMILARITY}）'
+    )
+    parser.add_argument(
+        '--load_workers',
+        type=int,
+        default=0,
+        help='解析分析结果的进程数（默认 0，在当前进程中逐个解析）'
+    )
+    parser.add_argument(
+        '--no_parse_cache',
+        action='store_true',
+        help='不使用分析结果解析缓存'
+    )
+    parser.add_argument(
+        '--product_table',
+        type=str,
+        default=None,
+        help='直接读取 product_table.py 导出的商品列式表目录（不解析分析结果 JSON，是否去重以导出时为准；需要 pyarrow）。'
+             '列式表按固定类型存储，输出与从 JSON 提取时不完全相同：坐标为 float（3 -> 3.0）、panorama_id 为整数，'
+             '为 null 的名称 / 位置 / 视图方向可能为空字符串，VR 链接随之不同'
+    )
     
     args = parser.parse_args()
     
     print('[INFO] 开始提取推荐商品信息...')
-    print(f'[INFO] 分析结果目录: {args.analysis_dir}')
+    print(f'[INFO] 分析结果目录: {args.product_table or args.analysis_dir}')
     print(f'[INFO] 输出文件: {args.output}')
     print(f'[INFO] 输出格式: {args.format}\n')
     
-    # 加载所有分析结果
-    results = load_analysis_results(args.analysis_dir)
-    
-    if not results:
-        print('[ERROR] 未找到任何分析结果文件')
-        return
+    results = None
+    if args.product_table:
+        # 从列式表读取推荐商品（过滤下推到文件，只读取用到的列）
+        try:
+            table = read_product_table(args.product_table, columns=PRODUCT_TABLE_COLUMNS, recommended_only=True)
+        except ImportError as e:
+            print(f'[ERROR] {e}')
+            return
+        print('[WARN] 列式表中的坐标为 float、panorama_id 为整数，输出与从分析结果 JSON 提取时可能不同（如 3 -> 3.0）')
+        products = product_table_results(table.sort_values(['brand', 'point_index', 'product_index'], kind='stable'))
+        brand_names = [brand_result['brand'] for brand_result in products]
+        print(f'[INFO] 商品表中共 {len(brand_names)} 个品牌、{len(table)} 个推荐商品\n')
+    else:
+        # 分析结果按需加载（可选加载时做跨点位商品去重）
+        results = load_analysis_results(
+            args.analysis_dir,
+            workers=args.load_workers,
+            use_cache=not args.no_parse_cache,
+            dedup=(args.dedup_radius, args.dedup_similarity) if args.dedup else None
+        )
+        
+        if not results:
+            print('[ERROR] 未找到任何分析结果文件')
+            return
+        
+        print(f'\n[INFO] 共找到 {len(results)} 个品牌的分析结果\n')
+        brand_names = results.brands
+        products = results
     
-    print(f'\n[INFO] 共加载 {len(results)} 个品牌的分析结果\n')
+    # 构建点位空间索引（可选）
+    panorama_indexes = None
+    if args.panorama_dir:
+        panorama_indexes = load_panorama_indexes(args.panorama_dir, brand_names)
     
     # 提取推荐商品
-    recommended_products = extract_recommended_products(results)
+    recommended_products = extract_recommended_products(
+        products,
+        panorama_indexes,
+        min_view_distance=args.min_view_distance
+    )
+    
+    if results is not None:
+        results.print_summary()
     
     # 打印统计信息
     print_summary(recommended_products)
@@ -267,4 +506,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步任务调度器
+全局控制同时进行的请求数（max in-flight）、每分钟请求数（RPM）、每分钟 token 数（TPM），
+失败时按带抖动的指数退避重试；可选遇到 429 时自动降低 RPM、连续成功后逐步恢复
+
+注意：TokenBucket / AsyncScheduler 内部使用 asyncio 原语，需要在事件循环内（async 函数中）创建
+"""
+
+import time
+import random
+import asyncio
+from typing import Any, Awaitable, Callable, Optional, Tuple, Type
+
+
+class TokenBucket:
+    """
+    令牌桶限流器
+    按 rate_per_minute / 60 的速度匀速补充；桶容量默认为每分钟的配额，开始时桶是满的
+
+    Args:
+        capacity: 桶容量（允许的突发量），None 表示每分钟的配额
+        initial_tokens: 开始时的令牌数，None 表示装满
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        capacity: Optional[float] = None,
+        initial_tokens: Optional[float] = None
+    ):
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.rate = float(rate_per_minute) / 60.0
+        self.tokens = self.capacity if initial_tokens is None else min(self.capacity, float(initial_tokens))
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        """取出 amount 个令牌，不足时等待补充（单次请求量超过桶容量时按桶容量计）"""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def set_rate(self, rate_per_minute: float):
+        """修改补充速度（桶容量不变）"""
+        self._refill()
+        self.rate = float(rate_per_minute) / 60.0
+
+    def adjust(self, delta: float):
+        """按实际用量修正令牌数（delta > 0 表示实际比预估多用了 delta 个）"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
+    """
+    带抖动的指数退避时间（秒）
+    上限为 base_delay * 2^attempt，实际取 [上限/2, 上限] 之间的随机值，避免大量请求同时重试
+    """
+    cap = min(max_delay, base_delay * (2 ** attempt))
+    return cap / 2 + random.uniform(0, cap / 2)
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """异常对应的 HTTP 状态码（openai 的 status_code / aiohttp 的 status），没有则返回 None"""
+    status = getattr(error, 'status_code', None) or getattr(error, 'status', None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """从异常携带的 HTTP 响应（或异常自身的 headers）中读取 Retry-After 头（秒），没有则返回 None"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or getattr(error, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncScheduler:
+    """
+    全局异步调度器
+
+    用法：
+        scheduler = AsyncScheduler(max_in_flight=8, rpm=60, tpm=200000)
+        result = await scheduler.run(lambda: call_api(...), tokens=5000, label='PRADA 点位 3')
+
+    adaptive_rpm 为 True 时（需要设置 rpm）：遇到 429 将 RPM 减半（不低于初始值的 1/8），
+    之后每连续成功 RECOVER_AFTER 次提高 25%，直到恢复初始值
+    """
+
+    RECOVER_AFTER = 10
+
+    def __init__(
+        self,
+        max_in_flight: int = 8,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+        adaptive_rpm: bool = False
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        # RPM 桶容量为 1：请求按 60 / rpm 秒的间隔匀速发出，启动时和空闲之后都不会突发一整分钟的配额
+        self._rpm_bucket = TokenBucket(rpm, capacity=1) if rpm else None
+        self._tpm_bucket = TokenBucket(tpm) if tpm else None
+        self.base_rpm = rpm
+        self.current_rpm = rpm
+        self.adaptive_rpm = adaptive_rpm and bool(rpm)
+        self._success_streak = 0
+
+        # 统计
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.throttled = 0
+
+    def _on_success(self):
+        if not self.adaptive_rpm or self.current_rpm >= self.base_rpm:
+            return
+        self._success_streak += 1
+        if self._success_streak >= self.RECOVER_AFTER:
+            self._success_streak = 0
+            self.current_rpm = min(self.base_rpm, self.current_rpm * 1.25)
+            self._rpm_bucket.set_rate(self.current_rpm)
+
+    def _on_rate_limited(self):
+        self._success_streak = 0
+        if not self.adaptive_rpm:
+            return
+        self.throttled += 1
+        new_rpm = max(self.base_rpm / 8, self.current_rpm / 2)
+        if new_rpm < self.current_rpm:
+            self.current_rpm = new_rpm
+            self._rpm_bucket.set_rate(new_rpm)
+            print(f'[WARN] 触发限流（429），RPM 降至 {new_rpm:.1f}')
+
+    def settle_tokens(self, estimated: int, actual: Optional[int]):
+        """请求完成后用实际 token 用量修正 TPM 令牌桶"""
+        if self._tpm_bucket is not None and actual is not None:
+            self._tpm_bucket.adjust(actual - estimated)
+
+    async def run(
+        self,
+        job: Callable[[], Awaitable[Any]],
+        tokens: int = 0,
+        label: str = ''
+    ) -> Any:
+        """
+        执行一个任务，受并发数、RPM、TPM 限制，可重试错误按退避策略重试
+
+        Args:
+            job: 无参协程函数，每次重试都会重新调用
+            tokens: 预估 token 数（用于 TPM 限流）
+            label: 任务名称（用于日志）
+
+        Returns:
+            job 的返回值；重试耗尽或遇到不可重试错误时返回 None
+        """
+        for attempt in range(self.max_retries + 1):
+            if self._rpm_bucket is not None:
+                await self._rpm_bucket.acquire(1)
+            if self._tpm_bucket is not None and tokens:
+                await self._tpm_bucket.acquire(tokens)
+
+            async with self._semaphore:
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                try:
+                    result = await job()
+                except self.retry_on as e:
+                    error = e
+                except Exception as e:
+                    print(f'[ERROR] {label} 失败（不可重试）: {e}')
+                    self.failed += 1
+                    return None
+                else:
+                    self.completed += 1
+                    self._on_success()
+                    return result
+                finally:
+                    self.in_flight -= 1
+
+            if attempt == self.max_retries:
+                print(f'[ERROR] {label} 重试 {self.max_retries} 次后仍失败: {error}')
+                self.failed += 1
+                return None
+
+            if error_status(error) == 429:
+                self._on_rate_limited()
+            delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+            retry_after = retry_after_seconds(error)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            self.retries += 1
+            print(f'[WARN] {label} 失败: {error}，{delay:.1f} 秒后第 {attempt + 1} 次重试')
+            await asyncio.sleep(delay)
+
+        return None
+
+    def print_summary(self):
+        print('[INFO] 异步调度统计:')
+        print(f'  - 成功任务: {self.completed}')
+        print(f'  - 失败任务: {self.failed}')
+        print(f'  - 重试次数: {self.retries}')
+        print(f'  - 峰值并发: {self.peak_in_flight}/{self.max_in_flight}')
+        if self.adaptive_rpm:
+            print(f'  - 限流降速: {self.throttled} 次（当前 RPM {self.current_rpm:.1f}/{self.base_rpm}）')
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Excel 报告写入方式基准：普通工作簿 vs 流式写入（write-only）
+- 生成合成分析结果（默认 500 个品牌 x 100 个点位 = 50000 行商品数据）
+- 每种模式在独立子进程中生成报告，分别统计耗时和峰值内存（ru_maxrss）
+- 合成数据不含图片，只比较单元格写入和保存
+python bench_excel_report.py [--brands 500] [--points 100] [--products 5]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import importlib
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+MODES = ('normal', 'streaming')
+
+
+def make_synthetic_results(analysis_dir: str, brands: int, points: int, products: int):
+    """生成合成的 {brand}_analysis.json"""
+    os.makedirs(analysis_dir, exist_ok=True)
+    for b in range(brands):
+        brand = f'品牌{b:04d}'
+        product_results = []
+        for p in range(points):
+            product_results.append({
+                'seq_id': p,
+                'panorama_id': 100000 + p,
+                'images': [],
+                'products': [
+                    {
+                        'name': f'商品{k}',
+                        'type': '上衣',
+                        'colors': ['黑', '白'],
+                        'materials': ['棉'],
+                        'location': '中岛展台',
+                        'view_direction': 'f',
+                        'is_recommended': k % 2 == 0,
+                        'position_3d': {'x': 1.0, 'y': 2.0, 'z': 0.5}
+                    }
+                    for k in range(products)
+                ]
+            })
+        result = {
+            'brand': brand,
+            'product_results': product_results,
+            'store_analysis': {'store_category': '服饰', 'price_positioning': '中端', 'target_customers': ['年轻人']}
+        }
+        with open(os.path.join(analysis_dir, f'{brand}_analysis.json'), 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+
+
+def run_one(mode: str, analysis_dir: str, output_file: str):
+    """子进程：生成一次报告，输出 JSON 结果"""
+    doc = importlib.import_module('05_result_to_doc')
+    results = doc.load_analysis_results(analysis_dir, use_cache=False)
+    start = time.perf_counter()
+    # 片段缓存到磁盘（与 05 默认行为一致），避免全部品牌片段常驻内存影响峰值统计
+    fragments = doc.build_report_fragments(results, {}, {}, cache_dir=os.path.join(os.path.dirname(output_file), f'.fragment_cache_{mode}'))
+    doc.generate_excel_document(results, {}, {}, output_file, output_dir=os.path.dirname(output_file), thumb_cache_dir=None, excel_mode=mode, fragments=fragments)
+    elapsed = time.perf_counter() - start
+    # Linux 下 ru_maxrss 单位为 KB（macOS 为字节）
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    print(json.dumps({'mode': mode, 'seconds': elapsed, 'peak_rss_mb': peak_mb, 'size_mb': os.path.getsize(output_file) / 1024 / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Excel 报告写入方式基准（耗时、峰值内存）')
+    parser.add_argument('--brands', type=int, default=500, help='合成品牌数（默认 500）')
+    parser.add_argument('--points', type=int, default=100, help='每个品牌的点位数（默认 100）')
+    parser.add_argument('--products', type=int, default=5, help='每个点位的商品数（默认 5）')
+    parser.add_argument('--work_dir', type=str, default=None, help='工作目录（默认临时目录，结束后删除）')
+    parser.add_argument('--run', choices=MODES, help=argparse.SUPPRESS)  # 子进程内部使用
+    args = parser.parse_args()
+
+    if args.run:
+        run_one(args.run, os.path.join(args.work_dir, 'analysis'), os.path.join(args.work_dir, f'{args.run}.xlsx'))
+        return
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench_excel_')
+    try:
+        print(f'[INFO] 生成合成数据: {args.brands} 个品牌 x {args.points} 个点位（{args.brands * args.points} 行）...')
+        make_synthetic_results(os.path.join(work_dir, 'analysis'), args.brands, args.points, args.products)
+
+        reports = []
+        for mode in MODES:
+            print(f'[INFO] 运行 {mode} ...')
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--run', mode, '--work_dir', work_dir],
+                capture_output=True, text=True, cwd=SCRIPT_DIR
+            )
+            if proc.returncode != 0:
+                print(f'[ERROR] {mode} 失败:\n{proc.stderr}')
+                continue
+            reports.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+        print(f'\n{"模式":<10}{"耗时(s)":>10}{"峰值内存(MB)":>14}{"文件(MB)":>10}')
+        for r in reports:
+            print(f'{r["mode"]:<10}{r["seconds"]:>10.1f}{r["peak_rss_mb"]:>14.0f}{r["size_mb"]:>10.1f}')
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+04 推荐商品提取基准：旧实现（json.dump 整个列表）vs 当前实现（逐条写出 JSON，缺少 position_3d 时汇总告警）
+- 生成合成分析结果（默认 100000 个商品，品牌取自 store_view_dict，约一半为推荐商品，部分缺少 position_3d）
+- 每个品牌构建合成点位索引，部分商品会改用更近的观看点位
+- 分别统计 提取、写出 JSON / CSV 的耗时，并检查两种实现的输出文件完全相同
+python bench_recommended_products.py [--products 100000] [--points 50]
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import importlib
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+from store_view_dict import store_view_dict
+from spatial_index import PanoramaIndex
+
+extract_stage = importlib.import_module('04_locAgl_to_prodView')
+
+
+def make_synthetic_results(products: int, points: int, seed: int = 0):
+    """生成合成的品牌结果和点位索引"""
+    rng = random.Random(seed)
+    brands = sorted(store_view_dict)
+    per_brand = max(1, products // len(brands))
+    results = []
+    indexes = {}
+    for b, brand in enumerate(brands):
+        coordinates = {
+            seq_id: {'id': 100000 * (b + 1) + seq_id, 'position_x': rng.uniform(0, 30), 'position_y': rng.uniform(0, 30), 'position_z': 1.5}
+            for seq_id in range(points)
+        }
+        indexes[brand] = PanoramaIndex.from_coordinates(coordinates)
+        product_results = []
+        for seq_id in range(points):
+            items = []
+            for k in range(per_brand // points):
+                product = {
+                    'name': f'商品{seq_id}_{k}',
+                    'type': '上衣',
+                    'colors': ['黑'],
+                    'location': '中岛展台',
+                    'view_direction': rng.choice('fblr'),
+                    'is_recommended': rng.random() < 0.5,
+                }
+                if rng.random() < 0.95:
+                    product['position_3d'] = {'x': round(rng.uniform(-5, 5), 3), 'y': round(rng.uniform(-5, 5), 3), 'z': round(rng.uniform(-1, 1), 3)}
+                if rng.random() < 0.8:
+                    product['py_position_3d'] = {'x': round(rng.uniform(0, 30), 3), 'y': round(rng.uniform(0, 30), 3), 'z': 1.0}
+                items.append(product)
+            product_results.append({'seq_id': seq_id, 'panorama_id': coordinates[seq_id]['id'], 'images': [], 'products': items})
+        results.append({'brand': brand, 'product_results': product_results})
+    return results, indexes
+
+
+def legacy_extract(results, panorama_indexes, min_view_distance=extract_stage.MIN_VIEW_DISTANCE):
+    """旧实现：逐个品牌、点位、商品循环"""
+    recommended_products = []
+    for brand_result in results:
+        brand_name = brand_result.get('brand', '')
+        store_view_id = store_view_dict.get(brand_name)
+        if not store_view_id:
+            continue
+        for point_result in brand_result.get('product_results', []):
+            panorama_id = point_result.get('panorama_id')
+            for product in point_result.get('products', []):
+                if not product.get('is_recommended', False):
+                    continue
+                position_3d = product.get('position_3d')
+                if not position_3d:
+                    continue
+                product_info = {
+                    'brand': brand_name,
+                    'name': product.get('name', ''),
+                    'location': product.get('location', ''),
+                    'view_direction': product.get('view_direction', ''),
+                    'panorama_id': panorama_id,
+                    'position_3d': position_3d.copy(),
+                    'vr_link': None
+                }
+                vr_link = extract_stage.build_vr_link(store_view_id, panorama_id, position_3d)
+                index = panorama_indexes.get(brand_name)
+                py_position = product.get('py_position_3d')
+                if index is not None and py_position:
+                    best = extract_stage.choose_best_view(py_position, panorama_id, index, min_view_distance)
+                    if best is not None:
+                        best_id, direction, distance = best
+                        vr_link = extract_stage.build_vr_link(store_view_id, best_id, direction)
+                        product_info['best_panorama_id'] = best_id
+                        product_info['view_distance'] = round(distance, 3)
+                product_info['vr_link'] = vr_link
+                recommended_products.append(product_info)
+    return recommended_products
+
+
+def legacy_save(products, output_file):
+    """旧实现：json.dump 整个列表 + csv.DictWriter"""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(products, f, ensure_ascii=False, indent=2)
+    with open(output_file.replace('.json', '.csv'), 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['brand', 'name', 'location', 'view_direction', 'panorama_id', 'x', 'y', 'z', 'vr_link'])
+        writer.writeheader()
+        for product in products:
+            pos = product['position_3d']
+            writer.writerow({
+                'brand': product['brand'], 'name': product['name'], 'location': product['location'],
+                'view_direction': product['view_direction'], 'panorama_id': product['panorama_id'],
+                'x': pos['x'], 'y': pos['y'], 'z': pos['z'], 'vr_link': product['vr_link']
+            })
+
+
+def same_file(a: str, b: str) -> bool:
+    with open(a, 'rb') as fa, open(b, 'rb') as fb:
+        return fa.read() == fb.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='04 推荐商品提取基准（旧实现 vs 当前实现）')
+    parser.add_argument('--products', type=int, default=100000, help='合成商品数（默认 100000）')
+    parser.add_argument('--points', type=int, default=50, help='每个品牌的点位数（默认 50）')
+    args = parser.parse_args()
+
+    print(f'[INFO] 生成合成数据: 约 {args.products} 个商品，{len(store_view_dict)} 个品牌 ...')
+    results, indexes = make_synthetic_results(args.products, args.points)
+    total = sum(len(p['products']) for r in results for p in r['product_results'])
+
+    work_dir = tempfile.mkdtemp(prefix='bench_recommended_')
+    try:
+        timings = {}
+
+        start = time.perf_counter()
+        products = legacy_extract(results, indexes)
+        timings['legacy_extract'] = time.perf_counter() - start
+        legacy_file = os.path.join(work_dir, 'legacy.json')
+        start = time.perf_counter()
+        legacy_save(products, legacy_file)
+        timings['legacy_save'] = time.perf_counter() - start
+
+        current_file = os.path.join(work_dir, 'current.json')
+        start = time.perf_counter()
+        recommended = extract_stage.extract_recommended_products(results, indexes)
+        timings['current_extract'] = time.perf_counter() - start
+        start = time.perf_counter()
+        extract_stage.save_results(recommended, current_file, 'json')
+        extract_stage.save_results(recommended, current_file, 'csv')
+        timings['current_save'] = time.perf_counter() - start
+
+        same = same_file(legacy_file, current_file) and same_file(legacy_file.replace('.json', '.csv'), current_file.replace('.json', '.csv'))
+        print(f'\n商品 {total} 个，推荐商品 {len(products)} 个，输出文件一致: {same}')
+        for name, seconds in timings.items():
+            print(f'  {name:<24}{seconds:>8.3f}s')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+品牌分类（05 生成文档时使用）
+- brand_list.py 中的分类只解析一次
+- 未列出的品牌按已知品牌表 / 关键字表自动分类：关键字表预编译为 Aho-Corasick 自动机，一次扫描品牌名得到全部命中
+- 自动分类结果按品牌缓存，同一品牌只计算（和打印日志）一次
+"""
+
+import os
+import re
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# ==================== 配置项 ====================
+DEFAULT_BRAND_LIST_FILE = os.path.join(
+    os.path.dirname(__file__),
+    'brand_list.py'
+)
+OTHER_CATEGORY = '其他类'
+
+# 已知品牌分类映射（扩展列表），品牌名或其大写完全匹配
+KNOWN_BRANDS = {
+    # 美妆护肤类
+    'LAMER': '美妆护肤类',
+    'SK-2': '美妆护肤类',
+    'SKINCEUTICALS': '美妆护肤类',
+    'SKIN CEUTICALS': '美妆护肤类',
+    'CLEDEPEAU': '美妆护肤类',
+    'CLARINS': '美妆护肤类',
+    'DECORTE': '美妆护肤类',
+    'DIOR': '美妆护肤类',
+    'GUERLAIN': '美妆护肤类',
+    'VALMONT': '美妆护肤类',
+    'SISLY': '美妆护肤类',
+    'LAPRAIRIE': '美妆护肤类',
+    'WHOO': '美妆护肤类',
+    'HIEIDO': '美妆护肤类',
+    'TOMFORD': '美妆护肤类',
+    'TOM FORD': '美妆护肤类',
+    'HOURGLASS': '美妆护肤类',
+    'BOBBIBROWN': '美妆护肤类',
+    'BOBBI BROWN': '美妆护肤类',
+    'ACQUADIPARMA': '美妆护肤类',
+    'ACQUA DI PARMA': '美妆护肤类',
+    'JOMALONE': '美妆护肤类',
+    "L'OCCITANE": '美妆护肤类',
+    'GIVENCHY': '美妆护肤类',
+    '雅诗兰黛': '美妆护肤类',
+
+    # 珠宝首饰类
+    'BVLGARI': '珠宝首饰类',
+    'TUDOR': '珠宝首饰类',
+    'OMEGA': '珠宝首饰类',
+    'IWC': '珠宝首饰类',
+    'CAURTIER': '珠宝首饰类',
+    'CARTIER': '珠宝首饰类',
+    'CUCCI': '珠宝首饰类',
+    'GUCCI': '珠宝首饰类',
+    'APM': '珠宝首饰类',
+    '老庙': '珠宝首饰类',
+    '老凤祥': '珠宝首饰类',
+    '诗普琳': '珠宝首饰类',
+    '中国珠宝': '珠宝首饰类',
+    '周生生': '珠宝首饰类',
+    '潮宏基': '珠宝首饰类',
+    '周大生': '珠宝首饰类',
+    'DR': '珠宝首饰类',
+    '中国黄金': '珠宝首饰类',
+    '珠利莱': '珠宝首饰类',
+
+    # 时尚服饰类
+    'ARMANI': '时尚服饰类',
+    'MO&CO': '时尚服饰类',
+    'MO AND CO': '时尚服饰类',
+    '太平鸟': '时尚服饰类',
+    '13DEMARZO': '时尚服饰类',
+    '13DE MARZO': '时尚服饰类',
+    'WE11DONE': '时尚服饰类',
+    'ELAND': '时尚服饰类',
+    'E.LAND': '时尚服饰类',
+
+    # 箱包类
+    'DISSONA': '箱包类',
+    "ST&SAT": '箱包类',
+    'ST AND SAT': '箱包类',
+    'GG-CC': '箱包类',
+    'GG CC': '箱包类',
+
+    # 鞋履类
+    # BIRKENSTOCK 已在 brand_list.py 中
+
+    # 运动休闲类
+    'JORDAN': '运动休闲类',
+    'AIR JORDAN': '运动休闲类',
+    '李宁': '运动休闲类',
+
+    # 餐饮类
+    '兰湘子': '餐饮类',
+
+    # 汽车类
+    '蔚来': '汽车类',
+    '智己': '汽车类',
+
+    # 家居用品类
+    # 睿锦尚品 已在 brand_list.py 中
+
+    # 儿童用品类
+    '阿吉豆': '儿童用品类',
+
+    # 其他已知品牌
+    '浮光之秋': '时尚服饰类',
+}
+
+# 关键字匹配：品牌名（或其大写）包含关键字即归入该分类，多个分类命中时取靠前的分类
+CATEGORY_KEYWORDS = {
+    '美妆护肤类': ['SK', 'LAMER', 'CLARINS', 'DIOR', 'LANCOME', 'HERMES', 'WHOO', 'VALMONT',
+                  'LA PRAIRIE', 'TOM FORD', 'HOURGLASS', 'BOBBI', 'ACQUA', 'JOMALONE',
+                  'OCCITANE', 'GIVENCHY', 'GUERLAIN', '雅诗兰黛', 'CPB', 'CLEDEPEAU', 'DECORTE'],
+    '珠宝首饰类': ['珠宝', '黄金', '钻石', '周', '老', 'DR', 'BVLGARI', 'TIFFANY', 'CARTIER',
+                  'OMEGA', 'IWC', 'TUDOR', 'APM', 'HEFANG', '珠利', '诗普'],
+    '时尚服饰类': ['太平鸟', 'MO', 'ARMANI', '13DE', 'MARZO', 'WE11', 'ELAND', '浮光'],
+    '箱包类': ['MCM', 'BALLY', 'BOOS', 'DISSONA', 'ST', 'GG', 'CC', 'TUMI', 'COACH'],
+    '鞋履类': ['BIRKENSTOCK', 'BIRKEN', 'BOSS'],
+    '运动休闲类': ['JORDAN', '耐克', 'NIKE', '安踏', 'ANTA', '李宁', 'LI NING', 'ADIDAS'],
+    '餐饮类': ['EAT', 'O\'EAT', '兰湘', '星巴克', 'STARBUCKS', '咖啡', 'COFFEE'],
+    '汽车类': ['蔚来', '特斯拉', 'TESLA', '智己', 'BYD', '理想'],
+    '家居用品类': ['睿锦', '宜家', 'IKEA'],
+    '自行车类': ['BROMPTON', 'SPECIALIZED'],
+}
+
+# brand_list.py 格式: # 分类类\n    "品牌1", "品牌2",
+BRAND_LIST_PATTERN = re.compile(r'#\s*([^\n#]+类)\s*\n\s*((?:"[^"]+",?\s*)+)', re.MULTILINE)
+BRAND_NAME_PATTERN = re.compile(r'"([^"]+)"')
+
+
+class AhoCorasick:
+    """
+    多关键字子串匹配自动机
+
+    Args:
+        patterns: [(关键字, 值), ...]，同一关键字可对应多个值
+    """
+
+    def __init__(self, patterns: List[Tuple[str, int]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+        for word, value in patterns:
+            if not word:
+                continue
+            state = 0
+            for ch in word:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(value)
+
+        # 广度优先构建失败指针，输出沿失败链合并
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = 0 if state == 0 else self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_values(self, text: str) -> Iterator[int]:
+        """text 中出现的所有关键字对应的值（可重复）"""
+        state = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                yield from out[state]
+
+
+def parse_brand_list(brand_list_file: str) -> Dict[str, str]:
+    """
+    从 brand_list.py 解析品牌分类信息
+
+    Returns:
+        {brand_name: category_name}
+    """
+    brand_category_map = {}
+
+    if not os.path.exists(brand_list_file):
+        print(f'[WARN] 品牌列表文件不存在: {brand_list_file}')
+        return brand_category_map
+
+    try:
+        with open(brand_list_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        for category, brands_str in BRAND_LIST_PATTERN.findall(content):
+            category = category.strip()
+            # 提取品牌名称（去除引号和逗号）
+            for brand in BRAND_NAME_PATTERN.findall(brands_str):
+                brand_category_map[brand] = category
+
+        print(f'[INFO] 已加载 {len(brand_category_map)} 个品牌的分类信息')
+    except Exception as ex:
+        print(f'[ERROR] 解析品牌列表文件失败: {ex}')
+
+    return brand_category_map
+
+
+class BrandCategorizer:
+    """
+    品牌分类器：构建一次，按品牌缓存结果
+
+    用法：
+        categorizer = BrandCategorizer()
+        categorizer.categorize('安踏')       # brand_list.py 中的分类，未列出时自动分类
+        categorizer.auto_categorize('NIKE')  # 只按已知品牌 / 关键字推断
+
+    Args:
+        brand_list_file: brand_list.py 路径，None 表示默认文件
+    """
+
+    def __init__(self, brand_list_file: Optional[str] = None):
+        self.brand_map = parse_brand_list(brand_list_file or DEFAULT_BRAND_LIST_FILE)
+        self._categories = list(CATEGORY_KEYWORDS)
+        self._matcher = AhoCorasick([
+            (key, index)
+            for index, key_list in enumerate(CATEGORY_KEYWORDS.values())
+            for key in key_list
+        ])
+        self._auto_cache: Dict[str, str] = {}
+        self._logged: Set[str] = set()
+
+    def auto_categorize(self, brand_name: str) -> str:
+        """根据品牌名称自动推断分类"""
+        category = self._auto_cache.get(brand_name)
+        if category is not None:
+            return category
+
+        brand_upper = brand_name.upper()
+        # 首先检查完全匹配
+        category = KNOWN_BRANDS.get(brand_name) or KNOWN_BRANDS.get(brand_upper)
+        if category is None:
+            # 关键字匹配：大写和原始名称中命中的关键字里，取最靠前的分类
+            indices = set(self._matcher.iter_values(brand_upper))
+            if brand_upper != brand_name:
+                indices.update(self._matcher.iter_values(brand_name))
+            category = self._categories[min(indices)] if indices else OTHER_CATEGORY
+
+        self._auto_cache[brand_name] = category
+        return category
+
+    def categorize(self, brand_name: str, brand_map: Optional[Dict[str, str]] = None) -> str:
+        """
+        获取品牌分类，映射中未找到时自动分类（每个品牌只打印一次日志）
+
+        Args:
+            brand_map: 品牌分类映射，None 表示 brand_list.py 中的分类
+        """
+        category = (self.brand_map if brand_map is None else brand_map).get(brand_name)
+        if category:
+            return category
+
+        category = self.auto_categorize(brand_name)
+        if brand_name not in self._logged:
+            self._logged.add(brand_name)
+            print(f'[INFO] 品牌 "{brand_name}" 未在 brand_list.py 中找到，自动分类为: {category}')
+        return category
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+品牌分析断点日志（JSONL，只追加）
+每完成一个点位追加一行，不再每次重写整个 {brand}_analysis.json；
+品牌完成后压缩（compact）为最终的 {brand}_analysis.json，中断后重启时跳过日志中已有的点位
+"""
+
+import os
+import json
+import threading
+from typing import Dict, List, Optional
+
+
+def write_json_atomic(data: Dict, output_file: str):
+    """先写临时文件再替换，避免中断时留下写了一半的 JSON"""
+    tmp_file = f'{output_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, output_file)
+
+
+def _is_complete_store(store_analysis: Optional[Dict]) -> bool:
+    """店铺分析是否已完成（旧版本输出中可能保存了 JSON 解析失败的结果，需要重试）"""
+    return store_analysis is not None and 'parse_error' not in store_analysis
+
+
+class BrandCheckpoint:
+    """
+    单个品牌的断点日志 {output_dir}/{brand}_checkpoint.jsonl
+
+    每行一条记录：
+        {"type": "point", "seq_id": 3, "panorama_id": 123, "images": [...], "products": [...]}
+        {"type": "store", "store_analysis": {...}}
+    未检测到商品的点位也会记录（products 为空），重启时同样跳过；调用失败的点位不记录，重启时重新分析
+    """
+
+    def __init__(self, output_dir: str, brand_name: str):
+        self.brand = brand_name
+        self.path = os.path.join(output_dir, f'{brand_name}_checkpoint.jsonl')
+        self._lock = threading.Lock()
+
+    def _append(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+
+    def append_point(self, seq_id: int, panorama_id, images: List[str], products: List[Dict]):
+        """追加一个已分析点位（products 中已计算 py_position_3d）"""
+        self._append({
+            'type': 'point',
+            'seq_id': seq_id,
+            'panorama_id': panorama_id,
+            'images': images,
+            'products': products
+        })
+
+    def append_store(self, store_analysis: Dict):
+        """追加店铺环境分析结果"""
+        self._append({'type': 'store', 'store_analysis': store_analysis})
+
+    def load(self) -> Dict:
+        """
+        读取断点日志（同一点位出现多次时以最后一条为准，中断时写了一半的行会被忽略）
+
+        Returns:
+            {'points': {seq_id: 记录}, 'store_analysis': {...} 或 None}
+        """
+        state = {'points': {}, 'store_analysis': None}
+        if not os.path.exists(self.path):
+            return state
+        self._truncate_partial_line()
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f'[WARN] {self.brand}: 断点日志第 {line_no} 行不完整，已忽略')
+                    continue
+                if record.get('type') == 'point':
+                    state['points'][record['seq_id']] = record
+                elif record.get('type') == 'store':
+                    state['store_analysis'] = record['store_analysis']
+        return state
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    @staticmethod
+    def state_from_result(brand_result: Dict) -> Dict:
+        """
+        由已有的 {brand}_analysis.json 内容构造与 load() 相同结构的进度
+        （最终结果中不含未检测到商品的点位，这些点位会被视为未完成）
+        """
+        points = {}
+        for item in brand_result.get('product_results', []):
+            points[item['seq_id']] = {
+                'type': 'point',
+                'seq_id': item['seq_id'],
+                'panorama_id': item.get('panorama_id'),
+                'images': item.get('images', []),
+                'products': item.get('products', [])
+            }
+        store_analysis = brand_result.get('store_analysis')
+        if not _is_complete_store(store_analysis):
+            store_analysis = None
+        return {'points': points, 'store_analysis': store_analysis}
+
+    def seed(self, state: Dict):
+        """将 state_from_result 得到的进度写入断点日志（用于从旧版本输出续跑；JSON 解析失败的店铺分析不写入，续跑时重试）"""
+        for record in state['points'].values():
+            self._append(record)
+        if _is_complete_store(state['store_analysis']):
+            self.append_store(state['store_analysis'])
+
+    def _truncate_partial_line(self):
+        """截掉末尾没有换行符的半行（中断时写了一半），避免之后追加的记录与其拼在同一行"""
+        with self._lock, open(self.path, 'rb+') as f:
+            data = f.read()
+            if not data or data.endswith(b'\n'):
+                return
+            f.truncate(data.rfind(b'\n') + 1)
+            print(f'[WARN] {self.brand}: 断点日志末尾有未写完的记录，已截断')
+
+    def reset(self):
+        """删除断点日志（--force 重新分析时调用）"""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
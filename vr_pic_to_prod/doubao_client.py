@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+豆包 API 共享客户端
+进程内所有品牌、所有点位复用同一个 OpenAI 客户端（HTTP keep-alive 连接池），
+避免每次调用都重新建立 TCP/TLS 连接，并统计连接复用情况和每次调用的建连耗时
+"""
+
+import time
+import threading
+import contextvars
+from typing import Dict, Optional, Tuple
+
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+import httpx
+
+# ==================== 配置项 ====================
+KEEPALIVE_EXPIRY = 120  # 空闲连接保活时间（秒）
+
+
+# ==================== 连接统计 ====================
+class ConnectionStats:
+    """连接池统计：请求数、新建连接数、复用连接数、建连总耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.setup_seconds = 0.0
+
+    def record(self, call_info: Dict):
+        with self._lock:
+            self.requests += 1
+            if call_info['new_connection']:
+                self.new_connections += 1
+                self.setup_seconds += call_info['setup_ms'] / 1000
+            else:
+                self.reused_connections += 1
+
+    def summary(self) -> Dict:
+        with self._lock:
+            avg_setup_ms = (
+                self.setup_seconds * 1000 / self.new_connections
+                if self.new_connections else 0.0
+            )
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': self.reused_connections,
+                'total_setup_ms': round(self.setup_seconds * 1000, 1),
+                'avg_setup_ms': round(avg_setup_ms, 1),
+                # 复用的连接按平均建连耗时估算节省的时间
+                'estimated_saved_ms': round(avg_setup_ms * self.reused_connections, 1)
+            }
+
+    def print_summary(self):
+        s = self.summary()
+        if not s['requests']:
+            return
+        print('[INFO] 连接池统计:')
+        print(f'  - 请求数: {s["requests"]}')
+        print(f'  - 新建连接: {s["new_connections"]}（平均建连 {s["avg_setup_ms"]} ms）')
+        print(f'  - 复用连接: {s["reused_connections"]}（估算节省 {s["estimated_saved_ms"] / 1000:.1f} 秒）')
+
+
+CONNECTION_STATS = ConnectionStats()
+
+# 当前线程/协程最近一次请求的连接信息
+_last_call: contextvars.ContextVar = contextvars.ContextVar('doubao_last_call', default=None)
+# 当前线程/协程累计发出的 HTTP 请求数（含 SDK 内部重试，用于统计每次调用的重试次数）
+_request_count: contextvars.ContextVar = contextvars.ContextVar('doubao_request_count', default=0)
+
+
+class _CallTracer:
+    """
+    单次请求的 httpcore trace 回调
+    出现 connect_tcp 事件说明新建了连接，从 connect_tcp 开始到发送请求头之间的时间即建连（TCP + TLS）耗时
+    """
+
+    def __init__(self, request_bytes: Optional[int] = None):
+        self.started = time.perf_counter()
+        self.request_bytes = request_bytes
+        self.connect_started: Optional[float] = None
+        self.request_sent: Optional[float] = None
+        self.setup_ms = 0.0
+        self.ttfb_ms: Optional[float] = None
+
+    def handle(self, event_name: str):
+        now = time.perf_counter()
+        if event_name.endswith('connect_tcp.started'):
+            self.connect_started = now
+        elif event_name.endswith('send_request_headers.started'):
+            self.request_sent = now
+            if self.connect_started is not None:
+                self.setup_ms = (now - self.connect_started) * 1000
+        elif event_name.endswith('receive_response_headers.complete'):
+            if self.request_sent is not None:
+                self.ttfb_ms = (now - self.request_sent) * 1000
+
+    def __call__(self, event_name: str, info: Dict):
+        self.handle(event_name)
+
+    def finish(self) -> Dict:
+        return {
+            'new_connection': self.connect_started is not None,
+            'setup_ms': round(self.setup_ms, 1),
+            'ttfb_ms': round(self.ttfb_ms, 1) if self.ttfb_ms is not None else None,
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'request_bytes': self.request_bytes
+        }
+
+
+class _AsyncCallTracer(_CallTracer):
+    """异步客户端使用的 trace 回调（httpcore 要求异步接口的回调为协程函数）"""
+
+    async def __call__(self, event_name: str, info: Dict):
+        self.handle(event_name)
+
+
+def _request_bytes(request: httpx.Request) -> Optional[int]:
+    try:
+        return len(request.content)
+    except httpx.RequestNotRead:
+        return None
+
+
+def _on_request(request: httpx.Request):
+    _request_count.set(_request_count.get() + 1)
+    request.extensions['trace'] = _CallTracer(_request_bytes(request))
+
+
+def _on_response(response: httpx.Response):
+    tracer = response.request.extensions.get('trace')
+    if not isinstance(tracer, _CallTracer):
+        return
+    call_info = tracer.finish()
+    CONNECTION_STATS.record(call_info)
+    _last_call.set(call_info)
+
+
+async def _on_request_async(request: httpx.Request):
+    _request_count.set(_request_count.get() + 1)
+    request.extensions['trace'] = _AsyncCallTracer(_request_bytes(request))
+
+
+async def _on_response_async(response: httpx.Response):
+    _on_response(response)
+
+
+def last_call_info() -> Optional[Dict]:
+    """
+    返回当前线程（异步客户端为当前协程）最近一次请求的连接信息
+
+    Returns:
+        {new_connection, setup_ms, ttfb_ms, elapsed_ms, request_bytes}，没有请求时返回 None
+    """
+    return _last_call.get()
+
+
+def request_count() -> int:
+    """
+    当前线程（异步客户端为当前协程）累计发出的 HTTP 请求数
+    调用前后相减即一次调用实际发出的请求数（含重试）
+    """
+    return _request_count.get()
+
+
+def format_call_info(call_info: Optional[Dict]) -> str:
+    """格式化连接信息，用于 [DEBUG] 日志"""
+    if not call_info:
+        return '连接信息未知'
+    if call_info['new_connection']:
+        return f'新建连接，建连耗时 {call_info["setup_ms"]} ms'
+    return '复用连接，建连耗时 0 ms'
+
+
+# ==================== 共享客户端 ====================
+_clients: Dict[Tuple[str, str], OpenAI] = {}
+_clients_lock = threading.Lock()
+
+
+def get_shared_client(
+    api_key: str,
+    base_url: str,
+    max_connections: int = 5,
+    timeout: float = 600
+) -> OpenAI:
+    """
+    获取进程内共享的 OpenAI 客户端（兼容豆包 API）
+    同一 (api_key, base_url) 只创建一次，连接池大小与并发数一致
+
+    Args:
+        api_key: API 密钥
+        base_url: API 基础 URL
+        max_connections: 连接池最大连接数，通常等于并发数 MAX_WORKERS
+        timeout: 默认超时时间（秒）
+
+    Returns:
+        OpenAI 客户端
+    """
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client = DefaultHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=KEEPALIVE_EXPIRY
+                ),
+                timeout=timeout,
+                event_hooks={'request': [_on_request], 'response': [_on_response]}
+            )
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=http_client
+            )
+            _clients[key] = client
+            print(f'[INFO] 已创建共享客户端（连接池大小 {max_connections}）: {base_url}')
+    return client
+
+
+def close_shared_clients():
+    """关闭所有共享客户端，释放连接池"""
+    with _clients_lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _clients.clear()
+
+
+# ==================== 共享异步客户端 ====================
+# 异步客户端绑定在创建它的事件循环上，事件循环结束前需调用 aclose_shared_async_clients
+_async_clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
+
+
+def get_shared_async_client(
+    api_key: str,
+    base_url: str,
+    max_connections: int = 8,
+    timeout: float = 600,
+    max_retries: int = 0
+) -> AsyncOpenAI:
+    """
+    获取共享的 AsyncOpenAI 客户端（供异步引擎使用）
+    默认关闭 SDK 自带重试，由调度器统一负责重试和退避
+
+    Args:
+        api_key: API 密钥
+        base_url: API 基础 URL
+        max_connections: 连接池最大连接数，通常等于最大并发请求数
+        timeout: 默认超时时间（秒）
+        max_retries: SDK 内部重试次数
+
+    Returns:
+        AsyncOpenAI 客户端
+    """
+    key = (api_key, base_url)
+    client = _async_clients.get(key)
+    if client is None:
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            ),
+            timeout=timeout,
+            event_hooks={'request': [_on_request_async], 'response': [_on_response_async]}
+        )
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=max_retries
+        )
+        _async_clients[key] = client
+        print(f'[INFO] 已创建共享异步客户端（连接池大小 {max_connections}）: {base_url}')
+    return client
+
+
+async def aclose_shared_async_clients():
+    """关闭所有共享异步客户端"""
+    for client in _async_clients.values():
+        try:
+            await client.close()
+        except Exception:
+            pass
+    _async_clients.clear()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全景图片下载清单（SQLite）
+- files: URL -> 本地路径、大小、ETag / Last-Modified、sha256，用于条件请求（只下载变化的图片）和批量校验
+- sources: 全景 JSON 文件 -> 解析出的图片 URL 和有坐标的点位（按修改时间 + 大小缓存，未变化的 JSON 不再重复解析）
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple
+
+CHUNK = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    """计算文件的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DownloadManifest:
+    """
+    下载清单（线程安全）
+
+    Args:
+        db_path: SQLite 数据库文件路径
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'url TEXT PRIMARY KEY, '
+            'path TEXT NOT NULL, '
+            'size INTEGER NOT NULL, '
+            'etag TEXT, '
+            'last_modified TEXT, '
+            'sha256 TEXT, '
+            'checked_at REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS sources ('
+            'json_path TEXT PRIMARY KEY, '
+            'mtime_ns INTEGER NOT NULL, '
+            'size INTEGER NOT NULL, '
+            'urls TEXT NOT NULL, '
+            'point_seq_ids TEXT)'
+        )
+        # 旧版本清单的 sources 表没有 point_seq_ids 列
+        columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(sources)')}
+        if 'point_seq_ids' not in columns:
+            self._conn.execute('ALTER TABLE sources ADD COLUMN point_seq_ids TEXT')
+        self._conn.commit()
+
+    # ---------- 图片 ----------
+    def get(self, url: str) -> Optional[Dict]:
+        """读取 URL 的清单记录，不存在返回 None"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM files WHERE url = ?', (url,)).fetchone()
+        return dict(row) if row else None
+
+    def put(
+        self,
+        url: str,
+        path: str,
+        size: int,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        sha256: Optional[str] = None
+    ):
+        """写入（覆盖）URL 的清单记录（本地路径统一保存为绝对路径）"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO files (url, path, size, etag, last_modified, sha256, checked_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, os.path.abspath(path), size, etag, last_modified, sha256, time.time())
+            )
+            self._conn.commit()
+
+    def touch(self, url: str):
+        """记录一次确认未变化（304）"""
+        with self._lock:
+            self._conn.execute('UPDATE files SET checked_at = ? WHERE url = ?', (time.time(), url))
+            self._conn.commit()
+
+    def delete(self, url: str):
+        with self._lock:
+            self._conn.execute('DELETE FROM files WHERE url = ?', (url,))
+            self._conn.commit()
+
+    def entries(self, path_prefix: Optional[str] = None) -> List[Dict]:
+        """所有清单记录（可按目录筛选，目录与 put 一样按绝对路径比较）"""
+        with self._lock:
+            if path_prefix:
+                path_prefix = os.path.join(os.path.abspath(path_prefix), '')
+                rows = self._conn.execute(
+                    'SELECT * FROM files WHERE substr(path, 1, ?) = ?',
+                    (len(path_prefix), path_prefix)
+                ).fetchall()
+            else:
+                rows = self._conn.execute('SELECT * FROM files').fetchall()
+        return [dict(row) for row in rows]
+
+    # ---------- JSON 来源 ----------
+    def get_source(self, json_path: str) -> Optional[Tuple[List[str], List[int]]]:
+        """JSON 文件未变化（修改时间和大小一致）时返回缓存的 (URL 列表, 点位列表)，否则返回 None"""
+        st = os.stat(json_path)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT urls, point_seq_ids FROM sources WHERE json_path = ? AND mtime_ns = ? AND size = ?',
+                (os.path.abspath(json_path), st.st_mtime_ns, st.st_size)
+            ).fetchone()
+        if not row or row['point_seq_ids'] is None:
+            return None
+        return json.loads(row['urls']), json.loads(row['point_seq_ids'])
+
+    def put_source(self, json_path: str, urls: List[str], point_seq_ids: List[int]):
+        st = os.stat(json_path)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO sources (json_path, mtime_ns, size, urls, point_seq_ids) VALUES (?, ?, ?, ?, ?)',
+                (os.path.abspath(json_path), st.st_mtime_ns, st.st_size,
+                 json.dumps(urls, ensure_ascii=False), json.dumps(point_seq_ids))
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+报告图片导出（按内容寻址，05 生成文档时使用）
+- 每张源图片只计算一次 sha256（按路径 + 修改时间 + 大小记在索引中，跨次运行复用）
+- 内容相同的图片只导出一份，Markdown / HTML / Excel / 精简版重复引用时直接复用已有文件
+- 默认优先使用 reflink（写时复制），文件系统不支持时完整复制
+- 硬链接需显式指定（link_mode='hardlink'）：导出文件与源图片共用同一份数据，修改任一方另一方也会变化
+- 索引保存在 {output_dir}/images/.export_index.json
+"""
+
+import os
+import json
+import shutil
+import threading
+from typing import Dict, Optional
+
+from checkpoint import write_json_atomic
+from download_manifest import file_sha256
+
+# ==================== 配置项 ====================
+IMAGES_DIR_NAME = 'images'
+INDEX_FILE_NAME = '.export_index.json'
+LINK_MODES = ('auto', 'reflink', 'hardlink', 'copy')  # auto: reflink -> 复制；hardlink 只在显式指定时使用
+
+FICLONE = 0x40049409  # Linux ioctl：克隆整个文件（btrfs / xfs 等支持 reflink 的文件系统）
+
+
+def reflink_file(src: str, dst: str):
+    """reflink 方式复制文件，不支持时抛出 OSError"""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError('当前平台不支持 reflink')
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def _format_bytes(size: int) -> str:
+    if size < 1024 * 1024:
+        return f'{size / 1024:.1f}KB'
+    return f'{size / 1024 / 1024:.1f}MB'
+
+
+class ImageExporter:
+    """
+    输出目录的图片导出器（线程安全）
+
+    Args:
+        output_dir: 输出目录，图片导出到 output_dir/images
+        link_mode: auto（reflink -> 复制）/ reflink / hardlink（显式指定才使用，导出文件与源图片共享数据）/ copy
+    """
+
+    def __init__(self, output_dir: str, link_mode: str = 'auto'):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f'未知的 link_mode: {link_mode}（可选 {", ".join(LINK_MODES)}）')
+        self.output_dir = output_dir
+        self.images_dir = os.path.join(output_dir, IMAGES_DIR_NAME)
+        self.index_path = os.path.join(self.images_dir, INDEX_FILE_NAME)
+        self.link_mode = link_mode
+        self._lock = threading.Lock()
+
+        # 索引：sha256 -> 导出文件名；源文件绝对路径 -> [修改时间, 大小, sha256]
+        self._files: Dict[str, str] = {}
+        self._sources: Dict[str, list] = {}
+        self._load_index()
+        self._exported: Dict[str, Optional[str]] = {}  # 本次运行：源文件绝对路径 -> 相对路径
+        self._dirty = False
+
+        # 可用的链接方式（失败一次后不再尝试）
+        self._can_reflink = link_mode in ('auto', 'reflink')
+        self._can_hardlink = link_mode == 'hardlink'
+
+        # 统计
+        self.reused = 0
+        self.reflinked = 0
+        self.hardlinked = 0
+        self.copied = 0
+        self.bytes_saved = 0
+        self.bytes_copied = 0
+
+    def _load_index(self):
+        if not os.path.isfile(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            self._files = index.get('files', {})
+            self._sources = index.get('sources', {})
+        except Exception as e:
+            print(f'[WARN] 读取图片导出索引失败 {self.index_path}: {e}')
+
+    def _source_digest(self, abs_path: str, st: os.stat_result) -> str:
+        """源文件 sha256（修改时间、大小未变时使用索引中的记录）"""
+        cached = self._sources.get(abs_path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        digest = file_sha256(abs_path)
+        self._sources[abs_path] = [st.st_mtime_ns, st.st_size, digest]
+        self._dirty = True
+        return digest
+
+    def _place(self, src: str, dst: str, size: int):
+        """reflink / 硬链接 / 复制，记录节省的字节数"""
+        if self._can_reflink:
+            try:
+                reflink_file(src, dst)
+                self.reflinked += 1
+                self.bytes_saved += size
+                return
+            except OSError:
+                if self.link_mode == 'reflink':
+                    print('[WARN] 文件系统不支持 reflink，改为复制')
+                self._can_reflink = False
+        if self._can_hardlink:
+            try:
+                os.link(src, dst)
+                self.hardlinked += 1
+                self.bytes_saved += size
+                return
+            except OSError:
+                # 跨文件系统或不支持硬链接
+                print('[WARN] 无法创建硬链接（可能跨文件系统），改为复制')
+                self._can_hardlink = False
+        shutil.copy2(src, dst)
+        self.copied += 1
+        self.bytes_copied += size
+
+    def _dest_name(self, filename: str, digest: str, size: int) -> str:
+        """导出文件名：默认沿用源文件名，同名但内容不同时加内容哈希后缀"""
+        dest_path = os.path.join(self.images_dir, filename)
+        if not os.path.exists(dest_path):
+            return filename
+        # 已有同名文件（如旧版本导出的），内容相同则直接采用
+        if os.path.getsize(dest_path) == size and file_sha256(dest_path) == digest:
+            return filename
+        base_name, ext = os.path.splitext(filename)
+        return f'{base_name}_{digest[:8]}{ext}'
+
+    def export(self, image_path: str) -> Optional[str]:
+        """
+        导出图片
+
+        Returns:
+            相对输出目录的路径（统一使用 / 分隔符），失败返回 None
+        """
+        abs_path = os.path.abspath(image_path)
+        with self._lock:
+            if abs_path in self._exported:
+                self.reused += 1
+                self.bytes_saved += self._sources.get(abs_path, [0, 0])[1]
+                return self._exported[abs_path]
+            try:
+                rel_path = self._export(abs_path)
+            except Exception as e:
+                print(f'[WARN] 复制图片失败 {image_path}: {e}')
+                rel_path = None
+            self._exported[abs_path] = rel_path
+            return rel_path
+
+    def _export(self, abs_path: str) -> Optional[str]:
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            return None
+        digest = self._source_digest(abs_path, st)
+
+        filename = self._files.get(digest)
+        if filename:
+            dest_path = os.path.join(self.images_dir, filename)
+            if os.path.isfile(dest_path) and os.path.getsize(dest_path) == st.st_size:
+                # 内容相同的图片已导出（本次或之前的运行）
+                self.reused += 1
+                self.bytes_saved += st.st_size
+                return f'{IMAGES_DIR_NAME}/{filename}'
+
+        os.makedirs(self.images_dir, exist_ok=True)
+        filename = self._dest_name(os.path.basename(abs_path), digest, st.st_size)
+        dest_path = os.path.join(self.images_dir, filename)
+        if os.path.exists(dest_path):
+            # 同名同内容的已有文件
+            self.reused += 1
+            self.bytes_saved += st.st_size
+        else:
+            self._place(abs_path, dest_path, st.st_size)
+        self._files[digest] = filename
+        self._dirty = True
+        return f'{IMAGES_DIR_NAME}/{filename}'
+
+    def save_index(self):
+        """保存索引（有变化时）"""
+        with self._lock:
+            if not self._dirty or not os.path.isdir(self.images_dir):
+                return
+            write_json_atomic({'files': self._files, 'sources': self._sources}, self.index_path)
+            self._dirty = False
+
+    def print_summary(self):
+        linked = self.reflinked + self.hardlinked
+        print(f'[INFO] 图片导出: 复用 {self.reused} 次，链接 {linked} 张（reflink {self.reflinked}，硬链接 {self.hardlinked}），'
+              f'复制 {self.copied} 张（{_format_bytes(self.bytes_copied)}），节省 {_format_bytes(self.bytes_saved)}')
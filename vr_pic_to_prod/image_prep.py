@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全景图片预处理：上传给模型前按最长边缩放、按目标质量重新压缩 JPEG，可选将多张图片拼成一张
+处理结果缓存在磁盘上（按源文件路径 + 修改时间 + 大小 + 处理参数寻址），重复运行直接读取；
+同一品牌内已编码的图片保存在内存 LRU 中，供商品分析和店铺分析共用
+"""
+
+import io
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image
+
+
+class ImagePrepConfig:
+    """
+    预处理参数
+
+    Args:
+        max_edge: 最长边上限（像素），0 表示不缩放
+        quality: JPEG 压缩质量（1-95），0 表示不重新压缩
+    """
+
+    def __init__(self, max_edge: int = 1600, quality: int = 85):
+        self.max_edge = max_edge
+        self.quality = quality
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_edge or self.quality)
+
+    def signature(self) -> str:
+        """参数签名（参与磁盘缓存键）"""
+        return f'edge{self.max_edge}_q{self.quality}'
+
+
+class ImagePreparer:
+    """
+    图片预处理器（线程安全）
+
+    Args:
+        config: 预处理参数
+        cache_dir: 处理结果的磁盘缓存目录，None 表示不缓存
+    """
+
+    def __init__(self, config: ImagePrepConfig, cache_dir: Optional[str] = None):
+        self.config = config
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self.images = 0
+        self.cache_hits = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+
+    def _cache_path(self, image_paths: List[str], tag: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        parts = [tag, self.config.signature()]
+        for path in image_paths:
+            st = os.stat(path)
+            parts.append(f'{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}')
+        digest = hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f'{digest}.jpg')
+
+    def _read_cache(self, cache_path: Optional[str]) -> Optional[bytes]:
+        if cache_path and os.path.isfile(cache_path):
+            with open(cache_path, 'rb') as f:
+                return f.read()
+        return None
+
+    def _write_cache(self, cache_path: Optional[str], data: bytes):
+        if not cache_path:
+            return
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f'{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, cache_path)
+
+    def _record(self, before: int, after: int, cache_hit: bool):
+        with self._lock:
+            self.images += 1
+            self.bytes_before += before
+            self.bytes_after += after
+            if cache_hit:
+                self.cache_hits += 1
+
+    def _encode(self, img: Image.Image, max_edge: int) -> bytes:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        if max_edge and max(img.size) > max_edge:
+            img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, 'JPEG', quality=self.config.quality or 95, optimize=True)
+        return buf.getvalue()
+
+    def prepare(self, image_path: str) -> bytes:
+        """
+        返回预处理后的 JPEG 字节（未启用预处理或处理后反而更大时返回原始字节）
+        """
+        before = os.path.getsize(image_path)
+        if not self.config.enabled:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+            self._record(before, len(data), False)
+            return data
+
+        cache_path = self._cache_path([image_path], 'single')
+        data = self._read_cache(cache_path)
+        if data is not None:
+            self._record(before, len(data), True)
+            return data
+
+        with Image.open(image_path) as img:
+            data = self._encode(img, self.config.max_edge)
+        if len(data) >= before:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+
+        self._write_cache(cache_path, data)
+        self._record(before, len(data), False)
+        print(f'[DEBUG] 图片预处理 {os.path.basename(image_path)}: {before / 1024:.0f} KB -> {len(data) / 1024:.0f} KB')
+        return data
+
+    def tile(self, image_paths: List[str], cols: int = 2) -> bytes:
+        """
+        将多张图片按 cols 列拼成一张（从左到右、从上到下），拼图最长边不超过 max_edge
+
+        Returns:
+            拼图的 JPEG 字节
+        """
+        before = sum(os.path.getsize(p) for p in image_paths)
+        cache_path = self._cache_path(image_paths, f'tile{cols}')
+        data = self._read_cache(cache_path)
+        if data is not None:
+            self._record(before, len(data), True)
+            return data
+
+        cols = max(1, min(cols, len(image_paths)))
+        rows = (len(image_paths) + cols - 1) // cols
+        cell = (self.config.max_edge or 1600) // cols
+
+        mosaic = Image.new('RGB', (cell * cols, cell * rows), (0, 0, 0))
+        for idx, path in enumerate(image_paths):
+            with Image.open(path) as img:
+                img = img.convert('RGB')
+                img.thumbnail((cell, cell), Image.Resampling.LANCZOS)
+                x = (idx % cols) * cell + (cell - img.width) // 2
+                y = (idx // cols) * cell + (cell - img.height) // 2
+                mosaic.paste(img, (x, y))
+
+        data = self._encode(mosaic, 0)
+        self._write_cache(cache_path, data)
+        self._record(before, len(data), False)
+        print(f'[DEBUG] 拼图 {len(image_paths)} 张（{cols} 列 x {rows} 行）: {before / 1024:.0f} KB -> {len(data) / 1024:.0f} KB')
+        return data
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'images': self.images,
+                'cache_hits': self.cache_hits,
+                'bytes_before': self.bytes_before,
+                'bytes_after': self.bytes_after,
+                'ratio': round(self.bytes_after / self.bytes_before, 3) if self.bytes_before else 1.0
+            }
+
+    def print_summary(self):
+        s = self.stats()
+        if not s['images']:
+            return
+        print('[INFO] 图片预处理统计:')
+        print(f'  - 图片数: {s["images"]}（磁盘缓存命中 {s["cache_hits"]}）')
+        print(f'  - 处理前: {s["bytes_before"] / 1024 / 1024:.2f} MB')
+        print(f'  - 处理后: {s["bytes_after"] / 1024 / 1024:.2f} MB（{s["ratio"]:.1%}）')
+
+
+class EncodedImageStore:
+    """
+    单个品牌内的已编码图片存储（LRU，按 base64 字符串大小限制内存，线程安全）
+    商品分析和店铺分析从同一个存储取图，重叠点位的图片只读取、编码一次；
+    同一张图片被多个线程同时请求时只有一个线程执行编码，其余线程等待结果
+
+    Args:
+        max_mb: 内存上限（MB），超出时淘汰最久未使用的图片，0 表示不缓存
+    """
+
+    def __init__(self, max_mb: float = 256):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._items: 'OrderedDict[str, str]' = OrderedDict()
+        self._pending: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, image_path: str) -> Optional[str]:
+        value = self._items.get(image_path)
+        if value is not None:
+            self._items.move_to_end(image_path)
+            self.hits += 1
+        return value
+
+    def _insert(self, image_path: str, value: str):
+        if len(value) > self.max_bytes:
+            return
+        self._items[image_path] = value
+        self.total_bytes += len(value)
+        while self.total_bytes > self.max_bytes:
+            _, old = self._items.popitem(last=False)
+            self.total_bytes -= len(old)
+
+    def get(self, image_path: str, encoder: Callable[[str], Optional[str]]) -> Optional[str]:
+        """
+        返回图片的 base64 编码，未命中时调用 encoder(image_path) 编码并存入
+
+        Args:
+            image_path: 图片路径
+            encoder: 编码函数，失败返回 None（失败结果不缓存）
+        """
+        with self._lock:
+            value = self._lookup(image_path)
+            if value is not None:
+                return value
+            key_lock = self._pending.setdefault(image_path, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                value = self._lookup(image_path)
+                if value is not None:
+                    return value
+            value = encoder(image_path)
+            with self._lock:
+                self.misses += 1
+                if value is not None:
+                    self._insert(image_path, value)
+                self._pending.pop(image_path, None)
+        return value
+
+    def clear(self):
+        """释放所有已编码图片（品牌处理完成后调用）"""
+        with self._lock:
+            self._items.clear()
+            self.total_bytes = 0
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线指标（03 模型分析）：每次模型请求（点位商品分析 / 店铺分析）记录一条指标，运行结束时汇总
+- 每条记录包含品牌、点位、任务类型、状态，以及各阶段耗时和用量：
+  图片编码、请求体字节数、建连、首字节（TTFB）、模型调用总耗时、prompt / completion tokens、JSON 解析、重试次数
+- 输出 JSONL（每次请求追加一行，结束时追加一行汇总）或 Prometheus 文本格式（结束时写出）
+- 汇总各阶段 p50 / p95 / p99 和各品牌的 token、费用，用于判断瓶颈在网络、模型还是本地处理
+"""
+
+import os
+import json
+import time
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+# 阶段字段 -> 说明（汇总和 Prometheus 输出按此顺序）
+STAGE_FIELDS = {
+    'encode_ms': '图片编码 (ms)',
+    'request_bytes': '请求体 (字节)',
+    'setup_ms': '建连 (ms)',
+    'ttfb_ms': '首字节 (ms)',
+    'latency_ms': '模型调用 (ms)',
+    'prompt_tokens': 'prompt tokens',
+    'completion_tokens': 'completion tokens',
+    'parse_ms': 'JSON 解析 (ms)',
+    'retries': '重试次数'
+}
+QUANTILES = (50, 95, 99)
+FORMATS = ('jsonl', 'prometheus')
+PROMETHEUS_PREFIX = 'vr_pipeline'
+
+# 请求状态
+STATUS_OK = 'ok'
+STATUS_CACHE_HIT = 'cache_hit'  # 命中结果缓存，未调用模型
+STATUS_PARSE_ERROR = 'parse_error'  # 调用成功，JSON 解析失败
+STATUS_FAILED = 'failed'  # 调用失败（重试耗尽或不可重试错误）
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """线性插值的分位数（q 取 0-100），没有数据时返回 None"""
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+
+
+def _prometheus_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value: Optional[float]) -> str:
+    return '-' if value is None else f'{value:,.1f}'
+
+
+class PipelineMetrics:
+    """
+    模型请求指标记录器（线程安全，线程池引擎和异步引擎共用）
+
+    用法：
+        metrics = PipelineMetrics('metrics.jsonl', price_input_per_m=0.8, price_output_per_m=8)
+        metric = metrics.start('PRADA', 'point', seq_id=3, panorama_id=1001)
+        metric['encode_ms'] = 12.5
+        ...
+        metrics.record(metric)
+        metrics.print_summary()
+        metrics.close()
+
+    Args:
+        output_file: 指标输出文件，None 表示只在内存中汇总
+        fmt: 输出格式，jsonl 或 prometheus
+        price_input_per_m: 输入单价（元 / 百万 tokens）
+        price_output_per_m: 输出单价（元 / 百万 tokens）
+    """
+
+    def __init__(
+        self,
+        output_file: Optional[str] = None,
+        fmt: str = 'jsonl',
+        price_input_per_m: float = 0.0,
+        price_output_per_m: float = 0.0
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f'不支持的指标格式: {fmt}（可选 {", ".join(FORMATS)}）')
+        self.output_file = output_file
+        self.format = fmt
+        self.price_input_per_m = price_input_per_m
+        self.price_output_per_m = price_output_per_m
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+        self._file = None
+        self._closed = False
+
+    def _open_jsonl(self):
+        """第一次写入时再创建文件（没有请求的运行不留下空文件）"""
+        if self._file is None:
+            output_dir = os.path.dirname(self.output_file)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            self._file = open(self.output_file, 'w', encoding='utf-8')
+        return self._file
+
+    def start(
+        self,
+        brand: str,
+        kind: str,
+        seq_id: Optional[int] = None,
+        panorama_id: Optional[int] = None
+    ) -> Dict:
+        """
+        新建一条请求记录，调用方填写各阶段字段后交给 record
+
+        Args:
+            brand: 品牌名
+            kind: 任务类型，point（点位商品分析）或 store（店铺分析）
+        """
+        metric = {
+            'time': round(time.time(), 3),
+            'brand': brand,
+            'kind': kind,
+            'seq_id': seq_id,
+            'panorama_id': panorama_id,
+            'status': STATUS_OK,
+            'images': 0
+        }
+        metric.update((field, None) for field in STAGE_FIELDS)
+        metric['retries'] = 0
+        return metric
+
+    def cost(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> float:
+        """按实际 token 用量计算费用（元）"""
+        return ((prompt_tokens or 0) * self.price_input_per_m + (completion_tokens or 0) * self.price_output_per_m) / 1_000_000
+
+    def record(self, metric: Dict):
+        """记录一次请求（JSONL 格式时立即追加到文件）"""
+        metric['cost'] = round(self.cost(metric.get('prompt_tokens'), metric.get('completion_tokens')), 6)
+        with self._lock:
+            self.records.append(metric)
+            if self.output_file and self.format == 'jsonl' and not self._closed:
+                f = self._open_jsonl()
+                f.write(json.dumps(metric, ensure_ascii=False) + '\n')
+                f.flush()
+
+    def summary(self) -> Dict:
+        """
+        汇总所有请求
+
+        Returns:
+            {
+                'requests', 'cache_hits', 'parse_errors', 'failed', 'cost',
+                'stages': {字段: {'count', 'sum', 'p50', 'p95', 'p99'}},
+                'brands': {品牌: {'requests', 'cache_hits', 'failed', 'retries', 'prompt_tokens', 'completion_tokens', 'request_bytes', 'latency_ms', 'cost'}}
+            }
+        """
+        with self._lock:
+            records = list(self.records)
+
+        stages = {}
+        for field in STAGE_FIELDS:
+            values = [r[field] for r in records if r.get(field) is not None]
+            stages[field] = {'count': len(values), 'sum': round(sum(values), 1)}
+            for q in QUANTILES:
+                value = percentile(values, q)
+                stages[field][f'p{q}'] = round(value, 1) if value is not None else None
+
+        brands: Dict[str, Dict] = defaultdict(lambda: {
+            'requests': 0, 'cache_hits': 0, 'failed': 0, 'retries': 0,
+            'prompt_tokens': 0, 'completion_tokens': 0, 'request_bytes': 0,
+            'latency_ms': 0.0, 'cost': 0.0
+        })
+        for r in records:
+            brand = brands[r['brand']]
+            brand['requests'] += 1
+            brand['cache_hits'] += r['status'] == STATUS_CACHE_HIT
+            brand['failed'] += r['status'] == STATUS_FAILED
+            for field in ('retries', 'prompt_tokens', 'completion_tokens', 'request_bytes', 'latency_ms', 'cost'):
+                brand[field] += r.get(field) or 0
+        for brand in brands.values():
+            brand['latency_ms'] = round(brand['latency_ms'], 1)
+            brand['cost'] = round(brand['cost'], 6)
+
+        return {
+            'requests': len(records),
+            'cache_hits': sum(r['status'] == STATUS_CACHE_HIT for r in records),
+            'parse_errors': sum(r['status'] == STATUS_PARSE_ERROR for r in records),
+            'failed': sum(r['status'] == STATUS_FAILED for r in records),
+            'cost': round(sum(r['cost'] for r in records), 6),
+            'stages': stages,
+            'brands': dict(sorted(brands.items()))
+        }
+
+    def prometheus_text(self, summary: Optional[Dict] = None) -> str:
+        """Prometheus 文本格式：各阶段 summary（分位数）+ 各品牌计数器"""
+        summary = summary or self.summary()
+        prefix = PROMETHEUS_PREFIX
+        lines = [
+            f'# HELP {prefix}_stage 03 模型请求各阶段的耗时（ms）和用量分布',
+            f'# TYPE {prefix}_stage summary'
+        ]
+        for field, stats in summary['stages'].items():
+            for q in QUANTILES:
+                if stats[f'p{q}'] is not None:
+                    lines.append(f'{prefix}_stage{{stage="{field}",quantile="{q / 100}"}} {stats[f"p{q}"]}')
+            lines.append(f'{prefix}_stage_sum{{stage="{field}"}} {stats["sum"]}')
+            lines.append(f'{prefix}_stage_count{{stage="{field}"}} {stats["count"]}')
+
+        counters = [
+            ('requests', '请求数（含命中缓存）'),
+            ('cache_hits', '命中结果缓存的请求数'),
+            ('failed', '失败的请求数'),
+            ('retries', '重试次数'),
+            ('prompt_tokens', 'prompt tokens'),
+            ('completion_tokens', 'completion tokens'),
+            ('request_bytes', '请求体字节数'),
+            ('cost', '费用（元）')
+        ]
+        for name, help_text in counters:
+            lines.append(f'# HELP {prefix}_{name}_total {help_text}')
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            for brand, stats in summary['brands'].items():
+                lines.append(f'{prefix}_{name}_total{{brand="{_prometheus_label(brand)}"}} {stats[name]}')
+        return '\n'.join(lines) + '\n'
+
+    def print_summary(self):
+        s = self.summary()
+        if not s['requests']:
+            return
+        stages = s['stages']
+        print(f'[INFO] 请求指标: {s["requests"]} 次请求，命中缓存 {s["cache_hits"]} 次，JSON 解析失败 {s["parse_errors"]} 次，失败 {s["failed"]} 次')
+        print(f'  {"阶段":<20}{"次数":>8}{"p50":>12}{"p95":>12}{"p99":>12}')
+        for field, label in STAGE_FIELDS.items():
+            stats = stages[field]
+            if not stats['count']:
+                continue
+            print(f'  {label:<20}{stats["count"]:>8}' + ''.join(f'{_format_number(stats[f"p{q}"]):>12}' for q in QUANTILES))
+
+        # 本地处理（编码 + 解析）与模型调用（其中首字节前为网络和排队 + 模型生成）的总耗时占比
+        local_ms = stages['encode_ms']['sum'] + stages['parse_ms']['sum']
+        total_ms = local_ms + stages['latency_ms']['sum']
+        if total_ms:
+            print(
+                f'  - 耗时占比: 图片编码 {stages["encode_ms"]["sum"] / total_ms:.0%}，'
+                f'模型调用 {stages["latency_ms"]["sum"] / total_ms:.0%}'
+                f'（建连 {stages["setup_ms"]["sum"] / total_ms:.0%}，首字节前 {stages["ttfb_ms"]["sum"] / total_ms:.0%}），'
+                f'JSON 解析 {stages["parse_ms"]["sum"] / total_ms:.0%}'
+            )
+
+        print(f'  - 各品牌费用（输入 {self.price_input_per_m} 元/百万 tokens，输出 {self.price_output_per_m} 元/百万 tokens）:')
+        for brand, stats in s['brands'].items():
+            print(
+                f'    {brand}: 请求 {stats["requests"]}（缓存 {stats["cache_hits"]}，失败 {stats["failed"]}，重试 {stats["retries"]}），'
+                f'tokens {stats["prompt_tokens"]:,} / {stats["completion_tokens"]:,}，费用 {stats["cost"]:.4f} 元'
+            )
+        print(f'  - 合计费用: {s["cost"]:.4f} 元')
+
+    def close(self):
+        """写出汇总（JSONL 追加汇总行，Prometheus 写出全部指标）并关闭文件"""
+        if not self.output_file or self._closed or not self.records:
+            return
+        summary = self.summary()
+        with self._lock:
+            self._closed = True
+            if self.format == 'jsonl':
+                f = self._open_jsonl()
+                f.write(json.dumps({'summary': summary}, ensure_ascii=False) + '\n')
+                f.close()
+                self._file = None
+            else:
+                output_dir = os.path.dirname(self.output_file)
+                if output_dir:
+                    os.makedirs(output_dir, exist_ok=True)
+                tmp_file = f'{self.output_file}.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write(self.prometheus_text(summary))
+                os.replace(tmp_file, self.output_file)
+        print(f'[INFO] 请求指标已保存: {self.output_file}')
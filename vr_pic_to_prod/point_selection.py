@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析点位与图片方向的选择规则（03 分析和 02 按计划下载共用）
+- 商品分析：选中点位的 f/b/l/r 四个方向
+- 店铺分析：选中点位的 f 方向
+- d（向下）、t（向上）方向不参与分析
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# ==================== 配置项 ====================
+ANALYSIS_DIRECTIONS = ('f', 'b', 'l', 'r')  # 商品分析使用的方向
+STORE_DIRECTION = 'f'  # 店铺分析使用的方向
+SKIPPED_DIRECTIONS = ('d', 't')  # 不参与分析的方向
+
+DEFAULT_MAX_PRODUCT_POINTS = 10
+DEFAULT_MAX_STORE_POINTS = 10
+
+
+def parse_image_name(filename: str) -> Optional[Tuple[str, int, str]]:
+    """
+    解析全景图片文件名 {uuid}_{index}_{direction}.jpg
+
+    Returns:
+        (分组键 uuid_index, 点位编号, 方向)，格式不符时返回 None
+    """
+    if not filename.lower().endswith('.jpg'):
+        return None
+    parts = os.path.basename(filename).rsplit('_', 2)
+    if len(parts) != 3:
+        return None
+    uuid_part, index_part, direction_part = parts
+    try:
+        seq_id = int(index_part)
+    except ValueError:
+        return None
+    direction = direction_part[:-4]
+    return f'{uuid_part}_{index_part}', seq_id, direction
+
+
+def candidate_seq_ids(coordinates: Iterable[int], image_seq_ids: Iterable[int]) -> List[int]:
+    """
+    参与抽样的全部点位：JSON 中有坐标的点位 + 有图片的点位
+    以 JSON 为准（而不是只看已下载的图片），按计划只下载部分点位后再分析时选出的点位不变
+    """
+    return sorted(set(coordinates) | set(image_seq_ids))
+
+
+def select_sample_points(
+    all_seq_ids: List[int],
+    max_points: Optional[int] = None,
+    verbose: bool = True
+) -> List[int]:
+    """
+    从所有点位中选择样本点，排除首尾各 总数/5 个点，从中间均匀分布选择
+
+    Args:
+        all_seq_ids: 所有点位的 seq_id 列表（已排序）
+        max_points: 最大选择数量，None 表示不限制（选择所有中间点）
+        verbose: 是否打印选择详情
+
+    Returns:
+        选中的 seq_id 列表
+    """
+    total_count = len(all_seq_ids)
+
+    # 如果没有限制，或者点位数很少，进行首尾去除后全部选择
+    if max_points is None or total_count <= (max_points if max_points else 0):
+        # 即使不限制数量，也要去除首尾
+        if total_count <= 5:
+            # 点位数太少，全部返回
+            return all_seq_ids
+
+    # 计算首尾各去除多少个点（总数 / 5，向下取整）
+    trim_count = total_count // 5
+
+    # 确保去除后至少还有一些点可选
+    if trim_count * 2 >= total_count:
+        # 如果去除的太多，只去除首尾各1个
+        trim_count = 1
+
+    # 去掉首尾，从中间选择
+    start_index = trim_count
+    end_index = total_count - trim_count
+    middle_points = all_seq_ids[start_index:end_index]
+
+    if verbose:
+        print(f'[DEBUG] 总点位 {total_count} 个，去除首部 {trim_count} 个、尾部 {trim_count} 个，剩余 {len(middle_points)} 个')
+
+    # 如果没有限制，返回所有中间点位
+    if max_points is None:
+        if verbose:
+            print(f'[DEBUG] 不限制点位数量，使用所有 {len(middle_points)} 个中间点位')
+        return middle_points
+
+    if len(middle_points) <= max_points:
+        # 中间点位数不超过最大值，全部选择
+        return middle_points
+
+    # 均匀分布选择
+    step = (len(middle_points) - 1) / (max_points - 1)
+    selected_indices = [int(round(i * step)) for i in range(max_points)]
+    selected_seq_ids = [middle_points[i] for i in selected_indices]
+
+    return selected_seq_ids
+
+
+def select_analysis_points(
+    all_seq_ids: List[int],
+    vr_loc_list: Optional[List[int]] = None,
+    max_product_points: int = DEFAULT_MAX_PRODUCT_POINTS,
+    max_store_points: int = DEFAULT_MAX_STORE_POINTS,
+    verbose: bool = True
+) -> Tuple[List[int], List[int], List[int]]:
+    """
+    应用 vr_loc_list 筛选，并分别选择商品分析和店铺分析的点位
+
+    Returns:
+        (筛选后的全部点位, 商品分析点位, 店铺分析点位)
+    """
+    if vr_loc_list is not None:
+        all_seq_ids = [sid for sid in all_seq_ids if sid in vr_loc_list]
+    product_seq_ids = select_sample_points(all_seq_ids, max_points=max_product_points, verbose=verbose)
+    store_seq_ids = select_sample_points(all_seq_ids, max_points=max_store_points, verbose=verbose)
+    return all_seq_ids, product_seq_ids, store_seq_ids
+
+
+def plan_required_faces(
+    all_seq_ids: List[int],
+    vr_loc_list: Optional[List[int]] = None,
+    max_product_points: int = DEFAULT_MAX_PRODUCT_POINTS,
+    max_store_points: int = DEFAULT_MAX_STORE_POINTS
+) -> Dict[int, Set[str]]:
+    """
+    分析实际会用到的图片：{seq_id: {方向, ...}}
+
+    Args:
+        all_seq_ids: 参与抽样的全部点位（见 candidate_seq_ids）
+    """
+    _, product_seq_ids, store_seq_ids = select_analysis_points(
+        all_seq_ids, vr_loc_list, max_product_points, max_store_points, verbose=False
+    )
+    faces: Dict[int, Set[str]] = {}
+    for seq_id in product_seq_ids:
+        faces.setdefault(seq_id, set()).update(ANALYSIS_DIRECTIONS)
+    for seq_id in store_seq_ids:
+        faces.setdefault(seq_id, set()).add(STORE_DIRECTION)
+    return faces
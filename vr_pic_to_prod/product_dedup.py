@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨点位商品去重
+同一货架上的商品常在相邻几个点位中被重复识别。按 py_position_3d 的空间距离（网格索引查找邻近商品，
+不做全量两两比较）加上名称/类型/颜色的相似度聚类，每个聚类只保留视角最好的一条
+"""
+
+import re
+import unicodedata
+from functools import partial
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from spatial_index import GridIndex
+
+# ==================== 配置项 ====================
+DEDUP_RADIUS = 1.0  # 两条商品记录的 3D 坐标距离不超过该值（米）才可能是同一商品
+DEDUP_MIN_SIMILARITY = 0.6  # 名称/类型/颜色综合相似度阈值（0-1）
+DEDUP_VERSION = 2  # 去重规则变化时递增，已缓存的去重结果失效
+
+# 综合相似度中各字段的权重
+NAME_WEIGHT = 0.6
+TYPE_WEIGHT = 0.2
+COLOR_WEIGHT = 0.2
+
+_PUNCT_RE = re.compile(r'[\s\W_]+', re.UNICODE)
+
+
+def normalize_text(text) -> str:
+    """全角转半角、转小写、去掉空白和标点"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', str(text)).lower()
+    return _PUNCT_RE.sub('', text)
+
+
+def _bigrams(text: str) -> Set[str]:
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> Optional[float]:
+    """两个集合的 Jaccard 相似度，都为空时返回 None（该字段不参与比较）"""
+    if not a and not b:
+        return None
+    return len(a & b) / len(a | b)
+
+
+class _ProductKey:
+    """参与比较的商品特征（预先归一化，避免每次比较重复处理）"""
+
+    __slots__ = ('name', 'type', 'colors')
+
+    def __init__(self, product: Dict):
+        self.name = _bigrams(normalize_text(product.get('name')))
+        self.type = _bigrams(normalize_text(product.get('type')))
+        colors = product.get('colors') or []
+        if isinstance(colors, str):
+            colors = [colors]
+        self.colors = {normalize_text(c) for c in colors if normalize_text(c)}
+
+
+def product_similarity(a: _ProductKey, b: _ProductKey) -> float:
+    """
+    名称（字符二元组）、类型、颜色集合的加权 Jaccard 相似度
+    某个字段两边都为空时不参与计算，权重按剩余字段重新归一
+    """
+    total = 0.0
+    weight = 0.0
+    for score, w in (
+        (_jaccard(a.name, b.name), NAME_WEIGHT),
+        (_jaccard(a.type, b.type), TYPE_WEIGHT),
+        (_jaccard(a.colors, b.colors), COLOR_WEIGHT)
+    ):
+        if score is None:
+            continue
+        total += score * w
+        weight += w
+    return total / weight if weight else 0.0
+
+
+def view_score(product: Dict) -> Tuple[int, int, float]:
+    """
+    商品记录的视角评分，越大越好：
+    推荐商品优先（VR 链接只为推荐商品生成）> 有 position_3d > bbox 面积大且靠近画面中心
+    """
+    bbox = product.get('bbox') or {}
+    try:
+        width = max(0.0, float(bbox.get('x_max', 0)) - float(bbox.get('x_min', 0)))
+        height = max(0.0, float(bbox.get('y_max', 0)) - float(bbox.get('y_min', 0)))
+        center_x = (float(bbox.get('x_min', 0)) + float(bbox.get('x_max', 0))) / 2
+        center_y = (float(bbox.get('y_min', 0)) + float(bbox.get('y_max', 0))) / 2
+    except (TypeError, ValueError, AttributeError):
+        width = height = 0.0
+        center_x = center_y = 0.5
+    off_center = max(abs(center_x - 0.5), abs(center_y - 0.5)) * 2  # 0 为中心，1 为边缘
+    return (
+        1 if product.get('is_recommended') else 0,
+        1 if product.get('position_3d') else 0,
+        width * height * (1 - min(off_center, 1.0))
+    )
+
+
+class _UnionFind:
+    """
+    并查集，每个元素属于一个点位；两个聚类包含同一点位时不合并
+    （同一点位的两条记录是画面中的不同商品，不能经由其他点位的记录间接合并到一起）
+    """
+
+    def __init__(self, groups: List[int]):
+        self.parent = list(range(len(groups)))
+        self.groups = [{group} for group in groups]  # 根 -> 聚类包含的点位
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> bool:
+        """合并 i、j 所在的聚类，两个聚类有相同点位时不合并并返回 False"""
+        ri, rj = self.find(i), self.find(j)
+        if ri == rj:
+            return True
+        if not self.groups[ri].isdisjoint(self.groups[rj]):
+            return False
+        root, child = min(ri, rj), max(ri, rj)
+        self.parent[child] = root
+        self.groups[root] |= self.groups[child]
+        self.groups[child] = set()
+        return True
+
+
+def deduplicate_brand(
+    brand_result: Dict,
+    radius: float = DEDUP_RADIUS,
+    min_similarity: float = DEDUP_MIN_SIMILARITY
+) -> Tuple[Dict, int]:
+    """
+    对单个品牌的商品去重（每个聚类中每个点位最多一条记录；没有 py_position_3d 的记录原样保留）
+
+    Args:
+        brand_result: 03 输出的品牌分析结果
+        radius: 空间距离阈值（米）
+        min_similarity: 名称/类型/颜色综合相似度阈值
+
+    Returns:
+        (去重后的品牌结果（新对象，不修改输入）, 去掉的重复记录数)
+        保留的记录增加 duplicate_count（合并的重复记录数）和 duplicate_panorama_ids（重复出现的点位）
+    """
+    product_results = brand_result.get('product_results', [])
+
+    # 展开所有有 3D 坐标的商品：(点位下标, 商品下标)
+    entries: List[Tuple[int, int]] = []
+    index = GridIndex(cell_size=max(radius, 1e-6))
+    for point_idx, point in enumerate(product_results):
+        for product_idx, product in enumerate(point.get('products', [])):
+            pos = product.get('py_position_3d')
+            if not isinstance(pos, dict):
+                continue
+            index.add(len(entries), (pos.get('x', 0), pos.get('y', 0), pos.get('z', 0)))
+            entries.append((point_idx, product_idx))
+
+    if len(entries) < 2:
+        return brand_result, 0
+
+    keys = [_ProductKey(product_results[p]['products'][q]) for p, q in entries]
+    candidates: List[Tuple[float, float, int, int]] = []
+    for i, (point_idx, _) in enumerate(entries):
+        for j, distance in index.query_radius(index.point(i), radius):
+            if j <= i or entries[j][0] == point_idx:
+                continue
+            similarity = product_similarity(keys[i], keys[j])
+            if similarity >= min_similarity:
+                candidates.append((-similarity, distance, i, j))
+
+    # 相似度高、距离近的先合并；每个聚类中每个点位最多一条记录
+    candidates.sort()
+    uf = _UnionFind([point_idx for point_idx, _ in entries])
+    for _, _, i, j in candidates:
+        uf.union(i, j)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(entries)):
+        clusters.setdefault(uf.find(i), []).append(i)
+
+    # 每个聚类保留视角评分最高的一条，其余标记为删除
+    removed: Set[Tuple[int, int]] = set()
+    annotations: Dict[Tuple[int, int], Dict] = {}
+    for members in clusters.values():
+        if len(members) == 1:
+            continue
+
+        def score(i: int):
+            p, q = entries[i]
+            return view_score(product_results[p]['products'][q])
+
+        best = max(members, key=score)
+        others = [entries[i] for i in members if i != best]
+        removed.update(others)
+        annotations[entries[best]] = {
+            'duplicate_count': len(others),
+            'duplicate_panorama_ids': [product_results[p].get('panorama_id') for p, _ in others]
+        }
+
+    new_points = []
+    for point_idx, point in enumerate(product_results):
+        kept = []
+        for product_idx, product in enumerate(point.get('products', [])):
+            key = (point_idx, product_idx)
+            if key in removed:
+                continue
+            if key in annotations:
+                product = {**product, **annotations[key]}
+            kept.append(product)
+        new_points.append({**point, 'products': kept})
+
+    return {**brand_result, 'product_results': new_points}, len(removed)
+
+
+def deduplicate_brand_result(
+    brand_result: Dict,
+    radius: float = DEDUP_RADIUS,
+    min_similarity: float = DEDUP_MIN_SIMILARITY
+) -> Dict:
+    """对单个品牌去重，只返回去重后的结果（用作 AnalysisResultSet 的 transform）"""
+    new_result, removed = deduplicate_brand(brand_result, radius, min_similarity)
+    if removed:
+        print(f'[INFO] {brand_result.get("brand", "")}: 合并重复商品 {removed} 条')
+    return new_result
+
+
+def dedup_transform(
+    radius: float = DEDUP_RADIUS,
+    min_similarity: float = DEDUP_MIN_SIMILARITY
+) -> Tuple[Callable[[Dict], Dict], str]:
+    """
+    按品牌逐个去重的变换及其缓存标识，用于 AnalysisResultSet(transform=..., transform_key=...)
+    去重结果随解析结果一起缓存，重复生成报告时不再重新去重
+    """
+    return (
+        partial(deduplicate_brand_result, radius=radius, min_similarity=min_similarity),
+        f'dedup:v{DEDUP_VERSION}:{radius}:{min_similarity}'
+    )
+
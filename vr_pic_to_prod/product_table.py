@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+商品列式表：把 {brand}_analysis.json 中嵌套的 product_results[*].products[*] 展开为一行一个商品的表，
+按品牌分区写出 Parquet 或 Arrow IPC（{output_dir}/brand={品牌}/part-0.parquet），
+04、05 和临时分析可以直接用 pandas 按品牌 / 是否推荐等条件读取，不必逐个解析 JSON
+- 增量导出：分析结果文件的修改时间和大小未变化的品牌不再重写（记录在 {output_dir}/_manifest.json）
+- 依赖 pyarrow（可选依赖 parquet：pip install -e .[parquet]，未安装时调用导出 / 读取会提示安装）
+python product_table.py [--analysis_dir analysis_results] [--output_dir product_table] [--format parquet]
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+from urllib.parse import quote
+from typing import Dict, Iterable, List, Optional
+
+from checkpoint import write_json_atomic
+from product_dedup import dedup_transform, DEDUP_RADIUS, DEDUP_MIN_SIMILARITY
+from result_loader import AnalysisResultSet
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖
+    pa = ds = pq = None
+
+# ==================== 配置项 ====================
+DEFAULT_ANALYSIS_DIR = os.path.join(
+    os.path.dirname(__file__),
+    'analysis_results'
+)
+
+DEFAULT_TABLE_DIR = os.path.join(
+    os.path.dirname(__file__),
+    'product_table'
+)
+
+TABLE_FORMATS = ('parquet', 'arrow')
+FILE_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+MANIFEST_NAME = '_manifest.json'  # 以 _ 开头，读取数据集时会被忽略
+TABLE_VERSION = 1  # 表结构变化时递增，旧的导出全部重写
+UNSAFE_PATH_CHARS = '%/\\:=*?"<>|'  # 分区目录名中需要编码的字符
+
+# 列（brand 为分区列，不写入分区内的文件）
+COLUMNS = [
+    ('panorama_id', 'int64'),
+    ('seq_id', 'int64'),
+    ('point_index', 'int32'),  # 点位在 product_results 中的序号
+    ('product_index', 'int32'),  # 商品在点位 products 中的序号
+    ('name', 'string'),
+    ('type', 'string'),
+    ('colors', 'list<string>'),
+    ('materials', 'list<string>'),
+    ('location', 'string'),
+    ('view_direction', 'string'),
+    ('is_recommended', 'bool'),
+    ('bbox_x_min', 'float64'),
+    ('bbox_y_min', 'float64'),
+    ('bbox_x_max', 'float64'),
+    ('bbox_y_max', 'float64'),
+    ('has_position_3d', 'bool'),
+    ('position_x', 'float64'),  # position_3d（模型给出的相对点位的方向）
+    ('position_y', 'float64'),
+    ('position_z', 'float64'),
+    ('py_position_x', 'float64'),  # py_position_3d（按 bbox 计算的绝对坐标）
+    ('py_position_y', 'float64'),
+    ('py_position_z', 'float64'),
+    ('source_image', 'string'),  # 商品所在视角的点位图片
+]
+
+
+def require_pyarrow():
+    """未安装 pyarrow 时抛出 ImportError"""
+    if pa is None:
+        raise ImportError('商品列式表需要 pyarrow，请先安装：pip install pyarrow（或 pip install -e .[parquet]）')
+
+
+def _arrow_schema() -> 'pa.Schema':
+    types = {
+        'int32': pa.int32(),
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'bool': pa.bool_(),
+        'string': pa.string(),
+        'list<string>': pa.list_(pa.string()),
+    }
+    return pa.schema([(name, types[type_name]) for name, type_name in COLUMNS])
+
+
+def _partitioning() -> 'ds.Partitioning':
+    return ds.partitioning(pa.schema([('brand', pa.string())]), flavor='hive')
+
+
+def _to_float(value) -> Optional[float]:
+    if value is None or value.__class__ is float:
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_str_list(value) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(v) for v in value]
+
+
+def _as_dict(value) -> Dict:
+    """模型输出的 bbox / position_3d 可能不是对象（如列表、字符串），此时按缺失处理"""
+    return value if isinstance(value, dict) else {}
+
+
+def _source_image(images: List[str], view_direction: str) -> Optional[str]:
+    """视角对应的图片（文件名以 _{方向}.jpg 结尾）"""
+    if not view_direction:
+        return None
+    suffix = f'_{view_direction}.jpg'
+    for img_path in images:
+        if img_path.endswith(suffix):
+            return img_path
+    return None
+
+
+def flatten_brand_result(brand_result: Dict) -> Dict[str, list]:
+    """
+    把一个品牌的分析结果展开为列（不含 brand 列）
+
+    Returns:
+        {列名: 值列表}
+    """
+    columns: Dict[str, list] = {name: [] for name, _ in COLUMNS}
+    # 逐列追加（避免每个商品构造中间行对象）
+    append = {name: values.append for name, values in columns.items()}
+    bbox_appends = [(key, append[f'bbox_{key}']) for key in ('x_min', 'y_min', 'x_max', 'y_max')]
+    position_appends = [(axis, append[f'position_{axis}'], append[f'py_position_{axis}']) for axis in ('x', 'y', 'z')]
+    for point_index, point_result in enumerate(brand_result.get('product_results', [])):
+        panorama_id = _to_int(point_result.get('panorama_id'))
+        seq_id = _to_int(point_result.get('seq_id'))
+        images = point_result.get('images', [])
+        for product_index, product in enumerate(point_result.get('products', [])):
+            bbox = _as_dict(product.get('bbox'))
+            position = _as_dict(product.get('position_3d'))
+            py_position = _as_dict(product.get('py_position_3d'))
+            view_direction = product.get('view_direction') or ''
+            append['panorama_id'](panorama_id)
+            append['seq_id'](seq_id)
+            append['point_index'](point_index)
+            append['product_index'](product_index)
+            append['name'](product.get('name', ''))
+            append['type'](product.get('type', ''))
+            append['colors'](_to_str_list(product.get('colors')))
+            append['materials'](_to_str_list(product.get('materials')))
+            append['location'](product.get('location', ''))
+            append['view_direction'](view_direction)
+            append['is_recommended'](bool(product.get('is_recommended', False)))
+            for key, append_bbox in bbox_appends:
+                append_bbox(_to_float(bbox.get(key)))
+            append['has_position_3d'](bool(position))
+            for axis, append_position, append_py_position in position_appends:
+                append_position(_to_float(position.get(axis)))
+                append_py_position(_to_float(py_position.get(axis)))
+            append['source_image'](_source_image(images, view_direction))
+    return columns
+
+
+def brand_table(brand_result: Dict) -> 'pa.Table':
+    """一个品牌的商品表（不含 brand 列）"""
+    require_pyarrow()
+    return pa.table(flatten_brand_result(brand_result), schema=_arrow_schema())
+
+
+def partition_dir(table_dir: str, brand_name: str) -> str:
+    """品牌分区目录（hive 风格 brand={品牌名}，只对路径中不能出现的字符做 URI 编码，读取时自动解码）"""
+    name = ''.join(c if c.isprintable() and c not in UNSAFE_PATH_CHARS else quote(c, safe='') for c in brand_name)
+    return os.path.join(table_dir, f'brand={name}')
+
+
+def write_brand_table(table: 'pa.Table', table_dir: str, brand_name: str, format: str = 'parquet'):
+    """写出（替换）一个品牌的分区；没有商品时删除分区"""
+    brand_dir = partition_dir(table_dir, brand_name)
+    if table.num_rows == 0:
+        shutil.rmtree(brand_dir, ignore_errors=True)
+        return
+    os.makedirs(brand_dir, exist_ok=True)
+    output_file = os.path.join(brand_dir, f'part-0{FILE_EXTENSIONS[format]}')
+    tmp_file = os.path.join(brand_dir, f'.part-0.{os.getpid()}.tmp')
+    if format == 'parquet':
+        pq.write_table(table, tmp_file, compression='zstd')
+    else:
+        with pa.OSFile(tmp_file, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_file, output_file)
+    # 切换格式时清理旧文件
+    for name in os.listdir(brand_dir):
+        if name.startswith('part-') and name != os.path.basename(output_file):
+            os.remove(os.path.join(brand_dir, name))
+
+
+def _load_manifest(table_dir: str) -> Dict:
+    path = os.path.join(table_dir, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f'[WARN] 读取商品表清单失败 {path}: {e}')
+        return {}
+
+
+def export_product_table(
+    results,
+    table_dir: str = DEFAULT_TABLE_DIR,
+    format: str = 'parquet',
+    force: bool = False
+) -> Dict[str, int]:
+    """
+    导出商品列式表（按品牌分区）
+
+    Args:
+        results: AnalysisResultSet（增量导出，只重写分析结果有变化的品牌，并删除已不存在的品牌）或品牌结果列表（全部写出）
+        table_dir: 输出目录
+        format: parquet / arrow（Arrow IPC 文件）
+        force: 忽略清单，全部重写
+
+    Returns:
+        {'written': 写出的品牌数, 'unchanged': 未变化的品牌数, 'removed': 删除的品牌数, 'rows': 写出的商品行数}
+    """
+    require_pyarrow()
+    if format not in TABLE_FORMATS:
+        raise ValueError(f'未知的格式: {format}（可选 {", ".join(TABLE_FORMATS)}）')
+    os.makedirs(table_dir, exist_ok=True)
+    counts = {'written': 0, 'unchanged': 0, 'removed': 0, 'rows': 0}
+
+    if not isinstance(results, AnalysisResultSet):
+        for brand_result in results:
+            table = brand_table(brand_result)
+            write_brand_table(table, table_dir, brand_result.get('brand', ''), format)
+            counts['written'] += 1
+            counts['rows'] += table.num_rows
+        write_json_atomic({'version': TABLE_VERSION, 'format': format, 'transform_key': '', 'brands': {}},
+                          os.path.join(table_dir, MANIFEST_NAME))
+        return counts
+
+    transform_key = results.loader_args[2]
+    manifest = _load_manifest(table_dir)
+    if force or manifest.get('version') != TABLE_VERSION or manifest.get('format') != format \
+            or manifest.get('transform_key') != transform_key:
+        manifest = {}
+    exported: Dict[str, list] = manifest.get('brands', {})
+
+    # 分析结果未变化的品牌跳过
+    stats: Dict[str, list] = {}
+    changed = []
+    for brand in results.brands:
+        try:
+            st = os.stat(results.file_path(brand))
+        except OSError:
+            continue
+        stats[brand] = [st.st_mtime_ns, st.st_size]
+        if exported.get(brand) == stats[brand]:
+            counts['unchanged'] += 1
+        else:
+            changed.append(brand)
+
+    new_exported = {brand: stat for brand, stat in exported.items() if brand in stats and brand not in changed}
+    for brand, brand_result in results.iter_items(changed):
+        table = brand_table(brand_result)
+        write_brand_table(table, table_dir, brand, format)
+        new_exported[brand] = stats[brand]
+        counts['written'] += 1
+        counts['rows'] += table.num_rows
+
+    # 删除已不存在的品牌
+    for brand in exported:
+        if brand not in stats:
+            shutil.rmtree(partition_dir(table_dir, brand), ignore_errors=True)
+            counts['removed'] += 1
+
+    write_json_atomic(
+        {'version': TABLE_VERSION, 'format': format, 'transform_key': transform_key, 'brands': new_exported},
+        os.path.join(table_dir, MANIFEST_NAME)
+    )
+    return counts
+
+
+def open_product_dataset(table_dir: str = DEFAULT_TABLE_DIR) -> 'ds.Dataset':
+    """以 pyarrow Dataset 打开商品表（brand 为分区列），可自行组合过滤条件按需读取"""
+    require_pyarrow()
+    format = _load_manifest(table_dir).get('format', 'parquet')
+    return ds.dataset(table_dir, format='ipc' if format == 'arrow' else 'parquet', partitioning=_partitioning())
+
+
+def read_product_table(
+    table_dir: str = DEFAULT_TABLE_DIR,
+    brands: Optional[Iterable[str]] = None,
+    columns: Optional[List[str]] = None,
+    recommended_only: bool = False
+):
+    """
+    读取商品表为 pandas DataFrame（过滤条件下推到分区和文件，只读取需要的品牌和列）
+
+    Args:
+        brands: 只读取这些品牌，None 表示全部
+        columns: 只读取这些列（可含 brand），None 表示全部
+        recommended_only: 只读取推荐商品
+    """
+    dataset = open_product_dataset(table_dir)
+    expression = None
+    if brands is not None:
+        expression = ds.field('brand').isin(list(brands))
+    if recommended_only:
+        recommended = ds.field('is_recommended') == True  # noqa: E712（pyarrow 表达式）
+        expression = recommended if expression is None else expression & recommended
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+# ==================== 主函数 ====================
+def main():
+    parser = argparse.ArgumentParser(
+        description='把分析结果中的商品展开为列式表（按品牌分区的 Parquet / Arrow IPC）'
+    )
+    parser.add_argument(
+        '--analysis_dir',
+        type=str,
+        default=DEFAULT_ANALYSIS_DIR,
+        help='分析结果目录路径'
+    )
+    parser.add_argument(
+        '--output_dir',
+        type=str,
+        default=DEFAULT_TABLE_DIR,
+        help='商品表输出目录'
+    )
+    parser.add_argument(
+        '--format',
+        type=str,
+        choices=list(TABLE_FORMATS),
+        default='parquet',
+        help='输出格式：parquet 或 arrow（Arrow IPC，默认 parquet）'
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='全部重新导出（默认只导出分析结果有变化的品牌）'
+    )
+    parser.add_argument(
+        '--dedup',
+        action='store_true',
+        help='导出前合并在多个点位重复识别的同一商品（同 04、05 的 --dedup）'
+    )
+    parser.add_argument(
+        '--dedup_radius',
+        type=float,
+        default=DEDUP_RADIUS,
+        help=f'去重空间距离阈值（米，默认 {DEDUP_RADIUS}）'
+    )
+    parser.add_argument(
+        '--dedup_similarity',
+        type=float,
+        default=DEDUP_MIN_SIMILARITY,
+        help=f'去重名称/类型/颜色相似度阈值（0-1，默认 {DEDUP_MIN_SIMILARITY}）'
+    )
+    parser.add_argument(
+        '--load_workers',
+        type=int,
+        default=0,
+        help='解析分析结果的进程数（默认 0，在当前进程中逐个解析）'
+    )
+    parser.add_argument(
+        '--no_parse_cache',
+        action='store_true',
+        help='不使用分析结果解析缓存'
+    )
+
+    args = parser.parse_args()
+
+    try:
+        require_pyarrow()
+    except ImportError as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
+
+    print('[INFO] 开始导出商品列式表...')
+    print(f'[INFO] 分析结果目录: {args.analysis_dir}')
+    print(f'[INFO] 输出目录: {args.output_dir}')
+    print(f'[INFO] 输出格式: {args.format}\n')
+
+    transform, transform_key = dedup_transform(args.dedup_radius, args.dedup_similarity) if args.dedup else (None, '')
+    results = AnalysisResultSet(
+        args.analysis_dir,
+        workers=args.load_workers,
+        cache_dir=None if args.no_parse_cache else '',
+        transform=transform,
+        transform_key=transform_key
+    )
+    if not results:
+        print('[ERROR] 未找到任何分析结果文件')
+        return
+
+    counts = export_product_table(results, args.output_dir, format=args.format, force=args.force)
+    results.print_summary()
+    print(f'[INFO] 商品表导出完成: 写出 {counts["written"]} 个品牌（{counts["rows"]} 行），'
+          f'未变化 {counts["unchanged"]} 个，删除 {counts["removed"]} 个')
+
+
+if __name__ == '__main__':
+    main()
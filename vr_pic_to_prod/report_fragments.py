@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+报告片段（05 生成文档时使用）：每个品牌的文档内容只渲染一次，完整版 / 精简版的 Markdown、HTML、Excel 共用
+- 片段在进程池中渲染，子进程自行加载分析结果（主进程不解析 JSON）
+- 片段按（分析结果文件修改时间和大小, 结果变换, 分类, 该品牌的 VR 链接, 渲染版本）缓存到磁盘，
+  重复生成报告时未变化的品牌不再渲染；组装文档时逐个品牌读取，内存占用与品牌数无关
+- 图片导出依赖输出目录的导出索引，由主进程在组装时处理，片段中只记录原始图片路径
+"""
+
+import os
+import pickle
+import hashlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from result_loader import AnalysisResultSet, load_result_file
+
+CACHE_DIR_NAME = '.fragment_cache'  # 默认缓存目录（位于输出目录下）
+
+# render(品牌结果, {(panorama_id, 商品名): vr_link}, 分类) -> 片段
+RenderFunc = Callable[[Dict, Dict, str], Dict]
+
+
+def _write_cache(cache_path: str, key: Tuple, fragment: Dict):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(fragment, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+
+def render_fragment_file(
+    file_path: str,
+    loader_args: Tuple,
+    render: RenderFunc,
+    brand_links: Dict,
+    category: str,
+    cache_path: Optional[str] = None,
+    key: Tuple = ()
+):
+    """
+    加载并渲染一个品牌（进程池中执行，需为模块级函数）
+
+    Returns:
+        (片段 | None, 是否命中解析缓存)；指定 cache_path 时片段写入缓存，返回 {} 表示成功
+    """
+    data, hit = load_result_file(file_path, *loader_args)
+    if data is None:
+        return None, hit
+    fragment = render(data, brand_links, category)
+    if cache_path:
+        _write_cache(cache_path, key, fragment)
+        return {}, hit
+    return fragment, hit
+
+
+class ReportFragments:
+    """
+    按品牌渲染并缓存的报告片段
+
+    用法：
+        fragments = ReportFragments(results, render, 1, vr_links, category_of, workers=4, cache_dir=cache_dir)
+        fragments.prepare()
+        for category, brands in fragments.iter_categories():
+            for fragment in fragments.iter_fragments(brands):
+                ...
+            first = fragments.first(brands)  # 精简版：分类下第一个加载成功的品牌
+
+    Args:
+        results: AnalysisResultSet，或已加载的品牌结果列表（在当前进程中渲染，不缓存到磁盘）
+        render: 渲染函数（进程池模式下需为模块级函数）
+        render_version: 渲染版本，渲染内容变化时递增使旧缓存失效
+        vr_links: {(brand, panorama_id, name): vr_link}
+        category_of: 品牌名 -> 分类
+        workers: 渲染进程数，0 表示在当前进程中渲染
+        cache_dir: 片段缓存目录，None 表示只保存在内存中
+    """
+
+    def __init__(
+        self,
+        results,
+        render: RenderFunc,
+        render_version: int,
+        vr_links: Dict,
+        category_of: Callable[[str], str],
+        workers: int = 0,
+        cache_dir: Optional[str] = None
+    ):
+        self.results = results
+        self.render = render
+        self.render_version = render_version
+        self.workers = workers
+        self.cache_dir = cache_dir if isinstance(results, AnalysisResultSet) else None
+
+        # 按品牌拆分 VR 链接，每个任务只传该品牌的部分
+        self._links: Dict[str, Dict] = defaultdict(dict)
+        for (brand, panorama_id, name), vr_link in vr_links.items():
+            self._links[brand][(panorama_id, name)] = vr_link
+
+        if isinstance(results, AnalysisResultSet):
+            self._loaded: Dict[str, Dict] = {}
+            brands = results.brands
+        else:
+            self._loaded = {r.get('brand', ''): r for r in results}
+            brands = list(self._loaded)
+        self._category = {brand: category_of(brand) for brand in brands}
+
+        self._memory: Dict[str, Dict] = {}  # 未使用磁盘缓存时的片段
+        self._ok: Dict[str, bool] = {}  # 品牌 -> 是否渲染成功
+        self._prepared = False
+        # 统计
+        self.rendered = 0
+        self.cache_hits = 0
+        self.failed = 0
+
+    def iter_categories(self) -> Iterator[Tuple[str, List[str]]]:
+        """按分类名排序，依次返回 (分类, 按品牌名排序的品牌列表)"""
+        category_brands = defaultdict(list)
+        for brand, category in self._category.items():
+            category_brands[category].append(brand)
+        for category in sorted(category_brands.keys()):
+            yield category, sorted(category_brands[category])
+
+    def _cache_path(self, brand: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        file_path = os.path.abspath(self.results.file_path(brand))
+        digest = hashlib.sha1(file_path.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{digest[:24]}.pickle')
+
+    def _key(self, brand: str) -> Optional[Tuple]:
+        try:
+            st = os.stat(self.results.file_path(brand))
+        except OSError:
+            return None
+        links = repr(sorted(self._links.get(brand, {}).items(), key=repr))
+        links_digest = hashlib.sha1(links.encode('utf-8')).hexdigest()
+        transform_key = self.results.loader_args[2]
+        return (self.render_version, st.st_mtime_ns, st.st_size, transform_key, self._category[brand], links_digest)
+
+    def _cached(self, cache_path: Optional[str], key: Tuple) -> bool:
+        if not cache_path or not os.path.isfile(cache_path):
+            return False
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f) == key
+        except Exception:
+            return False
+
+    def _done(self, brand: str, fragment: Optional[Dict], hit: Optional[bool] = None):
+        if fragment is None:
+            self._ok[brand] = False
+            self.failed += 1
+            return
+        if hit is not None:
+            self.results.count_load(hit)
+        self._ok[brand] = True
+        self.rendered += 1
+        if not self.cache_dir:
+            self._memory[brand] = fragment
+
+    def prepare(self):
+        """渲染所有未缓存的品牌（workers > 0 时使用进程池）"""
+        if self._prepared:
+            return
+        self._prepared = True
+
+        if not isinstance(self.results, AnalysisResultSet):
+            for brand, brand_result in self._loaded.items():
+                self._done(brand, self.render(brand_result, self._links.get(brand, {}), self._category[brand]))
+            return
+
+        tasks = []
+        for brand in self.results.brands:
+            cache_path = self._cache_path(brand)
+            key = self._key(brand)
+            if key is not None and self._cached(cache_path, key):
+                self._ok[brand] = True
+                self.cache_hits += 1
+                continue
+            tasks.append((
+                brand,
+                (self.results.file_path(brand), self.results.loader_args, self.render,
+                 self._links.get(brand, {}), self._category[brand], cache_path, key)
+            ))
+
+        if self.workers <= 0 or len(tasks) <= 1:
+            for brand, args in tasks:
+                fragment, hit = render_fragment_file(*args)
+                self._done(brand, fragment, hit)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(render_fragment_file, *args): brand for brand, args in tasks}
+            for future in as_completed(futures):
+                brand = futures[future]
+                try:
+                    fragment, hit = future.result()
+                except Exception as e:
+                    print(f'[ERROR] 渲染品牌 {brand} 失败: {e}')
+                    fragment, hit = None, False
+                self._done(brand, fragment, hit)
+
+    def load(self, brand: str) -> Optional[Dict]:
+        """品牌片段，不存在或渲染失败时返回 None"""
+        self.prepare()
+        if not self._ok.get(brand):
+            return None
+        if not self.cache_dir:
+            return self._memory.get(brand)
+        try:
+            with open(self._cache_path(brand), 'rb') as f:
+                pickle.load(f)  # 键
+                return pickle.load(f)
+        except Exception as e:
+            print(f'[ERROR] 读取片段缓存失败 {brand}: {e}')
+            return None
+
+    def iter_fragments(self, brands: Iterable[str]) -> Iterator[Dict]:
+        """按给定顺序逐个读取片段（跳过渲染失败的品牌）"""
+        for brand in brands:
+            fragment = self.load(brand)
+            if fragment is not None:
+                yield fragment
+
+    def first(self, brands: Iterable[str]) -> Optional[Dict]:
+        """第一个渲染成功的品牌片段"""
+        return next(self.iter_fragments(brands), None)
+
+    def print_summary(self):
+        print(f'[INFO] 报告片段: 渲染 {self.rendered} 个品牌，缓存命中 {self.cache_hits} 个，失败 {self.failed} 个')
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+报告 Markdown / HTML 的流式写出（05 使用）
+- 文档内容由行生成器逐行产出，同一遍同时写入 Markdown 和 HTML 文件，不拼接整篇文档字符串
+- HTML 由 MarkdownHtmlRenderer 逐行增量转换（只支持报告用到的语法：标题、表格、粗体、链接、列表、段落）
+- 正则预编译；表格单元格不含对应标记时跳过替换
+"""
+
+import os
+import re
+from collections import deque
+from typing import IO, Iterable, List, Optional
+
+# ==================== 配置项 ====================
+BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+LINK_RE = re.compile(r'\[(.+?)\]\((.+?)\)')
+OL_ITEM_RE = re.compile(r'^\s*\d+\.\s+(.+)$')
+OL_START_RE = re.compile(r'^\s*\d+\.\s+')
+UL_ITEM_RE = re.compile(r'^[\s•-]+(.+)$')
+
+
+# 替换用函数而不是 r'\1' 模板：模板每次替换都要重新展开，表格单元格很多时明显更慢
+def _bold_repl(m):
+    return f'<strong>{m.group(1)}</strong>'
+
+
+def _link_repl(m):
+    return f'<a href="{m.group(2)}" target="_blank">{m.group(1)}</a>'
+
+
+# HTML 模板（现代化配色方案），{content} 处为正文
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>店铺商品分析报告</title>
+    <style>
+        * {{
+            box-sizing: border-box;
+        }}
+        body {{
+            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", "Microsoft YaHei", "PingFang SC", "Hiragino Sans GB", Arial, sans-serif;
+            line-height: 1.8;
+            color: #1a202c;
+            max-width: 1600px;
+            margin: 0 auto;
+            padding: 30px 20px;
+            background: #ffffff;
+            min-height: 100vh;
+        }}
+        h1, h2, h3, h4 {{
+            text-align: left;
+        }}
+        p {{
+            text-align: left;
+        }}
+        h1 {{
+            color: #1a202c;
+            border-bottom: 2px solid #e2e8f0;
+            padding: 20px 0 15px 0;
+            margin: 40px 0 30px 0;
+            font-size: 2.5em;
+            font-weight: 700;
+            background: white;
+            padding-left: 20px;
+            padding-right: 20px;
+            border-radius: 8px;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.08);
+        }}
+        h2 {{
+            color: #1a202c;
+            background: #f7fafc;
+            border: 1px solid #e2e8f0;
+            padding: 15px 20px;
+            margin: 35px 0 20px 0;
+            border-radius: 8px;
+            font-size: 1.8em;
+            font-weight: 600;
+            box-shadow: 0 2px 4px rgba(0, 0, 0, 0.05);
+        }}
+        h3 {{
+            color: #1a202c;
+            margin: 25px 0 15px 0;
+            font-size: 1.5em;
+            font-weight: 600;
+            padding-left: 15px;
+            border-left: 4px solid #e2e8f0;
+        }}
+        h4 {{
+            color: #718096;
+            margin: 20px 0 10px 0;
+            font-size: 1.2em;
+            font-weight: 500;
+        }}
+        p {{
+            margin: 10px 0;
+            padding: 0 10px;
+            text-align: left;
+        }}
+        ul, ol {{
+            margin: 10px auto;
+            padding-left: 30px;
+            display: inline-block;
+            text-align: left;
+        }}
+        li {{
+            margin: 8px 0;
+            line-height: 1.6;
+        }}
+        table.data-table {{
+            width: 100%;
+            border-collapse: separate;
+            border-spacing: 0;
+            margin: 25px auto;
+            background-color: white;
+            border-radius: 12px;
+            overflow: hidden;
+            box-shadow: 0 4px 16px rgba(0,0,0,0.1);
+        }}
+        table.data-table th {{
+            background: #f7fafc;
+            color: #1a202c;
+            padding: 16px 14px;
+            text-align: left;
+            font-weight: 600;
+            font-size: 0.95em;
+            letter-spacing: 0.5px;
+            border-bottom: 2px solid #e2e8f0;
+        }}
+        table.data-table th:first-child {{
+            border-top-left-radius: 12px;
+        }}
+        table.data-table th:last-child {{
+            border-top-right-radius: 12px;
+        }}
+        table.data-table td {{
+            padding: 14px;
+            border-bottom: 1px solid #e2e8f0;
+            vertical-align: top;
+            background-color: #ffffff;
+            color: #1a202c;
+            font-size: 0.9em;
+            line-height: 1.8;
+            text-align: left;
+        }}
+        table.data-table td p {{
+            margin: 8px 0;
+            padding: 0;
+            color: #1a202c;
+        }}
+        table.data-table td strong {{
+            color: #1a202c;
+            font-weight: 700;
+            background-color: transparent;
+        }}
+        table.data-table td .product-label {{
+            color: #2d3748;
+            font-weight: 600;
+        }}
+        table.data-table tr:last-child td:first-child {{
+            border-bottom-left-radius: 12px;
+        }}
+        table.data-table tr:last-child td:last-child {{
+            border-bottom-right-radius: 12px;
+        }}
+        table.data-table tr:nth-child(even) td {{
+            background-color: #f7fafc;
+        }}
+        table.data-table tr:hover td {{
+            background-color: #edf2f7;
+            transition: background-color 0.2s ease;
+        }}
+        table.data-table tr:last-child td {{
+            border-bottom: none;
+        }}
+        a {{
+            color: #1a202c;
+            text-decoration: underline;
+            font-weight: 600;
+            transition: color 0.2s ease;
+        }}
+        a:hover {{
+            color: #2d3748;
+            text-decoration: underline;
+        }}
+        strong {{
+            color: #1a202c;
+            font-weight: 700;
+        }}
+        table.data-table td a {{
+            color: #1a202c;
+            background-color: transparent;
+            padding: 0;
+            text-decoration: underline;
+        }}
+        table.data-table td a:hover {{
+            color: #2d3748;
+            background-color: transparent;
+            padding: 0;
+        }}
+        .category-header {{
+            background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
+            color: white;
+            padding: 20px;
+            margin: 25px 0;
+            border-radius: 10px;
+            box-shadow: 0 4px 12px rgba(245, 87, 108, 0.3);
+        }}
+    </style>
+</head>
+<body>
+{content}
+</body>
+</html>"""
+HTML_HEAD, HTML_TAIL = HTML_TEMPLATE.format(content='\x00').split('\x00')
+
+
+def render_inline(text: str) -> str:
+    """粗体和链接（粗体优先处理，避免嵌套问题）"""
+    if '**' in text:
+        text = BOLD_RE.sub(_bold_repl, text)
+    if '](' in text:
+        text = LINK_RE.sub(_link_repl, text)
+    return text
+
+
+class MarkdownHtmlRenderer:
+    """
+    Markdown -> HTML 的逐行增量转换
+
+    用法：
+        renderer = MarkdownHtmlRenderer()
+        for line in markdown_lines:
+            html_lines.extend(renderer.feed(line))
+        html_lines.extend(renderer.close())
+
+    列表的开闭按最近输出的几行判断，只需保留最近 5 行
+    """
+
+    def __init__(self):
+        self.in_table = False
+        self.is_table_header = False
+        self._recent = deque(maxlen=5)  # 最近输出的 HTML 行
+        self._out: List[str] = []
+
+    def _emit(self, html_line: str):
+        self._recent.append(html_line)
+        self._out.append(html_line)
+
+    def _recent_has(self, tag: str, count: int) -> bool:
+        recent = self._recent
+        return any(tag in recent[i] for i in range(max(0, len(recent) - count), len(recent)))
+
+    def feed(self, line: str) -> List[str]:
+        """转换一行 Markdown（不含换行符），返回产生的 HTML 行"""
+        self._out = []
+        stripped = line.strip()
+
+        # 表格分隔行
+        if stripped.startswith('|---'):
+            self.is_table_header = True
+            return self._out
+
+        # 表格行
+        if stripped.startswith('|'):
+            if not self.in_table:
+                self._emit('<table class="data-table">')
+                self.in_table = True
+                self.is_table_header = True
+            tag = 'th' if self.is_table_header else 'td'
+            self._emit('<tr>')
+            # 保留 <br> 标签用于换行；bullet points (•) 保持原样，用 CSS 样式控制
+            for cell in stripped.split('|')[1:-1]:
+                self._emit(f'<{tag}>{render_inline(cell.strip())}</{tag}>')
+            self._emit('</tr>')
+            self.is_table_header = False
+            return self._out
+
+        # 非表格行
+        if self.in_table:
+            self._emit('</table>')
+            self.in_table = False
+
+        if stripped.startswith('#### '):
+            self._emit(f'<h4>{stripped[5:].strip()}</h4>')
+        elif stripped.startswith('### '):
+            self._emit(f'<h3>{stripped[4:].strip()}</h3>')
+        elif stripped.startswith('## '):
+            self._emit(f'<h2>{stripped[3:].strip()}</h2>')
+        elif stripped.startswith('# '):
+            self._emit(f'<h1>{stripped[2:].strip()}</h1>')
+        elif stripped:
+            content = render_inline(line)
+            if OL_START_RE.match(content):
+                # 数字列表
+                content = OL_ITEM_RE.sub(r'<li>\1</li>', content)
+                if not (self._recent_has('<ul>', 5) or self._recent_has('<ol>', 5)):
+                    self._emit('<ol>')
+                self._emit(content)
+            elif content.strip().startswith('-') or content.strip().startswith('•'):
+                # bullet 列表
+                content = UL_ITEM_RE.sub(r'<li>\1</li>', content)
+                if not self._recent_has('<ul>', 5):
+                    self._emit('<ul>')
+                self._emit(content)
+            else:
+                # 普通段落，检查是否需要关闭列表
+                if self._recent and ('</ul>' not in self._recent[-1] and '</ol>' not in self._recent[-1]):
+                    if self._recent_has('<ul>', 3):
+                        self._emit('</ul>')
+                    elif self._recent_has('<ol>', 3):
+                        self._emit('</ol>')
+                self._emit(f'<p>{content}</p>')
+        else:
+            # 空行，检查是否需要关闭列表
+            if self._recent:
+                if self._recent_has('<ul>', 5) and '</ul>' not in self._recent[-1]:
+                    self._emit('</ul>')
+                elif self._recent_has('<ol>', 5) and '</ol>' not in self._recent[-1]:
+                    self._emit('</ol>')
+            self._emit('')
+        return self._out
+
+    def close(self) -> List[str]:
+        """文档结束，关闭未结束的表格"""
+        self._out = []
+        if self.in_table:
+            self._emit('</table>')
+            self.in_table = False
+        return self._out
+
+
+def markdown_to_html(markdown_content: str) -> str:
+    """将 Markdown 内容转换为 HTML"""
+    renderer = MarkdownHtmlRenderer()
+    html_lines = []
+    for line in markdown_content.split('\n'):
+        html_lines.extend(renderer.feed(line))
+    html_lines.extend(renderer.close())
+    return '\n'.join(html_lines)
+
+
+class _LineSink:
+    """按行写文件，行之间用换行分隔（末尾不加换行，与 '\\n'.join 一致）"""
+
+    def __init__(self, f: IO[str]):
+        self.f = f
+        self.first = True
+
+    def write(self, line: str):
+        if self.first:
+            self.first = False
+            self.f.write(line)
+        else:
+            self.f.write('\n' + line)
+
+
+def _open_output(output_file: str) -> IO[str]:
+    os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else '.', exist_ok=True)
+    return open(output_file, 'w', encoding='utf-8', buffering=1024 * 1024)
+
+
+def write_report(lines: Iterable[str], md_file: Optional[str] = None, html_file: Optional[str] = None):
+    """
+    单遍写出报告：lines 中每个元素是一段 Markdown（可含换行），
+    Markdown 文件内容等于 '\\n'.join(lines)，HTML 文件内容等于按模板渲染的 markdown_to_html 结果
+
+    Args:
+        lines: Markdown 行生成器
+        md_file: Markdown 输出文件，None 表示不写
+        html_file: HTML 输出文件，None 表示不写
+    """
+    md_out = _open_output(md_file) if md_file else None
+    html_out = _open_output(html_file) if html_file else None
+    try:
+        md_sink = _LineSink(md_out) if md_out else None
+        html_sink = None
+        renderer = MarkdownHtmlRenderer()
+        if html_out:
+            html_out.write(HTML_HEAD)
+            html_sink = _LineSink(html_out)
+
+        for chunk in lines:
+            if md_sink:
+                md_sink.write(chunk)
+            if html_sink:
+                for line in chunk.split('\n'):
+                    for html_line in renderer.feed(line):
+                        html_sink.write(html_line)
+
+        if html_sink:
+            for html_line in renderer.close():
+                html_sink.write(html_line)
+            html_out.write(HTML_TAIL)
+    finally:
+        if md_out:
+            md_out.close()
+        if html_out:
+            html_out.close()
+
+    if md_file:
+        print(f'\n[INFO] Markdown 文档已保存: {md_file}')
+    if html_file:
+        print(f'[INFO] HTML 文档已保存: {html_file}')
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+03 分析结果（{brand}_analysis.json）的按需加载
+- 遍历时逐个品牌解析，同一时刻只保留一个品牌（使用进程池时最多 workers 个）
+- 解析结果按（文件修改时间, 大小）缓存为 pickle，重复生成报告时未变化的品牌不再解析 JSON
+- 可指定 transform（如跨点位去重），变换后的结果一起缓存
+"""
+
+import os
+import json
+import pickle
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+RESULT_SUFFIX = '_analysis.json'
+CACHE_DIR_NAME = '.parse_cache'  # 默认缓存目录（位于分析结果目录下）
+
+
+def _cache_path(cache_dir: str, file_path: str, transform_key: str) -> str:
+    digest = hashlib.sha1(f'{os.path.abspath(file_path)}|{transform_key}'.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f'{digest[:24]}.pickle')
+
+
+def load_result_file(
+    file_path: str,
+    cache_dir: Optional[str] = None,
+    transform: Optional[Callable[[Dict], Dict]] = None,
+    transform_key: str = ''
+):
+    """
+    加载单个分析结果文件（进程池中执行，需为模块级函数）
+
+    Returns:
+        (品牌结果 | None, 是否命中缓存)
+    """
+    try:
+        st = os.stat(file_path)
+    except OSError as e:
+        print(f'[ERROR] 读取文件失败 {os.path.basename(file_path)}: {e}')
+        return None, False
+    key = (st.st_mtime_ns, st.st_size, transform_key)
+
+    cache_file = _cache_path(cache_dir, file_path, transform_key) if cache_dir else None
+    if cache_file and os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'rb') as f:
+                # 先读取键，不一致时不反序列化数据
+                if pickle.load(f) == key:
+                    return pickle.load(f), True
+        except Exception:
+            pass
+
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f'[ERROR] 读取文件失败 {os.path.basename(file_path)}: {e}')
+        return None, False
+    if transform is not None:
+        data = transform(data)
+
+    if cache_file:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except Exception as e:
+            print(f'[WARN] 写入解析缓存失败 {cache_file}: {e}')
+    return data, False
+
+
+class AnalysisResultSet:
+    """
+    分析结果目录的惰性结果集：可多次遍历、len()，不会一次性加载全部品牌
+
+    用法：
+        results = AnalysisResultSet(analysis_dir)
+        for brand_result in results:
+            ...
+        for brand_result in results.iter_brands(['PRADA', '安踏']):
+            ...
+
+    Args:
+        analysis_dir: 分析结果目录
+        workers: 解析进程数，0 表示在当前进程中解析
+        cache_dir: 解析缓存目录，默认为 analysis_dir/.parse_cache，None 表示不缓存
+        transform: 加载后对每个品牌结果做的变换（进程池模式下需可 pickle，如 functools.partial）
+        transform_key: 变换及其参数的标识，参与缓存键
+        verbose: 是否打印每个加载的文件
+    """
+
+    def __init__(
+        self,
+        analysis_dir: str,
+        workers: int = 0,
+        cache_dir: Optional[str] = '',
+        transform: Optional[Callable[[Dict], Dict]] = None,
+        transform_key: str = '',
+        verbose: bool = False
+    ):
+        self.analysis_dir = analysis_dir
+        self.workers = workers
+        self.cache_dir = os.path.join(analysis_dir, CACHE_DIR_NAME) if cache_dir == '' else cache_dir
+        self.transform = transform
+        self.transform_key = transform_key
+        self.verbose = verbose
+
+        self._files: Dict[str, str] = {}
+        if os.path.isdir(analysis_dir):
+            for filename in sorted(os.listdir(analysis_dir)):
+                if filename.endswith(RESULT_SUFFIX):
+                    self._files[filename[:-len(RESULT_SUFFIX)]] = os.path.join(analysis_dir, filename)
+        else:
+            print(f'[ERROR] 目录不存在: {analysis_dir}')
+
+        # 统计
+        self.parsed = 0
+        self.cache_hits = 0
+
+    @property
+    def brands(self) -> List[str]:
+        """品牌名（来自文件名，不解析文件）"""
+        return list(self._files)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return self.iter_brands(self.brands)
+
+    def load(self, brand: str) -> Optional[Dict]:
+        """加载单个品牌，不存在或读取失败时返回 None"""
+        return next(self.iter_brands([brand]), None)
+
+    def file_path(self, brand: str) -> Optional[str]:
+        """品牌对应的分析结果文件"""
+        return self._files.get(brand)
+
+    @property
+    def loader_args(self) -> Tuple:
+        """load_result_file 的缓存和变换参数（在其他进程中加载时使用）"""
+        return self.cache_dir, self.transform, self.transform_key
+
+    def count_load(self, hit: bool):
+        """记录一次加载（在其他进程中加载的品牌也计入统计）"""
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.parsed += 1
+
+    def _record(self, brand: str, data: Optional[Dict], hit: bool):
+        if data is None:
+            return
+        self.count_load(hit)
+        if self.verbose:
+            print(f'[INFO] 已加载: {brand}{RESULT_SUFFIX} (品牌: {data.get("brand", "未知")}){"（缓存）" if hit else ""}')
+
+    def iter_brands(self, brands: Iterable[str]) -> Iterator[Dict]:
+        """按给定顺序逐个加载品牌（跳过不存在或读取失败的品牌）"""
+        for _, data in self.iter_items(brands):
+            yield data
+
+    def iter_items(self, brands: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+        """同 iter_brands，同时返回文件名中的品牌名：(brand, data)"""
+        brands = [b for b in brands if b in self._files]
+        args = self.loader_args
+
+        if self.workers <= 0 or len(brands) <= 1:
+            for brand in brands:
+                data, hit = load_result_file(self._files[brand], *args)
+                self._record(brand, data, hit)
+                if data is not None:
+                    yield brand, data
+            return
+
+        # 滑动窗口：最多 workers 个品牌在解析或等待取走，按顺序产出
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            remaining = iter(brands)
+            for brand in remaining:
+                pending.append((brand, pool.submit(load_result_file, self._files[brand], *args)))
+                if len(pending) >= self.workers:
+                    break
+            while pending:
+                brand, future = pending.popleft()
+                data, hit = future.result()
+                next_brand = next(remaining, None)
+                if next_brand is not None:
+                    pending.append((next_brand, pool.submit(load_result_file, self._files[next_brand], *args)))
+                self._record(brand, data, hit)
+                if data is not None:
+                    yield brand, data
+
+    def print_summary(self):
+        print(f'[INFO] 分析结果加载: 解析 {self.parsed} 次，缓存命中 {self.cache_hits} 次')
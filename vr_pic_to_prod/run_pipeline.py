@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+VR 全流程流水线：01 获取店铺 JSON → 02 下载图片 → 03 模型分析 → 04 推荐商品 VR 链接 → 05 生成文档
+每个品牌完成上一阶段后立即进入下一阶段（阶段之间用队列连接，每个阶段有独立的工作线程数），
+某个品牌的图片下载完成就开始分析，其他品牌继续下载，总耗时接近最慢的阶段而不是各阶段之和
+04、05 需要全部品牌的分析结果，在最后执行
+python run_pipeline.py --brand_list --plan [--skip_fetch] [--api_key xxx]
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import importlib
+import subprocess
+import threading
+from typing import Callable, Dict, List, Optional
+
+from checkpoint import BrandCheckpoint
+from point_selection import DEFAULT_MAX_PRODUCT_POINTS, DEFAULT_MAX_STORE_POINTS
+
+# 各阶段脚本以数字开头，不能直接 import
+fetch_stage = importlib.import_module('01_get_store_json')
+download_stage = importlib.import_module('02_store_json_to_pic')
+analyze_stage = importlib.import_module('03_vrpic_to_prod')
+
+# ==================== 配置项 ====================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PANORAMA_DIR = os.path.join(SCRIPT_DIR, 'panorama_json')
+DEFAULT_ANALYSIS_DIR = os.path.join(SCRIPT_DIR, 'analysis_results')
+DEFAULT_RECOMMENDED_FILE = os.path.join(SCRIPT_DIR, 'recommended_views', 'recommended_products.json')
+DEFAULT_DOCS_DIR = os.path.join(SCRIPT_DIR, 'output_docs')
+DEFAULT_PRODUCT_TABLE_DIR = os.path.join(SCRIPT_DIR, 'product_table')
+
+QUEUE_SIZE = 4  # 下载完成、等待分析的品牌数上限（分析跟不上时下载阶段暂停，避免图片堆积）
+JSON_QUEUE_SIZE = 16  # 已获取 JSON、等待下载的品牌数上限（下载跟不上时 01 暂停获取）
+DOWNLOAD_WORKERS = 2  # 同时下载的品牌数
+DOWNLOAD_THREADS = 8  # 每个品牌的下载线程数
+ANALYZE_WORKERS = 2  # 同时分析的品牌数（每个品牌内部还有 03 的点位并发）
+
+_DONE = object()  # 队列结束标记
+
+
+class Stage:
+    """
+    流水线中的一个阶段：workers 个线程从 in_queue 取任务交给 handler，
+    handler 返回值不为 None 时放入 out_queue；上游结束且本阶段所有线程退出后向下游发送结束标记
+
+    Args:
+        name: 阶段名称（用于日志和统计）
+        handler: 处理单个任务的函数，异常只影响当前任务
+        in_queue: 输入队列
+        out_queue: 输出队列，None 表示最后一个阶段
+        workers: 工作线程数
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable,
+        in_queue: queue.Queue,
+        out_queue: Optional[queue.Queue] = None,
+        workers: int = 1
+    ):
+        self.name = name
+        self.handler = handler
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.workers = max(1, workers)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+        # 统计
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.first_start: Optional[float] = None
+        self.last_end: Optional[float] = None
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._close_when_done, name=f'{self.name}-closer', daemon=True).start()
+
+    def _close_when_done(self):
+        for thread in self._threads:
+            thread.join()
+        if self.out_queue is not None:
+            self.out_queue.put(_DONE)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _worker(self):
+        while True:
+            item = self.in_queue.get()
+            if item is _DONE:
+                # 放回结束标记，让同阶段的其他线程也能退出
+                self.in_queue.put(_DONE)
+                return
+
+            start = time.perf_counter()
+            with self._lock:
+                if self.first_start is None:
+                    self.first_start = start
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                print(f'[ERROR] {self.name} 阶段处理失败 {item}: {e}')
+                result = None
+                failed = True
+            else:
+                failed = False
+            end = time.perf_counter()
+            with self._lock:
+                self.busy_seconds += end - start
+                self.last_end = end
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+
+            if result is not None and self.out_queue is not None:
+                self.out_queue.put(result)
+
+
+def brand_json_path(panorama_dir: str, brand_name: str) -> str:
+    return os.path.join(panorama_dir, brand_name, f'{brand_name}.json')
+
+
+def start_fetch(
+    stores: Dict[str, str],
+    panorama_dir: str,
+    out_queue: queue.Queue,
+    skip_fetch: bool = False,
+    concurrency: int = fetch_stage.CONCURRENCY,
+    rpm: float = fetch_stage.RPM
+) -> threading.Thread:
+    """
+    01 阶段：店铺 JSON 保存后立即把 JSON 路径交给下载阶段
+    skip_fetch 时直接使用 panorama_dir 中已有的 JSON
+    """
+
+    def feed_existing():
+        for brand_name in stores:
+            json_path = brand_json_path(panorama_dir, brand_name)
+            if os.path.isfile(json_path):
+                out_queue.put(json_path)
+            else:
+                print(f'[WARN] {brand_name}: 未找到 JSON 文件 {json_path}，跳过')
+        out_queue.put(_DONE)
+
+    def on_done(store_name: str, status: str):
+        if status != 'failed':
+            out_queue.put(brand_json_path(panorama_dir, store_name))
+
+    def fetch_all():
+        try:
+            fetch_stage.batch_fetch_stores(
+                stores,
+                output_dir=panorama_dir,
+                concurrency=concurrency,
+                rpm=rpm,
+                on_done=on_done
+            )
+        finally:
+            out_queue.put(_DONE)
+
+    thread = threading.Thread(target=feed_existing if skip_fetch else fetch_all, name='fetch', daemon=True)
+    thread.start()
+    return thread
+
+
+def run_script(script: str, script_args: List[str]) -> bool:
+    """以子进程运行 04 / 05 / product_table（都是一次性处理全部品牌的脚本）"""
+    cmd = [sys.executable, os.path.join(SCRIPT_DIR, script)] + script_args
+    print(f'\n[INFO] 运行: {" ".join(cmd)}')
+    completed = subprocess.run(cmd, cwd=SCRIPT_DIR)
+    if completed.returncode != 0:
+        print(f'[ERROR] {script} 退出码 {completed.returncode}')
+        return False
+    return True
+
+
+def print_stage_summary(stages: List[Stage], wall_seconds: float):
+    print('\n[INFO] 流水线阶段统计:')
+    for stage in stages:
+        span = 0.0
+        if stage.first_start is not None and stage.last_end is not None:
+            span = stage.last_end - stage.first_start
+        print(
+            f'  - {stage.name}: 完成 {stage.completed}，失败 {stage.failed}，'
+            f'累计处理 {stage.busy_seconds:.1f}s（{stage.workers} 线程），活跃时间段 {span:.1f}s'
+        )
+    total_busy = sum(stage.busy_seconds for stage in stages)
+    print(f'  - 总耗时 {wall_seconds:.1f}s（各阶段累计处理 {total_busy:.1f}s）')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='VR 全流程流水线：获取 JSON → 下载图片 → 模型分析 → 推荐商品 → 生成文档'
+    )
+    parser.add_argument('--brand_list', action='store_true', help='是否只处理 brand_list.py 中的品牌')
+    parser.add_argument('--vr_loc_list', action='store_true', help='是否只处理 brand_list.py 中指定的 VR 点位号（vr_loc_list）')
+    parser.add_argument('--panorama_dir', type=str, default=DEFAULT_PANORAMA_DIR, help='panorama_json 根目录路径')
+    parser.add_argument('--output_dir', type=str, default=DEFAULT_ANALYSIS_DIR, help='分析结果输出目录')
+    parser.add_argument('--recommended_file', type=str, default=DEFAULT_RECOMMENDED_FILE, help='04 推荐商品输出文件')
+    parser.add_argument('--docs_dir', type=str, default=DEFAULT_DOCS_DIR, help='05 文档输出目录')
+
+    # 01
+    parser.add_argument('--skip_fetch', action='store_true', help='跳过 01，直接使用 panorama_dir 中已有的 JSON')
+    parser.add_argument('--fetch_concurrency', type=int, default=fetch_stage.CONCURRENCY, help='01 同时进行的请求数')
+    parser.add_argument('--fetch_rpm', type=float, default=fetch_stage.RPM, help='01 每分钟请求数上限')
+
+    # 02
+    parser.add_argument('--plan', action='store_true', help='02 只下载 03 会用到的图片（见 02 --plan）')
+    parser.add_argument('--refresh', action='store_true', help='02 对已有图片发送条件请求，只重新下载有变化的图片')
+    parser.add_argument('--no_manifest', action='store_true', help='02 不使用下载清单')
+    parser.add_argument('--download_workers', type=int, default=DOWNLOAD_WORKERS, help=f'同时下载的品牌数（默认 {DOWNLOAD_WORKERS}）')
+    parser.add_argument('--download_threads', type=int, default=DOWNLOAD_THREADS, help=f'每个品牌的下载线程数（默认 {DOWNLOAD_THREADS}）')
+    parser.add_argument('--queue_size', type=int, default=QUEUE_SIZE, help=f'下载完成、等待分析的品牌数上限（默认 {QUEUE_SIZE}）')
+
+    # 03
+    parser.add_argument('--analyze_workers', type=int, default=ANALYZE_WORKERS, help=f'同时分析的品牌数（默认 {ANALYZE_WORKERS}）')
+    parser.add_argument('--api_key', type=str, default=analyze_stage.DOUBAO_API_KEY, help='豆包 API 密钥（默认从环境变量 DOUBAO_API_KEY 读取）')
+    parser.add_argument('--base_url', type=str, default=analyze_stage.DOUBAO_BASE_URL, help='豆包 API 基础 URL')
+    parser.add_argument('--max_product_points', type=int, default=DEFAULT_MAX_PRODUCT_POINTS, help='商品分析最大点位数')
+    parser.add_argument('--max_store_points', type=int, default=DEFAULT_MAX_STORE_POINTS, help='店铺分析最大点位数')
+    parser.add_argument('--force', action='store_true', help='强制重新分析已有结果的品牌（不读取模型结果缓存）')
+    parser.add_argument('--no_cache', action='store_true', help='不使用模型结果缓存')
+    parser.add_argument('--image_cache_dir', type=str, default=analyze_stage.DEFAULT_IMAGE_CACHE_DIR, help='预处理图片缓存目录')
+    parser.add_argument('--metrics_file', type=str, default=None, help='03 请求指标输出文件（见 pipeline_metrics.py）')
+    parser.add_argument('--metrics_format', type=str, choices=['jsonl', 'prometheus'], default='jsonl', help='03 请求指标格式')
+    parser.add_argument('--product_table', action='store_true', help='03 完成后把商品导出为按品牌分区的列式表（见 product_table.py，需要 pyarrow）')
+    parser.add_argument('--product_table_dir', type=str, default=DEFAULT_PRODUCT_TABLE_DIR, help='商品列式表输出目录')
+
+    # 04 / 05
+    parser.add_argument('--skip_docs', action='store_true', help='只运行 01-03，不运行 04、05')
+    parser.add_argument('--dedup', action='store_true', help='04、05 合并多个点位重复识别的同一商品')
+    parser.add_argument('--doc_format', type=str, choices=['markdown', 'html', 'excel', 'both'], default='excel', help='05 输出格式')
+    parser.add_argument('--summary', action='store_true', help='05 同时生成精简版文档')
+
+    args = parser.parse_args()
+
+    if not args.api_key:
+        print('[ERROR] 未设置 API 密钥！请设置环境变量 DOUBAO_API_KEY 或使用 --api_key')
+        sys.exit(1)
+
+    # 需要处理的品牌
+    stores = dict(fetch_stage.store_view_dict)
+    if args.brand_list:
+        from brand_list import brand_list
+        stores = {name: sid for name, sid in stores.items() if name in brand_list}
+    if args.skip_fetch and os.path.isdir(args.panorama_dir):
+        # 跳过 01 时以本地已有的品牌目录为准
+        local_brands = sorted(d for d in os.listdir(args.panorama_dir) if os.path.isdir(os.path.join(args.panorama_dir, d)))
+        if args.brand_list:
+            local_brands = [name for name in local_brands if name in brand_list]
+        stores = {name: stores.get(name, '') for name in local_brands}
+
+    vr_filter = None
+    if args.vr_loc_list:
+        from brand_list import vr_loc_list
+        vr_filter = vr_loc_list
+
+    plan_options = None
+    if args.plan:
+        plan_options = {
+            'vr_loc_list': vr_filter,
+            'max_product_points': args.max_product_points,
+            'max_store_points': args.max_store_points
+        }
+
+    print(f'[INFO] 共 {len(stores)} 个品牌进入流水线')
+    os.makedirs(args.panorama_dir, exist_ok=True)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    download_stage.init_manifest(
+        None if args.no_manifest else os.path.join(args.panorama_dir, download_stage.MANIFEST_NAME)
+    )
+    # 多个品牌同时下载，共享 Session 的连接池按总线程数设置（连接池在第一次调用 get_session 时创建）
+    download_stage.get_session(
+        max_conn_per_host=min(max(1, args.download_workers) * args.download_threads, download_stage.MAX_CONN_PER_HOST)
+    )
+    analyze_stage.init_runtime(
+        cache_dir=None if args.no_cache else analyze_stage.DEFAULT_CACHE_DIR,
+        image_cache_dir=args.image_cache_dir,
+        metrics_file=args.metrics_file,
+        metrics_format=args.metrics_format,
+        refresh_cache=args.force,
+        # 多个品牌同时分析，共享连接池按总并发设置
+        client_connections=max(1, args.analyze_workers) * analyze_stage.MAX_WORKERS
+    )
+
+    results: List[Dict] = []
+    results_lock = threading.Lock()
+
+    def download(json_path: str) -> str:
+        brand_name = os.path.basename(os.path.dirname(json_path))
+        counts = download_stage.download_json_images(
+            json_path,
+            threads=args.download_threads,
+            refresh=args.refresh,
+            plan_options=plan_options
+        )
+        print(
+            f'[INFO] {brand_name}: 图片下载完成（下载 {counts["downloaded"]}，未变化 {counts["not_modified"]}，'
+            f'已存在 {counts["skipped"]}，失败 {counts["failed"]}）'
+        )
+        return os.path.dirname(json_path)
+
+    def analyze(brand_folder: str):
+        brand_name = os.path.basename(brand_folder)
+        output_file = os.path.join(args.output_dir, f'{brand_name}_analysis.json')
+        if not args.force and os.path.exists(output_file):
+            print(f'[SKIP] {brand_name}: 已有分析结果，跳过（使用 --force 强制重新分析）')
+            with open(output_file, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        else:
+            if args.force:
+                BrandCheckpoint(args.output_dir, brand_name).reset()
+            result = analyze_stage.process_brand(
+                brand_folder,
+                args.api_key,
+                args.base_url,
+                args.output_dir,
+                vr_filter,
+                max_product_points=args.max_product_points,
+                max_store_points=args.max_store_points
+            )
+        with results_lock:
+            results.append(result)
+
+    # 01 → (JSON 路径，有界队列) → 02 → (品牌目录，有界队列) → 03
+    # 01 的回调在线程中执行，JSON 队列满时阻塞，01 随之暂停获取新的店铺
+    json_queue: queue.Queue = queue.Queue(maxsize=JSON_QUEUE_SIZE)
+    brand_queue: queue.Queue = queue.Queue(maxsize=max(1, args.queue_size))
+
+    wall_start = time.perf_counter()
+    fetch_thread = start_fetch(
+        stores,
+        args.panorama_dir,
+        json_queue,
+        skip_fetch=args.skip_fetch,
+        concurrency=args.fetch_concurrency,
+        rpm=args.fetch_rpm
+    )
+    stages = [
+        Stage('下载', download, json_queue, brand_queue, workers=args.download_workers),
+        Stage('分析', analyze, brand_queue, None, workers=args.analyze_workers)
+    ]
+    for stage in stages:
+        stage.start()
+
+    fetch_thread.join()
+    for stage in stages:
+        stage.join()
+    wall_seconds = time.perf_counter() - wall_start
+
+    results.sort(key=lambda r: r.get('brand', ''))
+    analyze_stage.write_summary(results, args.output_dir)
+    analyze_stage.shutdown_runtime()
+    download_stage.close_manifest()
+    print_stage_summary(stages, wall_seconds)
+
+    if args.product_table:
+        # 只重写分析结果有变化的品牌
+        ok = run_script('product_table.py', [
+            '--analysis_dir', args.output_dir,
+            '--output_dir', args.product_table_dir
+        ])
+        if not ok:
+            sys.exit(1)
+
+    if args.skip_docs:
+        return
+
+    dedup_args = ['--dedup'] if args.dedup else []
+    ok = run_script('04_locAgl_to_prodView.py', [
+        '--analysis_dir', args.output_dir,
+        '--output', args.recommended_file,
+        '--panorama_dir', args.panorama_dir
+    ] + dedup_args)
+    if not ok:
+        sys.exit(1)
+    ok = run_script('05_result_to_doc.py', [
+        '--analysis_dir', args.output_dir,
+        '--recommended_file', args.recommended_file,
+        '--output_dir', args.docs_dir,
+        '--format', args.doc_format
+    ] + (['--summary'] if args.summary else []) + dedup_args)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+三维均匀网格空间索引
+用于按商品 3D 坐标查找最近的 VR 点位、查找某点半径 r 米内的所有商品（跨点位去重、选择最佳视角）
+"""
+
+import math
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class GridIndex:
+    """
+    均匀网格索引：每个条目按坐标落入边长为 cell_size 的立方体格子，
+    查询时只检查目标点附近的格子。商场内点位、商品分布较均匀，网格比 KD 树更简单且足够快
+
+    Args:
+        cell_size: 格子边长（米），一般取常用查询半径附近的值
+    """
+
+    def __init__(self, cell_size: float = 5.0):
+        self.cell_size = float(cell_size)
+        self.keys: List[Hashable] = []
+        self._points: List[Tuple[float, float, float]] = []
+        self._array: Optional[np.ndarray] = None
+        self._cells: Dict[Tuple[int, int, int], List[int]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _cell_of(self, point: Sequence[float]) -> Tuple[int, int, int]:
+        return (
+            math.floor(point[0] / self.cell_size),
+            math.floor(point[1] / self.cell_size),
+            math.floor(point[2] / self.cell_size)
+        )
+
+    def add(self, key: Hashable, point: Sequence[float]):
+        """加入一个条目"""
+        point = (float(point[0]), float(point[1]), float(point[2]))
+        self._cells[self._cell_of(point)].append(len(self.keys))
+        self.keys.append(key)
+        self._points.append(point)
+        self._array = None
+
+    def extend(self, items: Iterable[Tuple[Hashable, Sequence[float]]]):
+        """批量加入条目 [(key, (x, y, z)), ...]"""
+        for key, point in items:
+            self.add(key, point)
+
+    def point(self, key_index: int) -> Tuple[float, float, float]:
+        return self._points[key_index]
+
+    def _coords(self) -> np.ndarray:
+        if self._array is None:
+            self._array = np.array(self._points, dtype=np.float64).reshape(-1, 3)
+        return self._array
+
+    def _candidates(self, center: Tuple[int, int, int], ring: int) -> List[int]:
+        """与中心格子切比雪夫距离恰好为 ring 的格子中的条目"""
+        cx, cy, cz = center
+        found = []
+        for dx in range(-ring, ring + 1):
+            for dy in range(-ring, ring + 1):
+                for dz in range(-ring, ring + 1):
+                    if max(abs(dx), abs(dy), abs(dz)) != ring:
+                        continue
+                    cell = self._cells.get((cx + dx, cy + dy, cz + dz))
+                    if cell:
+                        found.extend(cell)
+        return found
+
+    def _distances(self, indices: List[int], point: Sequence[float]) -> np.ndarray:
+        coords = self._coords()[indices]
+        return np.linalg.norm(coords - np.asarray(point, dtype=np.float64), axis=1)
+
+    def query_radius(self, point: Sequence[float], radius: float) -> List[Tuple[Hashable, float]]:
+        """
+        查找 radius 米内的所有条目
+
+        Returns:
+            [(key, 距离), ...]，按距离从近到远排序
+        """
+        if not self.keys:
+            return []
+        center = self._cell_of(point)
+        rings = int(math.ceil(radius / self.cell_size))
+        indices = []
+        for ring in range(rings + 1):
+            indices.extend(self._candidates(center, ring))
+        if not indices:
+            return []
+
+        distances = self._distances(indices, point)
+        hits = [(indices[i], float(distances[i])) for i in np.nonzero(distances <= radius)[0]]
+        hits.sort(key=lambda item: item[1])
+        return [(self.keys[i], d) for i, d in hits]
+
+    def nearest(
+        self,
+        point: Sequence[float],
+        k: int = 1,
+        min_distance: float = 0.0,
+        max_distance: Optional[float] = None
+    ) -> List[Tuple[Hashable, float]]:
+        """
+        查找最近的 k 个条目（由近到远逐圈扩大搜索范围）
+
+        Args:
+            point: 查询点 (x, y, z)
+            k: 返回数量
+            min_distance: 忽略距离小于该值的条目
+            max_distance: 只在该距离内查找，None 表示不限制
+
+        Returns:
+            [(key, 距离), ...]，按距离从近到远排序
+        """
+        if not self.keys:
+            return []
+        center = self._cell_of(point)
+
+        # 所有条目所在格子的最大圈数，超过后不可能再找到新条目
+        max_ring = max(
+            max(abs(c[0] - center[0]), abs(c[1] - center[1]), abs(c[2] - center[2]))
+            for c in self._cells
+        )
+        if max_distance is not None:
+            max_ring = min(max_ring, int(math.ceil(max_distance / self.cell_size)))
+
+        best: List[Tuple[float, int]] = []
+        for ring in range(max_ring + 1):
+            indices = self._candidates(center, ring)
+            if indices:
+                distances = self._distances(indices, point)
+                for i, d in zip(indices, distances.tolist()):
+                    if d < min_distance or (max_distance is not None and d > max_distance):
+                        continue
+                    best.append((d, i))
+                best.sort()
+                best = best[:k]
+            # 第 ring 圈之外的条目距离至少为 ring * cell_size，已找到的 k 个都更近时停止
+            if len(best) == k and best[-1][0] <= ring * self.cell_size:
+                break
+
+        return [(self.keys[i], d) for d, i in best]
+
+
+class PanoramaIndex(GridIndex):
+    """
+    单个店铺的 VR 点位索引，key 为点位 ID（panorama_id）
+
+    用法：
+        index = PanoramaIndex.from_coordinates(load_panorama_coordinates(brand_folder))
+        panorama_id, distance = index.best_view((x, y, z))
+    """
+
+    def __init__(self, cell_size: float = 5.0):
+        super().__init__(cell_size)
+        self._positions: Dict[Hashable, Tuple[float, float, float]] = {}
+
+    @classmethod
+    def from_coordinates(cls, coordinates: Dict[int, Dict], cell_size: float = 5.0) -> 'PanoramaIndex':
+        """由 load_panorama_coordinates 的返回值构建"""
+        index = cls(cell_size)
+        for seq_id, coord in sorted(coordinates.items()):
+            panorama_id = coord.get('id', seq_id)
+            index.add(panorama_id, (
+                coord.get('position_x', 0),
+                coord.get('position_y', 0),
+                coord.get('position_z', 0)
+            ))
+        return index
+
+    def add(self, key: Hashable, point: Sequence[float]):
+        super().add(key, point)
+        self._positions[key] = self._points[-1]
+
+    def position_of(self, panorama_id) -> Optional[Tuple[float, float, float]]:
+        """点位坐标，不存在时返回 None"""
+        return self._positions.get(panorama_id)
+
+    def best_view(
+        self,
+        position: Sequence[float],
+        min_distance: float = 0.5,
+        max_distance: Optional[float] = None
+    ) -> Optional[Tuple[Hashable, float]]:
+        """
+        商品的最佳观看点位：距离不小于 min_distance（太近时商品在画面中过大、变形）的最近点位
+
+        Returns:
+            (panorama_id, 距离)，没有合适点位时返回 None
+        """
+        found = self.nearest(position, k=1, min_distance=min_distance, max_distance=max_distance)
+        return found[0] if found else None
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 03 断点日志：成功的点位记录后续跑时恢复，失败和 JSON 解析失败的点位不记录、续跑时重试
+"""
+
+import importlib
+
+from checkpoint import BrandCheckpoint
+
+analyze_stage = importlib.import_module('03_vrpic_to_prod')
+
+
+def make_plan():
+    seq_to_data = {
+        seq_id: {'images': [f'/img/{seq_id}_f.jpg'], 'panorama_id': 1000 + seq_id}
+        for seq_id in (0, 1, 2, 3)
+    }
+    return {
+        'brand': 'PRADA',
+        'coordinates': {},
+        'seq_to_data': seq_to_data,
+        'product_seq_ids': [0, 1, 2, 3],
+        'store_point_images': [{'seq_id': 0, 'images': ['/img/0_f.jpg']}]
+    }
+
+
+def run_points(checkpoint, plan, analyses):
+    brand_result = analyze_stage.new_brand_result(plan['brand'])
+    for seq_id, analysis in analyses.items():
+        analyze_stage.record_point_analysis(brand_result, plan, seq_id, analysis)
+        analyze_stage.checkpoint_point(checkpoint, plan, seq_id, analysis)
+    return brand_result
+
+
+def test_parse_error_point_is_retried(tmp_path):
+    plan = make_plan()
+    checkpoint = BrandCheckpoint(str(tmp_path), 'PRADA')
+    product = {'name': '手袋', 'view_direction': 'f', 'bbox': {'x_min': 0.1, 'y_min': 0.1, 'x_max': 0.2, 'y_max': 0.2}}
+    brand_result = run_points(checkpoint, plan, {
+        0: {'products': [product]},
+        1: {'raw_content': '{"products": [', 'parse_error': 'Expecting value'},
+        2: None,
+        3: {'products': []}
+    })
+    assert brand_result['success_count'] == 1
+    assert brand_result['fail_count'] == 2
+
+    restored = analyze_stage.new_brand_result('PRADA')
+    remaining = analyze_stage.restore_brand_progress(restored, plan, BrandCheckpoint(str(tmp_path), 'PRADA'))
+    # 解析失败（1）和调用失败（2）的点位需要重试；没有商品的点位（3）已完成
+    assert remaining == [1, 2]
+    assert [r['seq_id'] for r in restored['product_results']] == [0]
+    assert restored['product_results'][0]['products'][0]['name'] == '手袋'
+
+
+def test_parse_error_store_analysis_is_retried(tmp_path):
+    plan = make_plan()
+    checkpoint = BrandCheckpoint(str(tmp_path), 'PRADA')
+    analyze_stage.checkpoint_store(checkpoint, {'raw_content': '...', 'parse_error': 'Expecting value'})
+
+    restored = analyze_stage.new_brand_result('PRADA')
+    analyze_stage.restore_brand_progress(restored, plan, BrandCheckpoint(str(tmp_path), 'PRADA'))
+    assert analyze_stage.needs_store_analysis(restored, plan)
+
+    analyze_stage.checkpoint_store(checkpoint, {'store_name': 'PRADA'})
+    restored = analyze_stage.new_brand_result('PRADA')
+    analyze_stage.restore_brand_progress(restored, plan, BrandCheckpoint(str(tmp_path), 'PRADA'))
+    assert not analyze_stage.needs_store_analysis(restored, plan)
+
+
+def test_legacy_result_with_parse_error_store_is_retried(tmp_path):
+    plan = make_plan()
+    legacy_result = {
+        'brand': 'PRADA',
+        'product_results': [{'seq_id': 0, 'panorama_id': 1000, 'images': ['/img/0_f.jpg'], 'products': [{'name': '手袋'}]}],
+        'store_analysis': {'raw_content': '...', 'parse_error': 'Expecting value'}
+    }
+    state = BrandCheckpoint.state_from_result(legacy_result)
+    assert state['store_analysis'] is None
+
+    # 即使直接传入含解析错误的店铺分析，seed 也不写入断点日志
+    state['store_analysis'] = legacy_result['store_analysis']
+    BrandCheckpoint(str(tmp_path), 'PRADA').seed(state)
+    restored = analyze_stage.new_brand_result('PRADA')
+    remaining = analyze_stage.restore_brand_progress(restored, plan, BrandCheckpoint(str(tmp_path), 'PRADA'))
+    assert remaining == [1, 2, 3]
+    assert analyze_stage.needs_store_analysis(restored, plan)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 02 下载清单校验：相对路径的 json 目录下载的图片，--verify 时（无论当前目录和传入的是相对还是绝对路径）都能找到并校验
+"""
+
+import os
+import importlib
+
+download_stage = importlib.import_module('02_store_json_to_pic')
+
+URL = 'https://example.com/3c22fc7144cd49b8b7508af648e8955f/28_f.jpg'
+
+
+def make_downloaded_image(json_dir: str) -> str:
+    json_file = os.path.join(json_dir, 'PRADA', 'PRADA.json')
+    local = download_stage.build_local_path(URL, json_file)
+    os.makedirs(os.path.dirname(local), exist_ok=True)
+    with open(local, 'wb') as f:
+        f.write(b'\xff\xd8' + b'0' * 100)
+    # 已存在的图片补记到清单（不发请求）
+    assert download_stage.download_one(URL, json_file)[3] == 'skipped'
+    return local
+
+
+def test_relative_json_dir_is_verified(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    download_stage.init_manifest(str(tmp_path / 'manifest.sqlite'))
+    try:
+        local = make_downloaded_image('panorama_json')
+        entry = download_stage._manifest.get(URL)
+        assert entry['path'] == os.path.abspath(local)
+
+        # 从其他目录用绝对路径、原目录用带 ./ 的相对路径都能找到
+        monkeypatch.chdir(tmp_path.parent)
+        assert len(download_stage._manifest.entries(str(tmp_path / 'panorama_json'))) == 1
+        monkeypatch.chdir(tmp_path)
+        assert len(download_stage._manifest.entries('./panorama_json')) == 1
+        # 同名前缀的其他目录不算在内
+        assert download_stage._manifest.entries('panorama') == []
+
+        # 图片被截断后校验失败：删除图片并移出清单
+        with open(local, 'wb') as f:
+            f.write(b'\xff\xd8')
+        download_stage.verify_downloads('panorama_json', threads=1)
+        assert not os.path.exists(local)
+        assert download_stage._manifest.get(URL) is None
+    finally:
+        download_stage.close_manifest()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试跨点位商品去重：不同点位的同一商品合并为一条，同一点位的不同商品不会经由其他点位的记录间接合并
+"""
+
+from product_dedup import deduplicate_brand
+
+
+def product(name: str, x: float, **extra):
+    return {'name': name, 'type': '鞋', 'colors': ['白'], 'py_position_3d': {'x': x, 'y': 0, 'z': 0}, **extra}
+
+
+def names(brand_result):
+    return [[p['name'] for p in point['products']] for point in brand_result['product_results']]
+
+
+def test_same_product_from_two_points_is_merged():
+    brand_result = {'brand': 'NIKE', 'product_results': [
+        {'seq_id': 1, 'panorama_id': 1001, 'products': [product('白色运动鞋', 0)]},
+        {'seq_id': 2, 'panorama_id': 1002, 'products': [product('白色运动鞋', 0.2, is_recommended=True)]},
+    ]}
+    deduped, removed = deduplicate_brand(brand_result)
+    assert removed == 1
+    assert names(deduped) == [[], ['白色运动鞋']]
+    kept = deduped['product_results'][1]['products'][0]
+    assert kept['duplicate_count'] == 1
+    assert kept['duplicate_panorama_ids'] == [1001]
+
+
+def test_products_from_same_point_are_not_bridged():
+    # 点位 1 的两款鞋都与点位 2 的记录相近，但彼此是不同商品，不能被合并到同一个聚类
+    brand_result = {'brand': 'NIKE', 'product_results': [
+        {'seq_id': 1, 'panorama_id': 1001, 'products': [product('白色运动鞋 A款', 0), product('白色运动鞋 B款', 0.6)]},
+        {'seq_id': 2, 'panorama_id': 1002, 'products': [product('白色运动鞋', 0.3)]},
+    ]}
+    deduped, removed = deduplicate_brand(brand_result)
+    assert removed == 1
+    remaining = sum(names(deduped), [])
+    assert '白色运动鞋 A款' in remaining and '白色运动鞋 B款' in remaining
+    assert len(remaining) == 2
+    assert brand_result['product_results'][0]['products'][1]['name'] == '白色运动鞋 B款'  # 不修改输入
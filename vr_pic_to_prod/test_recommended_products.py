@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 04 推荐商品提取：逐条写出的 JSON 与 json.dump(indent=2) 逐字节相同，坐标和 panorama_id 保留原始值；
+--product_table 读取的列式表还原为品牌结果后使用同一个提取流程
+"""
+
+import json
+import importlib
+
+import pandas as pd
+
+from spatial_index import PanoramaIndex
+
+extract_stage = importlib.import_module('04_locAgl_to_prodView')
+
+STORE_URL = 'https://vr.aibee.cn/store/'
+
+
+def make_results():
+    return [
+        {'brand': 'BIRKENSTOCK', 'product_results': [
+            {'seq_id': 0, 'panorama_id': 1001, 'products': [
+                {'name': '凉鞋', 'location': '左侧展台', 'view_direction': 'f', 'is_recommended': True,
+                 'position_3d': {'x': 3, 'y': -1, 'z': 0}},
+                {'name': '拖鞋', 'location': '中岛', 'view_direction': 'b', 'is_recommended': True,
+                 'position_3d': {'x': 0.25, 'y': 1.0, 'z': -0.125}, 'py_position_3d': {'x': 9.5, 'y': 0, 'z': 1}},
+                {'name': '袜子', 'is_recommended': False, 'position_3d': {'x': 1, 'y': 1, 'z': 1}},
+                {'name': '鞋垫', 'is_recommended': True},
+            ]},
+            {'seq_id': 1, 'panorama_id': None, 'products': [
+                {'name': '护理剂', 'location': '收银台', 'view_direction': None, 'is_recommended': True,
+                 'position_3d': {'x': None, 'y': 2.5, 'z': None}},
+            ]},
+        ]},
+        {'brand': '不存在的品牌', 'product_results': [
+            {'panorama_id': 1, 'products': [{'name': 'x', 'is_recommended': True, 'position_3d': {'x': 1, 'y': 1, 'z': 1}}]},
+        ]},
+        {'brand': 'MCM', 'product_results': [
+            {'seq_id': 0, 'panorama_id': '2001', 'products': [
+                {'name': '双肩包', 'location': '橱窗', 'view_direction': 'l', 'is_recommended': 1,
+                 'position_3d': {'x': 1e-05, 'y': 100.0, 'z': -2}},
+            ]},
+        ]},
+    ]
+
+
+def make_indexes():
+    return {'BIRKENSTOCK': PanoramaIndex.from_coordinates({
+        0: {'id': 1001, 'position_x': 0, 'position_y': 0, 'position_z': 1},
+        1: {'id': 1002, 'position_x': 10, 'position_y': 0, 'position_z': 1},
+    })}
+
+
+# 04 在 make_results / make_indexes 上的输出
+EXPECTED = [
+    {
+        'brand': 'BIRKENSTOCK', 'name': '凉鞋', 'location': '左侧展台', 'view_direction': 'f', 'panorama_id': 1001,
+        'position_3d': {'x': 3, 'y': -1, 'z': 0},
+        'vr_link': STORE_URL + 'rnigHTJW6gZ1WvN8?pid=1001&dirx=3&diry=-1&dirz=0'
+    },
+    {
+        'brand': 'BIRKENSTOCK', 'name': '拖鞋', 'location': '中岛', 'view_direction': 'b', 'panorama_id': 1001,
+        'position_3d': {'x': 0.25, 'y': 1.0, 'z': -0.125},
+        'vr_link': STORE_URL + 'rnigHTJW6gZ1WvN8?pid=1002&dirx=-1.0&diry=0.0&dirz=0.0',
+        'best_panorama_id': 1002,
+        'view_distance': 0.5
+    },
+    {
+        'brand': 'BIRKENSTOCK', 'name': '护理剂', 'location': '收银台', 'view_direction': None, 'panorama_id': None,
+        'position_3d': {'x': None, 'y': 2.5, 'z': None},
+        'vr_link': STORE_URL + 'rnigHTJW6gZ1WvN8?pid=None&dirx=None&diry=2.5&dirz=None'
+    },
+    {
+        'brand': 'MCM', 'name': '双肩包', 'location': '橱窗', 'view_direction': 'l', 'panorama_id': '2001',
+        'position_3d': {'x': 1e-05, 'y': 100.0, 'z': -2},
+        'vr_link': STORE_URL + 'IggvX5NAGCBYGghG?pid=2001&dirx=1e-05&diry=100.0&dirz=-2'
+    },
+]
+
+EXPECTED_CSV = (
+    '﻿brand,name,location,view_direction,panorama_id,x,y,z,vr_link\r\n'
+    'BIRKENSTOCK,凉鞋,左侧展台,f,1001,3,-1,0,' + STORE_URL + 'rnigHTJW6gZ1WvN8?pid=1001&dirx=3&diry=-1&dirz=0\r\n'
+    'BIRKENSTOCK,拖鞋,中岛,b,1001,0.25,1.0,-0.125,' + STORE_URL + 'rnigHTJW6gZ1WvN8?pid=1002&dirx=-1.0&diry=0.0&dirz=0.0\r\n'
+    'BIRKENSTOCK,护理剂,收银台,,,,2.5,,' + STORE_URL + 'rnigHTJW6gZ1WvN8?pid=None&dirx=None&diry=2.5&dirz=None\r\n'
+    'MCM,双肩包,橱窗,l,2001,1e-05,100.0,-2,' + STORE_URL + 'IggvX5NAGCBYGghG?pid=2001&dirx=1e-05&diry=100.0&dirz=-2\r\n'
+)
+
+
+def test_output_matches_json_dump_and_dict_writer(tmp_path):
+    products = extract_stage.extract_recommended_products(make_results(), make_indexes())
+    assert products == EXPECTED
+    output_file = str(tmp_path / 'recommended_products.json')
+    extract_stage.save_results(products, output_file, 'json')
+    extract_stage.save_results(products, output_file, 'csv')
+
+    with open(output_file, 'r', encoding='utf-8') as f:
+        assert f.read() == json.dumps(EXPECTED, ensure_ascii=False, indent=2)
+    with open(output_file.replace('.json', '.csv'), 'r', encoding='utf-8', newline='') as f:
+        assert f.read() == EXPECTED_CSV
+
+
+def test_empty_output_is_empty_array(tmp_path):
+    output_file = str(tmp_path / 'recommended_products.json')
+    extract_stage.save_results(iter([]), output_file, 'json')
+    with open(output_file, 'r', encoding='utf-8') as f:
+        assert f.read() == '[]'
+
+
+def test_product_table_rows_use_table_types():
+    nan = float('nan')
+    table = pd.DataFrame({
+        'brand': ['BIRKENSTOCK', 'BIRKENSTOCK', 'BIRKENSTOCK'],
+        'panorama_id': [1001.0, 1001.0, nan],
+        'point_index': [0, 0, 1],
+        'product_index': [0, 1, 0],
+        'name': ['凉鞋', '拖鞋', '护理剂'],
+        'location': ['左侧展台', '中岛', '收银台'],
+        'view_direction': ['f', 'b', ''],
+        'is_recommended': [True, True, True],
+        'has_position_3d': [True, False, True],
+        'position_x': [3.0, nan, nan],
+        'position_y': [-1.0, nan, 2.5],
+        'position_z': [0.0, nan, nan],
+        'py_position_x': [nan, nan, nan],
+        'py_position_y': [nan, nan, nan],
+        'py_position_z': [nan, nan, nan],
+    })
+    results = extract_stage.product_table_results(table)
+    assert [len(point['products']) for point in results[0]['product_results']] == [2, 1]
+    records = extract_stage.extract_recommended_products(results)
+    # 列式表中坐标为 float、panorama_id 为整数（见 --product_table 的说明）
+    assert [r['panorama_id'] for r in records] == [1001, None]
+    assert [r['position_3d'] for r in records] == [{'x': 3.0, 'y': -1.0, 'z': 0.0}, {'x': None, 'y': 2.5, 'z': None}]
+    assert records[0]['vr_link'] == STORE_URL + 'rnigHTJW6gZ1WvN8?pid=1001&dirx=3.0&diry=-1.0&dirz=0.0'
+    assert records[1]['vr_link'] == STORE_URL + 'rnigHTJW6gZ1WvN8?pid=None&dirx=None&diry=2.5&dirz=None'
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Excel 报告中点位图片的缩略图
+- 缩略图缓存在磁盘上（按源文件路径 + 修改时间 + 目标尺寸寻址），重复生成报告直接读取
+- 未缓存的缩略图在组装工作簿前用进程池并行生成
+- 以内存中的 JPEG 数据（BytesIO）插入工作簿，不写临时文件
+"""
+
+import io
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+from PIL import Image
+
+# ==================== 配置项 ====================
+THUMB_MAX_HEIGHT = 60  # 缩略图高度（像素）
+THUMB_MAX_WIDTH = 80  # 宽度上限（按高度缩放后超过时改按宽度缩放）
+THUMB_QUALITY = 85  # JPEG 压缩质量
+CACHE_DIR_NAME = '.thumb_cache'  # 默认缓存目录（位于输出目录下）
+
+
+def thumbnail_size(width: int, height: int, max_height: int = THUMB_MAX_HEIGHT, max_width: int = THUMB_MAX_WIDTH) -> Tuple[int, int]:
+    """保持宽高比：高度缩放到 max_height，宽度超过 max_width 时改为宽度 max_width"""
+    new_w = int(width * max_height / height)
+    new_h = max_height
+    if new_w > max_width:
+        new_w = max_width
+        new_h = int(height * max_width / width)
+    return new_w, new_h
+
+
+def make_thumbnail(
+    src_path: str,
+    cache_path: Optional[str] = None,
+    max_height: int = THUMB_MAX_HEIGHT,
+    max_width: int = THUMB_MAX_WIDTH,
+    quality: int = THUMB_QUALITY
+) -> bytes:
+    """
+    生成缩略图 JPEG 数据（进程池中执行，需为模块级函数），指定 cache_path 时同时写入缓存
+    """
+    with Image.open(src_path) as img:
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        resized = img.resize(thumbnail_size(img.width, img.height, max_height, max_width), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    resized.save(buffer, 'JPEG', quality=quality)
+    data = buffer.getvalue()
+
+    if cache_path:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f'[WARN] 写入缩略图缓存失败 {cache_path}: {e}')
+    return data
+
+
+class ThumbnailCache:
+    """
+    缩略图缓存
+
+    用法：
+        thumbs = ThumbnailCache(cache_dir, workers=4)
+        thumbs.prefetch(all_image_paths)   # 并行生成未缓存的缩略图
+        data = thumbs.get(image_path)      # JPEG 数据，失败返回 None
+
+    Args:
+        cache_dir: 磁盘缓存目录，None 表示只在本次运行的内存中保存
+        workers: 生成缩略图的进程数，0 表示在当前进程中生成
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        workers: int = 0,
+        max_height: int = THUMB_MAX_HEIGHT,
+        max_width: int = THUMB_MAX_WIDTH,
+        quality: int = THUMB_QUALITY
+    ):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.max_height = max_height
+        self.max_width = max_width
+        self.quality = quality
+        self._memory: Dict[str, bytes] = {}  # 缓存键 -> JPEG 数据
+        # 统计
+        self.generated = 0
+        self.cache_hits = 0
+        self.failed = 0
+
+    def _key(self, path: str) -> Optional[str]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        raw = f'{os.path.abspath(path)}|{st.st_mtime_ns}|{self.max_height}x{self.max_width}|q{self.quality}'
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _cache_path(self, key: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, key[:2], f'{key}.jpg')
+
+    def _load_cached(self, key: str) -> Optional[bytes]:
+        if key in self._memory:
+            return self._memory[key]
+        cache_path = self._cache_path(key)
+        if cache_path and os.path.isfile(cache_path):
+            with open(cache_path, 'rb') as f:
+                data = f.read()
+            self._memory[key] = data
+            self.cache_hits += 1
+            return data
+        return None
+
+    def prefetch(self, paths: Iterable[str]):
+        """生成所有未缓存的缩略图（workers > 0 时使用进程池）"""
+        missing: Dict[str, str] = {}  # 缓存键 -> 源文件
+        for path in paths:
+            key = self._key(path)
+            if key is None or key in missing or self._load_cached(key) is not None:
+                continue
+            missing[key] = path
+        if not missing:
+            return
+
+        args = (self.max_height, self.max_width, self.quality)
+        if self.workers <= 0 or len(missing) <= 1:
+            for key, path in missing.items():
+                self._generate(key, path)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {
+                key: pool.submit(make_thumbnail, path, self._cache_path(key), *args)
+                for key, path in missing.items()
+            }
+            for key, future in futures.items():
+                try:
+                    self._memory[key] = future.result()
+                    self.generated += 1
+                except Exception as e:
+                    self.failed += 1
+                    print(f'[WARN] 生成缩略图失败 {missing[key]}: {e}')
+
+    def _generate(self, key: str, path: str) -> Optional[bytes]:
+        try:
+            data = make_thumbnail(path, self._cache_path(key), self.max_height, self.max_width, self.quality)
+        except Exception as e:
+            self.failed += 1
+            print(f'[WARN] 生成缩略图失败 {path}: {e}')
+            return None
+        self._memory[key] = data
+        self.generated += 1
+        return data
+
+    def get(self, path: str) -> Optional[bytes]:
+        """缩略图 JPEG 数据（未预取时在当前进程中生成），失败返回 None"""
+        key = self._key(path)
+        if key is None:
+            return None
+        data = self._load_cached(key)
+        if data is None:
+            data = self._generate(key, path)
+        return data
+
+    def print_summary(self):
+        print(f'[INFO] 缩略图: 生成 {self.generated} 张，缓存命中 {self.cache_hits} 张，失败 {self.failed} 张')
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视觉模型结果缓存（SQLite，按内容寻址）
+缓存键 = SHA-256(各方向图片内容哈希 + 完整提示词 + 模型名称 + 采样参数)，
+图片、提示词、模型或参数任何一项变化都会得到新的键；支持按大小和时间淘汰，统计命中/未命中次数
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+
+def sha256_text(text: str) -> str:
+    """计算字符串的 SHA-256"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class VisionResultCache:
+    """
+    持久化的模型结果缓存
+
+    Args:
+        db_path: SQLite 数据库文件路径
+        max_size_mb: 缓存总大小上限（MB），超出时按最近访问时间淘汰，0 表示不限制
+        max_age_days: 缓存有效期（天），超出的条目会被淘汰，0 表示不限制
+    """
+
+    def __init__(self, db_path: str, max_size_mb: float = 1024, max_age_days: float = 90):
+        self.db_path = db_path
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age_seconds = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, '
+            'value TEXT NOT NULL, '
+            'size INTEGER NOT NULL, '
+            'created_at REAL NOT NULL, '
+            'accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_results_accessed ON results(accessed_at)')
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(image_hashes: List[str], prompt: str, model: str, params: Dict) -> str:
+        """
+        生成缓存键
+
+        Args:
+            image_hashes: 按发送顺序排列的图片内容 SHA-256
+            prompt: 完整提示词（包含点位 ID、方向说明等）
+            model: 模型名称
+            params: 采样参数（temperature、max_tokens 等）
+        """
+        payload = json.dumps({
+            'images': image_hashes,
+            'prompt': sha256_text(prompt),
+            'model': model,
+            'params': params
+        }, sort_keys=True, ensure_ascii=False)
+        return sha256_text(payload)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute('UPDATE results SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Dict):
+        """写入缓存（覆盖同键旧值）"""
+        value = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO results (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (key, value, len(value.encode('utf-8')), now, now)
+            )
+            self._conn.commit()
+
+    def evict(self):
+        """淘汰过期条目，以及超出大小上限时最久未访问的条目"""
+        with self._lock:
+            removed = 0
+            if self.max_age_seconds > 0:
+                cursor = self._conn.execute(
+                    'DELETE FROM results WHERE created_at < ?',
+                    (time.time() - self.max_age_seconds,)
+                )
+                removed += cursor.rowcount
+
+            if self.max_size_bytes > 0:
+                total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+                if total > self.max_size_bytes:
+                    stale_keys = []
+                    for key, size in self._conn.execute('SELECT key, size FROM results ORDER BY accessed_at'):
+                        if total <= self.max_size_bytes:
+                            break
+                        stale_keys.append((key,))
+                        total -= size
+                    self._conn.executemany('DELETE FROM results WHERE key = ?', stale_keys)
+                    removed += len(stale_keys)
+
+            self._conn.commit()
+            self.evictions += removed
+        if removed:
+            print(f'[INFO] 结果缓存淘汰 {removed} 条')
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': count,
+            'size_mb': round(total / 1024 / 1024, 2)
+        }
+
+    def print_summary(self):
+        s = self.stats()
+        print('[INFO] 结果缓存统计:')
+        print(f'  - 命中: {s["hits"]}，未命中: {s["misses"]}（命中率 {s["hit_rate"]:.1%}）')
+        print(f'  - 淘汰: {s["evictions"]}')
+        print(f'  - 当前条目: {s["entries"]}（{s["size_mb"]} MB）')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
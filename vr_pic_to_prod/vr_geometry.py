@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+VR 点位几何计算
+- 读取点位坐标（位置 + 朝向四元数）
+- 根据商品 bbox、拍摄方向和点位坐标计算商品 3D 坐标（单个 / 整个品牌批量向量化）
+"""
+
+import os
+import json
+import math
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+# 各方向图片相对点位正前方的水平角（弧度）
+DIRECTION_ANGLES = {
+    'f': 0,           # 前: 0度
+    'r': math.pi / 2, # 右: 90度
+    'b': math.pi,     # 后: 180度
+    'l': 3 * math.pi / 2  # 左: 270度
+}
+
+# 假设各方向图片的视野角度均为 90 度（FOV）
+FOV_HORIZONTAL = math.pi / 2
+FOV_VERTICAL = math.pi / 2
+
+
+def load_panorama_coordinates(brand_folder: str) -> Dict[int, Dict]:
+    """
+    从品牌文件夹的 JSON 文件中加载所有点位的坐标信息
+
+    Args:
+        brand_folder: 品牌文件夹路径
+
+    Returns:
+        {seq_id: {id, position_x, position_y, position_z, direction_x, ...}, ...}
+    """
+    brand_name = os.path.basename(brand_folder)
+    json_file = os.path.join(brand_folder, f'{brand_name}.json')
+
+    if not os.path.exists(json_file):
+        print(f'[WARN] JSON 文件不存在: {json_file}')
+        return {}
+
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        coordinates = {}
+        panorama_list = data.get('data', {}).get('panorama_list', [])
+
+        for pano in panorama_list:
+            seq_id = pano.get('seq_id')
+            panorama_id = pano.get('id')  # 获取 panorama 的 id
+            coord = pano.get('coordinate', {})
+
+            if seq_id is not None and coord:
+                coordinates[seq_id] = {
+                    'id': panorama_id,  # 添加 panorama id
+                    'position_x': coord.get('position_x', 0),
+                    'position_y': coord.get('position_y', 0),
+                    'position_z': coord.get('position_z', 0),
+                    'direction_x': coord.get('direction_x', 0),
+                    'direction_y': coord.get('direction_y', 0),
+                    'direction_z': coord.get('direction_z', 0),
+                    'direction_w': coord.get('direction_w', 0)
+                }
+
+        return coordinates
+    except Exception as e:
+        print(f'[ERROR] 读取坐标信息失败 {json_file}: {e}')
+        return {}
+
+
+def get_direction_angle(direction: str) -> float:
+    """
+    根据图片方向获取对应的角度（弧度）
+
+    Args:
+        direction: f(前)/b(后)/l(左)/r(右)
+
+    Returns:
+        角度（弧度）
+    """
+    return DIRECTION_ANGLES.get(direction, 0)
+
+
+def calculate_product_3d_position(
+    bbox: Dict[str, float],
+    direction: str,
+    point_coord: Dict[str, float],
+    estimated_distance: float = 2.0
+) -> Dict[str, float]:
+    """
+    根据商品在图像中的边界框、拍摄方向和点位坐标，计算商品的3D坐标
+
+    Args:
+        bbox: 边界框 {x_min, y_min, x_max, y_max}（归一化坐标）
+        direction: 图片方向 (f/b/l/r)
+        point_coord: 点位坐标 {position_x, position_y, position_z}
+        estimated_distance: 估算的商品距离（米），默认2米
+
+    Returns:
+        {x, y, z}: 商品的3D坐标
+    """
+    # 计算商品在图像中的中心点
+    center_x = (bbox.get('x_min', 0) + bbox.get('x_max', 1)) / 2
+    center_y = (bbox.get('y_min', 0) + bbox.get('y_max', 1)) / 2
+
+    # 将图像坐标转换为角度偏移
+    # center_x: 0.5 表示正中心，0 表示最左，1 表示最右
+    # 假设图像视野角度为90度（FOV）
+    fov_horizontal = FOV_HORIZONTAL  # 90度视野
+    fov_vertical = FOV_VERTICAL
+
+    # 计算水平和垂直角度偏移
+    horizontal_offset = (center_x - 0.5) * fov_horizontal
+    vertical_offset = (center_y - 0.5) * fov_vertical
+
+    # 获取基础方向角度
+    base_angle = get_direction_angle(direction)
+
+    # 最终的水平角度
+    final_angle = base_angle + horizontal_offset
+
+    # 按 prompt 坐标系计算3D坐标（X:左右, Y:上下, Z:前后）
+    # 水平面分量（X-Z 平面）
+    dx = estimated_distance * math.sin(final_angle)  # 水平角在 X 轴的投影
+    dz = estimated_distance * math.cos(final_angle)  # 水平角在 Z 轴的投影（f 对应 +Z）
+
+    # 垂直分量影响 Y 轴（上正下负），图像 y 越大越靠下，因此取负号
+    dy = -estimated_distance * math.tan(vertical_offset)
+
+    # 计算最终的绝对坐标
+    product_x = point_coord.get('position_x', 0) + dx
+    product_y = point_coord.get('position_y', 0) + dy
+    product_z = point_coord.get('position_z', 0) + dz
+
+    return {
+        'x': round(product_x, 3),
+        'y': round(product_y, 3),
+        'z': round(product_z, 3)
+    }
+
+
+def quaternions_to_matrices(quaternions: np.ndarray) -> np.ndarray:
+    """
+    批量将朝向四元数 (x, y, z, w) 转换为旋转矩阵
+    模长为 0 的四元数（坐标中缺少朝向时 direction_* 全为 0）视为不旋转
+
+    Args:
+        quaternions: (N, 4) 数组
+
+    Returns:
+        (N, 3, 3) 旋转矩阵
+    """
+    q = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)
+    norms = np.linalg.norm(q, axis=1, keepdims=True)
+    identity = np.array([0.0, 0.0, 0.0, 1.0])
+    q = np.where(norms > 1e-12, q / np.where(norms > 1e-12, norms, 1.0), identity)
+    x, y, z, w = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+
+    matrices = np.empty((len(q), 3, 3))
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - z * w)
+    matrices[:, 0, 2] = 2 * (x * z + y * w)
+    matrices[:, 1, 0] = 2 * (x * y + z * w)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - x * w)
+    matrices[:, 2, 0] = 2 * (x * z - y * w)
+    matrices[:, 2, 1] = 2 * (y * z + x * w)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return matrices
+
+
+def calculate_product_3d_positions_batch(
+    bboxes: np.ndarray,
+    directions: Sequence[str],
+    positions: np.ndarray,
+    quaternions: Optional[np.ndarray] = None,
+    estimated_distance: float = 2.0
+) -> np.ndarray:
+    """
+    calculate_product_3d_position 的批量向量化版本
+
+    Args:
+        bboxes: (N, 4) 数组，每行为 x_min, y_min, x_max, y_max（归一化坐标）
+        directions: 长度为 N 的图片方向 (f/b/l/r)
+        positions: (N, 3) 数组，商品所在点位的 position_x/y/z
+        quaternions: (N, 4) 数组，点位朝向 direction_x/y/z/w；传入时先将点位局部坐标系下的偏移
+            按点位朝向旋转到世界坐标系，None 表示不考虑朝向（与 calculate_product_3d_position 一致）
+        estimated_distance: 估算的商品距离（米）
+
+    Returns:
+        (N, 3) 数组：商品的 3D 坐标（未取整）
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+
+    center_x = (bboxes[:, 0] + bboxes[:, 2]) / 2
+    center_y = (bboxes[:, 1] + bboxes[:, 3]) / 2
+    base_angles = np.array([DIRECTION_ANGLES.get(d, 0) for d in directions], dtype=np.float64)
+
+    final_angles = base_angles + (center_x - 0.5) * FOV_HORIZONTAL
+    vertical_offsets = (center_y - 0.5) * FOV_VERTICAL
+
+    # 点位局部坐标系下的偏移（X:左右, Y:上下, Z:前后）
+    offsets = np.stack([
+        estimated_distance * np.sin(final_angles),
+        -estimated_distance * np.tan(vertical_offsets),
+        estimated_distance * np.cos(final_angles)
+    ], axis=1)
+
+    if quaternions is not None:
+        offsets = np.einsum('nij,nj->ni', quaternions_to_matrices(quaternions), offsets)
+
+    return positions + offsets
+
+
+def project_products(
+    product_results: List[Dict],
+    coordinates: Dict[int, Dict],
+    use_orientation: bool = False,
+    estimated_distance: float = 2.0
+) -> int:
+    """
+    为一个品牌所有点位的商品一次性计算 py_position_3d（原地写入各商品）
+    只处理同时有 bbox 和 view_direction、且点位坐标存在的商品；bbox 无法解析的商品 py_position_3d 置为 None
+
+    Args:
+        product_results: [{'seq_id': 点位序列号, 'products': [...]}, ...]
+        coordinates: load_panorama_coordinates 的返回值
+        use_orientation: 是否按点位朝向四元数旋转
+        estimated_distance: 估算的商品距离（米）
+
+    Returns:
+        计算了坐标的商品数
+    """
+    targets = []
+    bboxes = []
+    directions = []
+    point_rows = []
+    for point in product_results:
+        point_coord = coordinates.get(point.get('seq_id'))
+        if point_coord is None:
+            continue
+        for product in point.get('products', []):
+            bbox = product.get('bbox')
+            vdir = product.get('view_direction')
+            if not bbox or not vdir:
+                continue
+            try:
+                row = [
+                    float(bbox.get('x_min', 0)),
+                    float(bbox.get('y_min', 0)),
+                    float(bbox.get('x_max', 1)),
+                    float(bbox.get('y_max', 1))
+                ]
+            except (AttributeError, TypeError, ValueError) as e:
+                product['py_position_3d'] = None
+                print(f'[WARN] 点位 {point.get("seq_id")} 商品计算 py_position_3d 失败: {e}')
+                continue
+            targets.append(product)
+            bboxes.append(row)
+            directions.append(vdir)
+            point_rows.append(point_coord)
+
+    if not targets:
+        return 0
+
+    positions = np.array(
+        [[c.get('position_x', 0), c.get('position_y', 0), c.get('position_z', 0)] for c in point_rows],
+        dtype=np.float64
+    )
+    quaternions = None
+    if use_orientation:
+        quaternions = np.array(
+            [[c.get('direction_x', 0), c.get('direction_y', 0), c.get('direction_z', 0), c.get('direction_w', 0)]
+             for c in point_rows],
+            dtype=np.float64
+        )
+
+    result = np.round(
+        calculate_product_3d_positions_batch(bboxes, directions, positions, quaternions, estimated_distance),
+        3
+    )
+    for product, (x, y, z) in zip(targets, result.tolist()):
+        product['py_position_3d'] = {'x': x, 'y': y, 'z': z}
+    return len(targets)